@@ -21,6 +21,42 @@ class Settings(BaseSettings):
     ALLOWED_ORIGINS: str = "http://localhost:5174,http://127.0.0.1:5174"
     ENVIRONMENT: str = "development"
 
+    # 🔎 Explore secondary indexes (built after a column is filtered on N times)
+    EXPLORE_INDEXES_ENABLED: bool = True
+    EXPLORE_INDEX_BUILD_AFTER: int = 3
+
+    # 🔤 run_query trigram indexes for contains / startswith (built after N searches)
+    TEXT_INDEX_ENABLED: bool = True
+    TEXT_INDEX_BUILD_AFTER: int = 2
+    TEXT_INDEX_MIN_ROWS: int = 10_000
+
+    # 🗃️ Explore result cache
+    QUERY_CACHE_MAX_ENTRIES: int = 1024
+    QUERY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # 🧊 Explore cubes (materialized once a dimension set / metric was queried N times)
+    CUBES_ENABLED: bool = True
+    CUBE_BUILD_AFTER: int = 3
+    CUBE_MAX_ENTRIES: int = 64
+    CUBE_MAX_CELLS: int = 100_000
+
+    # 🧵 Partition-parallel Explore execution (0 workers = one per CPU, up to 16)
+    QUERY_WORKERS: int = 0
+    QUERY_PARALLEL_MIN_ROWS: int = 200_000
+    QUERY_PARTITION_MIN_ROWS: int = 50_000
+
+    # 🔗 Explore joins (build sides up to N rows are broadcast, larger ones partitioned)
+    JOIN_BROADCAST_MAX_ROWS: int = 1_000_000
+    JOIN_MAX_ROWS: int = 20_000_000
+    JOIN_CACHE_MAX_ENTRIES: int = 8
+
+    # 💾 Group-by memory budget; larger aggregations spill partitions to disk
+    AGGREGATION_MEMORY_BUDGET_MB: int = 512
+    SPILL_DIR: str = ""
+
+    # ⏪ Dataset version history (undo steps kept per dataset)
+    DATASET_HISTORY_LIMIT: int = 10
+
     # ✅ Allow extra env vars safely
     model_config = SettingsConfigDict(
         env_file=".env",
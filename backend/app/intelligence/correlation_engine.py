@@ -1,8 +1,18 @@
-from typing import Any, Dict, Optional
+import warnings
+from typing import Any, Dict, List, Optional
 
 import numpy as np
 import pandas as pd
 
+# Columns per matmul block. 256 columns x 256 columns keeps each block at 512 KB
+# of float64, so very wide tables never materialize the full p x p matrix.
+CORR_BLOCK_SIZE = 256
+# Categorical columns with more distinct values than this (ids, free text) carry no
+# useful association signal and would blow up the contingency tables.
+MAX_ASSOC_CATEGORIES = 200
+# Rows per one-hot chunk when computing per-category statistics.
+ASSOC_CHUNK_ROWS = 16384
+
 
 def _infer_type(series: pd.Series) -> str:
     if pd.api.types.is_numeric_dtype(series):
@@ -54,20 +64,22 @@ def quality_report(df: pd.DataFrame) -> Dict[str, Any]:
     duplicates = df[dup_mask]
     # Missing
     missing = df.isna().sum().to_dict()
-    # Outliers (z-score > 3 for numeric)
+    # Outliers (z-score > 3 for numeric), all numeric columns at once
+    num = df.select_dtypes(include=["number"])
+    x = num.to_numpy(dtype=np.float64, na_value=np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns
+        sd = np.nanstd(x, axis=0) if x.size else np.zeros(x.shape[1])
+        z = (x - np.nanmean(x, axis=0)) / sd if x.size else x
+    flagged = np.abs(z) > 3
+    flagged[:, ~(sd > 0)] = False
     outliers = {}
-    for col in df.select_dtypes(include=["number"]).columns:
-        s = df[col].astype(float)
-        m, sd = s.mean(), s.std(ddof=0)
-        if sd == 0 or np.isnan(sd):
-            continue
-        z = (s - m) / sd
-        idxs = z[np.abs(z) > 3].index.tolist()
-        if idxs:
-            outliers[col] = [
-                {"row": int(i), "value": float(df.loc[i, col]), "z": float(z.loc[i])}
-                for i in idxs[:100]
-            ]
+    for j in np.flatnonzero(flagged.any(axis=0)):
+        idx = np.flatnonzero(flagged[:, j])[:100]
+        outliers[num.columns[j]] = [
+            {"row": int(i), "value": v, "z": s}
+            for i, v, s in zip(df.index[idx].tolist(), x[idx, j].tolist(), z[idx, j].tolist())
+        ]
     return {
         "duplicates": {
             "count": int(len(duplicates)),
@@ -78,27 +90,293 @@ def quality_report(df: pd.DataFrame) -> Dict[str, Any]:
     }
 
 
+class _Prepared:
+    """Column-centered values plus validity mask, computed once per frame."""
+
+    def __init__(self, df: pd.DataFrame, method: str = "pearson"):
+        num = df.select_dtypes(include=["number"])
+        if method not in ("pearson", "spearman"):
+            raise ValueError(f"unsupported correlation method: {method}")
+        self.columns: List[str] = [str(c) for c in num.columns]
+        x = num.to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(x)
+        self.has_missing = not bool(valid.all())
+        if method == "spearman":
+            # Each column is ranked once, over its own present rows; pairs are then
+            # correlated over the rows both columns have (pairwise deletion). pandas
+            # re-ranks every pair on those rows instead: the two agree exactly when
+            # neither column has missing values and differ slightly otherwise, but
+            # re-ranking costs a Python-level pass per pair rather than one matmul.
+            x = num.rank(method="average").to_numpy(dtype=np.float64, na_value=np.nan)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = x - np.nanmean(x, axis=0) if x.size else x
+        z = np.where(valid, z, 0.0)
+        if self.has_missing:
+            self.z = z
+            self.z2 = z * z
+            self.mask = valid.astype(np.float64)
+        else:
+            # Scale to unit norm so a block is a single matmul.
+            norms = np.sqrt((z * z).sum(axis=0))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                self.z = z / norms
+
+    def block(self, rows: slice, cols: slice) -> np.ndarray:
+        if not self.has_missing:
+            return self.z[:, rows].T @ self.z[:, cols]
+        # Pairwise-complete: every statistic is restricted to rows where both columns are present.
+        zi, zj = self.z[:, rows], self.z[:, cols]
+        mi, mj = self.mask[:, rows], self.mask[:, cols]
+        n = mi.T @ mj
+        sx = zi.T @ mj
+        sy = mi.T @ zj
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = zi.T @ zj - sx * sy / n
+            vx = self.z2[:, rows].T @ mj - sx * sx / n
+            vy = mi.T @ self.z2[:, cols] - sy * sy / n
+            r = cov / np.sqrt(vx * vy)
+        r[n < 2] = np.nan
+        return r
+
+
+def _bounds(p: int, block_size: int):
+    return [slice(a, min(a + block_size, p)) for a in range(0, p, block_size)]
+
+
+def correlation_matrix(
+    df: pd.DataFrame, method: str = "pearson", block_size: int = CORR_BLOCK_SIZE
+) -> pd.DataFrame:
+    """
+    Full correlation matrix of the numeric columns, computed block by block. Spearman
+    pairs with missing values use per-column ranks and pairwise deletion (see _Prepared).
+    """
+    prep = _Prepared(df, method)
+    p = len(prep.columns)
+    out = np.full((p, p), np.nan)
+    blocks = _bounds(p, block_size)
+    for bi, rows in enumerate(blocks):
+        for cols in blocks[bi:]:
+            r = prep.block(rows, cols)
+            out[rows, cols] = r
+            out[cols, rows] = r.T
+    np.clip(out, -1.0, 1.0, out=out)
+    return pd.DataFrame(out, index=prep.columns, columns=prep.columns)
+
+
+def _keep_top(cand, k: Optional[int]):
+    absr, ii, jj, rr = cand
+    if k is not None and len(absr) > k:
+        idx = np.argpartition(-absr, k - 1)[:k]
+        return absr[idx], ii[idx], jj[idx], rr[idx]
+    return cand
+
+
+def top_correlations(
+    df: pd.DataFrame,
+    k: Optional[int] = 25,
+    threshold: float = 0.0,
+    method: str = "pearson",
+    target: Optional[str] = None,
+    block_size: int = CORR_BLOCK_SIZE,
+) -> List[Dict[str, Any]]:
+    """
+    Strongest |r| pairs among the numeric columns, without building the full matrix.
+
+    With ``target`` only pairs involving that column are considered. ``k=None`` returns
+    every pair at or above ``threshold``. Results are ordered by descending |r|.
+    """
+    prep = _Prepared(df, method)
+    p = len(prep.columns)
+    if p < 2:
+        return []
+
+    empty = (np.empty(0), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0))
+    cand = empty
+    blocks = _bounds(p, block_size)
+    if target is not None:
+        if target not in prep.columns:
+            return []
+        t = prep.columns.index(target)
+        pairs = [(slice(t, t + 1), cols) for cols in blocks]
+    else:
+        pairs = [(rows, cols) for bi, rows in enumerate(blocks) for cols in blocks[bi:]]
+
+    for rows, cols in pairs:
+        r = np.clip(prep.block(rows, cols), -1.0, 1.0)
+        gi = np.arange(rows.start, rows.stop)[:, None]
+        gj = np.arange(cols.start, cols.stop)[None, :]
+        # Upper triangle only (or "not the target itself" in target mode).
+        keep = gj != gi if target is not None else gj > gi
+        absr = np.abs(r)
+        keep &= ~np.isnan(r) & (absr >= threshold)
+        ii, jj = np.broadcast_to(gi, r.shape)[keep], np.broadcast_to(gj, r.shape)[keep]
+        block_cand = (absr[keep], ii, jj, r[keep])
+        block_cand = _keep_top(block_cand, k)
+        cand = _keep_top(tuple(np.concatenate([a, b]) for a, b in zip(cand, block_cand)), k)
+
+    absr, ii, jj, rr = cand
+    order = np.argsort(-absr, kind="stable")
+    cols = prep.columns
+    return [{"a": cols[ii[o]], "b": cols[jj[o]], "r": float(rr[o])} for o in order]
+
+
 def correlations_for(
     df: pd.DataFrame, target: Optional[str] = None, threshold: float = 0.5
 ) -> Dict[str, Any]:
-    num_df = df.select_dtypes(include=["number"]).copy()
+    num_df = df.select_dtypes(include=["number"])
     if num_df.empty:
         return {"correlations": []}
-    corr = num_df.corr(numeric_only=True)
-    out = []
-    if target and target in corr.columns:
-        series = corr[target].drop(labels=[target], errors="ignore")
-        for col, r in series.items():
-            if pd.notna(r) and abs(r) >= threshold:
-                out.append({"column": col, "r": float(r)})
+    if target and target in num_df.columns:
+        pairs = top_correlations(num_df, k=None, threshold=threshold, target=str(target))
+        out = [{"column": p["b"], "r": p["r"]} for p in pairs]
     else:
-        # top pairs
-        pairs = []
-        cols = corr.columns.tolist()
-        for i in range(len(cols)):
-            for j in range(i + 1, len(cols)):
-                r = corr.iloc[i, j]
-                if pd.notna(r) and abs(r) >= threshold:
-                    pairs.append({"a": cols[i], "b": cols[j], "r": float(r)})
-        out = sorted(pairs, key=lambda x: -abs(x["r"]))[:25]
+        out = top_correlations(num_df, k=25, threshold=threshold)
     return {"correlations": out}
+
+
+def _encode_categoricals(df: pd.DataFrame, max_categories: int):
+    """Integer-encode every low-cardinality categorical column once (-1 = missing)."""
+    out = {}
+    for c in df.select_dtypes(include=["object", "category", "bool", "string"]).columns:
+        codes, uniques = pd.factorize(df[c], use_na_sentinel=True)
+        if 1 < len(uniques) <= max_categories:
+            out[str(c)] = (codes.astype(np.int64), len(uniques))
+    return out
+
+
+def _cramers_v(a, ka, b, kb) -> float:
+    valid = (a >= 0) & (b >= 0)
+    if not valid.all():
+        a, b = a[valid], b[valid]
+    n = len(a)
+    if n == 0:
+        return float("nan")
+    table = np.bincount(a * kb + b, minlength=ka * kb).reshape(ka, kb).astype(np.float64)
+    rows, cols = table.sum(axis=1), table.sum(axis=0)
+    table = table[rows > 0][:, cols > 0]
+    rows, cols = rows[rows > 0], cols[cols > 0]
+    dof = min(len(rows), len(cols)) - 1
+    if dof <= 0:
+        return float("nan")
+    # chi2 / n = sum(O^2 / (row * col)) - 1 for observed counts O.
+    phi2 = (table * table / np.outer(rows, cols)).sum() - 1.0
+    return float(np.sqrt(max(phi2, 0.0) / dof))
+
+
+def _correlation_ratios(codes, k, x0, x2, valid) -> np.ndarray:
+    """
+    Correlation ratio of one categorical column against every numeric column at once.
+
+    ``x0`` holds column-centered values with missing cells zeroed (``x2`` their squares)
+    and ``valid`` marks present cells, so each pair uses pairwise-complete rows. Group
+    statistics come from one-hot matmuls over row chunks; ``valid=None`` means the
+    numeric block has no missing cells and counts come straight from the codes.
+    """
+    p = x0.shape[1]
+    sums = np.zeros((k, p))
+    counts = squares = None
+    if valid is not None:
+        counts, squares = np.zeros((k, p)), np.zeros((k, p))
+    for a in range(0, len(codes), ASSOC_CHUNK_ROWS):
+        c = codes[a : a + ASSOC_CHUNK_ROWS]
+        onehot = (c[:, None] == np.arange(k)[None, :]).astype(np.float64).T
+        sums += onehot @ x0[a : a + ASSOC_CHUNK_ROWS]
+        if valid is not None:
+            counts += onehot @ valid[a : a + ASSOC_CHUNK_ROWS]
+            squares += onehot @ x2[a : a + ASSOC_CHUNK_ROWS]
+
+    if valid is None:
+        present = codes >= 0
+        counts = np.bincount(codes[present], minlength=k).astype(np.float64)[:, None]
+        counts = np.broadcast_to(counts, (k, p))
+        square_total = x2.sum(axis=0) if present.all() else x2[present].sum(axis=0)
+    else:
+        square_total = squares.sum(axis=0)
+
+    n = counts.sum(axis=0)
+    total_sum = sums.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grand = total_sum * total_sum / n
+        total = square_total - grand
+        between = np.where(counts > 0, sums * sums / np.maximum(counts, 1), 0.0).sum(axis=0) - grand
+        eta = np.sqrt(np.clip(between / total, 0.0, 1.0))
+    eta[(n < 2) | ~(total > 1e-12 * np.maximum(grand, 1.0))] = np.nan
+    return eta
+
+
+def association_matrix(
+    df: pd.DataFrame, max_categories: int = MAX_ASSOC_CATEGORIES
+) -> Dict[str, Any]:
+    """
+    One association matrix across numeric and categorical columns.
+
+    num-num cells are Pearson r, cat-cat cells Cramér's V and cat-num cells the
+    correlation ratio (eta). Only the numeric block is signed.
+    """
+    num_df = df.select_dtypes(include=["number"])
+    num_cols = [str(c) for c in num_df.columns]
+    cats = _encode_categoricals(df, max_categories)
+    cat_cols = list(cats)
+    columns = num_cols + cat_cols
+    p, q = len(num_cols), len(columns)
+    out = np.full((q, q), np.nan)
+    np.fill_diagonal(out, 1.0)
+
+    if p >= 2:
+        out[:p, :p] = correlation_matrix(num_df).to_numpy()
+    x = num_df.to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = ~np.isnan(x)
+    with np.errstate(invalid="ignore"):
+        x0 = np.where(valid, x - np.nanmean(x, axis=0), 0.0) if p else x
+    x2 = x0 * x0
+    valid = valid.astype(np.float64) if not valid.all() else None
+
+    for ci, name in enumerate(cat_cols, start=p):
+        codes, k = cats[name]
+        if p:
+            eta = _correlation_ratios(codes, k, x0, x2, valid)
+            out[ci, :p] = out[:p, ci] = eta
+        for cj in range(ci + 1, q):
+            other, ko = cats[columns[cj]]
+            out[ci, cj] = out[cj, ci] = _cramers_v(codes, k, other, ko)
+
+    kinds = {c: "numeric" for c in num_cols}
+    kinds.update({c: "categorical" for c in cat_cols})
+    return {"columns": columns, "kinds": kinds, "matrix": out}
+
+
+def associations_for(
+    df: pd.DataFrame, target: Optional[str] = None, threshold: float = 0.3, k: int = 25
+) -> Dict[str, Any]:
+    assoc = association_matrix(df)
+    columns, kinds, m = assoc["columns"], assoc["kinds"], assoc["matrix"]
+    if target is not None and target not in columns:
+        return {"associations": []}
+
+    ii, jj = np.triu_indices(len(columns), k=1)
+    if target is not None:
+        t = columns.index(target)
+        jj = np.array([j for j in range(len(columns)) if j != t], dtype=np.intp)
+        ii = np.full(len(jj), t, dtype=np.intp)
+    vals = m[ii, jj]
+    keep = ~np.isnan(vals) & (np.abs(vals) >= threshold)
+    ii, jj, vals = ii[keep], jj[keep], vals[keep]
+    order = np.argsort(-np.abs(vals), kind="stable")[:k]
+
+    def measure(a, b):
+        if kinds[a] == kinds[b]:
+            return "pearson" if kinds[a] == "numeric" else "cramers_v"
+        return "correlation_ratio"
+
+    return {
+        "associations": [
+            {
+                "a": columns[ii[o]],
+                "b": columns[jj[o]],
+                "value": float(vals[o]),
+                "measure": measure(columns[ii[o]], columns[jj[o]]),
+            }
+            for o in order
+        ]
+    }
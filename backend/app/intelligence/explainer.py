@@ -1,6 +1,9 @@
 import statistics
 from typing import Any, Dict, List
 
+import pandas as pd
+from app.services.timeseries import TimeSeriesIndex
+
 
 def _to_float(v):
     try:
@@ -21,26 +24,15 @@ def explain(headers: List[str], rows: List[dict], question: str) -> Dict[str, An
             # Find month-over-month change on first numeric
             val_col = numeric_cols[0]
             date_col = date_cols[0]
-            # Group by date string
-            buckets = {}
-            for r in rows:
-                d = str(r.get(date_col) or "").strip()[:7]  # YYYY-MM
-                v = _to_float(r.get(val_col))
-                if v is None:
-                    continue
-                buckets.setdefault(d, []).append(v)
-            series = sorted(((k, sum(vs)) for k, vs in buckets.items()), key=lambda x: x[0])
-            changes = []
-            for i in range(1, len(series)):
-                prev, cur = series[i - 1][1], series[i][1]
-                if prev:
-                    pct = round((cur - prev) / prev * 100, 2)
-                    changes.append((series[i][0], pct))
+            # Monthly sums from the rollup index (dates parsed once, not string-sliced)
+            df = pd.DataFrame.from_records(rows, columns=headers)
+            ts = TimeSeriesIndex.from_frame(df, date_col, [val_col])
+            changes = ts.period_over_period(val_col, "month", "sum")
             if changes:
-                worst = min(changes, key=lambda x: x[1])
+                worst = min(changes, key=lambda x: x["pct_change"])
                 notes.append(
                     {
-                        "text": f"Largest relative drop found in {worst[0]}: {worst[1]}% vs previous period.",
+                        "text": f"Largest relative drop found in {worst['period']}: {worst['pct_change']}% vs previous period.",
                         "detail": "MoM on first numeric column.",
                     }
                 )
@@ -1,41 +1,314 @@
-from typing import Any, Dict, List
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
+from app.config import settings
+from app.services.cache import LRUCache
+from app.services.column_index import TrigramIndex
+from app.services.sampling import APPROX_MIN_ROWS, estimate, frame_samples, unreliable_groups
+from app.services.spill import memory_budget, partition_count, spill_rows
 
+# Working memory of a pandas group-by per input row (codes, sort order, values).
+GROUPBY_ROW_BYTES = 48
+# Rows evaluated per filter to estimate its selectivity before the real pass.
+SELECTIVITY_SAMPLE = 2048
+# `contains` values are regular expressions; only plain text can use a trigram index.
+_REGEX_META = frozenset(".^$*+?{}[]\\|()")
 
-def _apply_filters(df: pd.DataFrame, filters: List[Dict[str, Any]]) -> pd.DataFrame:
-    out = df.copy()
+
+class _ColumnCache:
+    """Per-query column views; numeric casts are done at most once per column."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._numeric: Dict[str, pd.Series] = {}
+
+    def get(self, col: str, kind: str, positions: Optional[np.ndarray] = None) -> pd.Series:
+        s = self.df[col]
+        if kind == "raw":
+            return s if positions is None else s.iloc[positions]
+        if col in self._numeric:
+            x = self._numeric[col]
+            return x if positions is None else x.iloc[positions]
+        if positions is not None and len(positions) * 4 < len(s):
+            # Few rows left: cast just those rather than the whole column.
+            return self._cast(s.iloc[positions])
+        self._numeric[col] = self._cast(s)
+        return self._numeric[col] if positions is None else self._numeric[col].iloc[positions]
+
+    @staticmethod
+    def _cast(s: pd.Series) -> pd.Series:
+        try:
+            return s.astype(float)
+        except (TypeError, ValueError):
+            # Values that are not numbers simply fail numeric comparisons.
+            return pd.to_numeric(s, errors="coerce")
+
+
+def _predicate(op: str, val: Any) -> Optional[Tuple[str, Callable[[pd.Series], Any]]]:
+    """(column view, vectorized test) for one filter, or None if it cannot apply."""
+    if op == "==":
+        return "raw", lambda s: s == val
+    if op == "!=":
+        return "raw", lambda s: s != val
+    if op == "contains":
+        return "raw", lambda s: s.astype(str).str.contains(str(val), case=False, na=False)
+    if op == "startswith":
+        prefix = str(val).lower()
+        return "raw", lambda s: s.astype(str).str.lower().str.startswith(prefix)
+    if op == "in":
+        vs = val if isinstance(val, list) else [val]
+        return "raw", lambda s: s.isin(vs)
+    try:
+        if op == "between":
+            lo, hi = val if isinstance(val, (list, tuple)) and len(val) == 2 else (None, None)
+            if lo is None or hi is None:
+                return None
+            lo, hi = float(lo), float(hi)
+            return "num", lambda x: x.between(lo, hi, inclusive="both")
+        v = float(val)
+    except (TypeError, ValueError):
+        return None  # Ignore bad casts
+    tests = {
+        ">": lambda x: x > v,
+        "<": lambda x: x < v,
+        ">=": lambda x: x >= v,
+        "<=": lambda x: x <= v,
+    }
+    return ("num", tests[op]) if op in tests else None
+
+
+def _filter_mask(df: pd.DataFrame, filters: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    All filters combined into one boolean mask, without copying the frame.
+
+    Text searches with a trigram index go first. The other predicates are ordered by
+    selectivity measured on a row sample; each later predicate only looks at rows that
+    survived the earlier ones.
+    """
+    n = len(df)
+    cache = _ColumnCache(df)
+    preds = []
+    positions = None
     for f in filters or []:
         col, op, val = f.get("column"), f.get("op"), f.get("value")
-        if col not in out.columns:
+        if col not in df.columns:
             continue
-        s = out[col]
+        index = _text_index(df, col, op, val)
+        if index is not None:
+            hits = index.search(str(val), prefix=op == "startswith")
+            positions = (
+                hits if positions is None else np.intersect1d(positions, hits, assume_unique=True)
+            )
+            continue
+        pred = _predicate(op, val)
+        if pred is not None:
+            preds.append((col, *pred))
+    if (not preds and positions is None) or n == 0:
+        return np.ones(n, dtype=bool)
+
+    if len(preds) > 1:
+        sample = np.unique(np.linspace(0, n - 1, min(n, SELECTIVITY_SAMPLE)).astype(np.intp))
+
+        def selectivity(p):
+            col, kind, test = p
+            try:
+                return np.asarray(test(cache.get(col, kind, sample)), dtype=bool).mean()
+            except Exception:
+                return 1.0  # Skipped in the pass below
+
+        preds.sort(key=selectivity)
+
+    for col, kind, test in preds:
+        if positions is not None and not len(positions):
+            break
         try:
-            if op == "==":
-                out = out[s == val]
-            elif op == "!=":
-                out = out[s != val]
-            elif op == ">":
-                out = out[s.astype(float) > float(val)]
-            elif op == "<":
-                out = out[s.astype(float) < float(val)]
-            elif op == ">=":
-                out = out[s.astype(float) >= float(val)]
-            elif op == "<=":
-                out = out[s.astype(float) <= float(val)]
-            elif op == "contains":
-                out = out[s.astype(str).str.contains(str(val), case=False, na=False)]
-            elif op == "in":
-                vs = val if isinstance(val, list) else [val]
-                out = out[s.isin(vs)]
-            elif op == "between":
-                lo, hi = val if isinstance(val, (list, tuple)) and len(val) == 2 else (None, None)
-                if lo is not None and hi is not None:
-                    out = out[s.astype(float).between(float(lo), float(hi), inclusive="both")]
+            keep = np.asarray(test(cache.get(col, kind, positions)), dtype=bool)
         except Exception:
-            # Ignore bad casts
-            pass
-    return out
+            # Filters that cannot apply (e.g. an invalid regex) are ignored.
+            continue
+        positions = np.flatnonzero(keep) if positions is None else positions[keep]
+    if positions is None:
+        return np.ones(n, dtype=bool)
+
+    mask = np.zeros(n, dtype=bool)
+    mask[positions] = True
+    return mask
+
+
+# Trigram indexes per frame and column, kept for as long as that frame is alive.
+_FRAME_TEXT = LRUCache(max_entries=8)
+
+
+def _text_index(df: pd.DataFrame, col: str, op: str, val: Any) -> Optional[TrigramIndex]:
+    """
+    Trigram index for a contains / startswith filter on a large frame, built once the
+    column has been searched TEXT_INDEX_BUILD_AFTER times; None means scan.
+    """
+    if (
+        op not in ("contains", "startswith")
+        or val is None
+        or not settings.TEXT_INDEX_ENABLED
+        or len(df) < settings.TEXT_INDEX_MIN_ROWS
+        or (op == "contains" and _REGEX_META.intersection(str(val)))
+    ):
+        return None
+    entry = _FRAME_TEXT.get(id(df))
+    if entry is None or entry["ref"]() is not df or entry["n"] != len(df):
+        entry = {"ref": weakref.ref(df), "n": len(df), "uses": {}, "indexes": {}}
+        _FRAME_TEXT.put(id(df), entry)
+    if col not in entry["indexes"]:
+        entry["uses"][col] = entry["uses"].get(col, 0) + 1
+        if entry["uses"][col] < settings.TEXT_INDEX_BUILD_AFTER:
+            return None
+        entry["indexes"][col] = TrigramIndex(df[col].astype(str).to_numpy(dtype=object))
+    return entry["indexes"][col]
+
+
+def _apply_filters(df: pd.DataFrame, filters: List[Dict[str, Any]]) -> pd.DataFrame:
+    return df[_filter_mask(df, filters)]
+
+
+def _top_groups(grouped: pd.DataFrame, metric: str, limit: int) -> pd.DataFrame:
+    """Largest `limit` groups by metric; partial selection instead of a full sort."""
+    if len(grouped) <= limit:
+        return grouped.sort_values(metric, ascending=False)
+    top = grouped.nlargest(limit, metric, keep="first")
+    if len(top) < limit:
+        # nlargest drops NaN, which a descending sort would have put last.
+        top = pd.concat([top, grouped[grouped[metric].isna()].head(limit - len(top))])
+    return top
+
+
+def _spilled_groupby(dfq, group_by, metric, op, limit, n_partitions) -> pd.DataFrame:
+    """
+    Group-by over rows hash-partitioned to disk by key, one partition in memory at a
+    time. Only groups that can still make the top `limit` are kept, in key order as
+    groupby would return them.
+    """
+    keys = dfq[group_by].to_numpy()
+
+    def partition_of(positions: np.ndarray) -> np.ndarray:
+        return (pd.util.hash_array(keys[positions]) % np.uint64(n_partitions)).astype(np.intp)
+
+    kept = []
+    mask = np.ones(len(dfq), dtype=bool)
+    with spill_rows(mask, partition_of, n_partitions) as spilled:
+        for _, positions in spilled:
+            part = dfq.iloc[positions].groupby(group_by)[metric].agg(op).reset_index()
+            kept.append(_top_groups(part, metric, limit))
+    if not kept:
+        return dfq.iloc[:0].groupby(group_by)[metric].agg(op).reset_index()
+    return pd.concat(kept).sort_values(group_by, kind="stable").reset_index(drop=True)
+
+
+def _approx_query(df, query, metric, group_by, agg, limit) -> Optional[Dict[str, Any]]:
+    """
+    run_query answered from persisted samples, with confidence intervals. Groups whose
+    sample is too thin or too noisy are computed exactly; None means run exactly.
+    """
+    approx = query.get("approx") or {}
+    op = "mean" if agg in ("avg", "mean") else agg
+    if (
+        op not in ("sum", "mean", "count")
+        or len(df) < APPROX_MIN_ROWS
+        or metric not in df.columns
+        or not pd.api.types.is_numeric_dtype(df[metric])
+    ):
+        return None
+    confidence = float(approx.get("confidence") or 0.95)
+    max_error = float(approx.get("max_error") or 0.01)
+    filters = query.get("filters", [])
+
+    samples = frame_samples(df)
+    candidates = samples.candidates(group_by)
+    if not candidates:
+        return None
+    if group_by:
+        codes, uniques = samples.groups(group_by)
+        k = len(uniques) + 1
+    else:
+        codes, k = np.zeros(len(df), dtype=np.intp), 1
+
+    for sample in candidates:
+        frame = sample.store
+        z = _filter_mask(frame, filters).astype(np.float64)
+        x = frame[metric].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(x)
+        groups = codes[sample.positions]
+        args = (groups, k, sample.strata, sample.pop, sample.drawn)
+        if op == "count":
+            value = estimate(*args, z * valid, z, confidence=confidence)
+        else:
+            # pandas skips NaN: they add nothing to sums and are not counted in means.
+            zz = z * valid if op == "mean" else z
+            y = np.where((zz > 0) & valid, x, 0.0)
+            value = estimate(*args, y, zz, op == "mean", confidence)
+        rows = estimate(*args, z, z, confidence=confidence)[0]
+        matched = np.bincount(groups, weights=z * valid if op == "mean" else z, minlength=k)
+        whole = sample.drawn == sample.pop if sample.stratified else np.zeros(k, dtype=bool)
+        redo = unreliable_groups([value], matched, whole, max_error)
+        if group_by:
+            redo[k - 1] = False
+        if not redo.any():
+            break
+    # Nothing could be estimated (e.g. too many groups for the samples): run exactly.
+    if redo.any() and (not group_by or redo[: k - 1].all()):
+        return None
+
+    est, half = value
+    meta = {
+        "confidence": confidence,
+        "max_error": max_error,
+        "sample_rows": int(len(sample.positions)),
+    }
+    if not group_by:
+        if op == "mean" and not matched[0]:
+            return None
+        return {
+            "data": [
+                {
+                    metric: float(est[0]),
+                    f"{metric}_ci_low": float(est[0] - half[0]),
+                    f"{metric}_ci_high": float(est[0] + half[0]),
+                }
+            ],
+            "columns": list(df.columns),
+            "recommended_chart": "kpi",
+            "rows_after_filter": int(round(rows[0])),
+            "approx": meta,
+        }
+
+    keep = np.flatnonzero(~redo & (matched > 0))
+    keep = keep[keep < k - 1]
+    parts = [
+        pd.DataFrame(
+            {
+                group_by: uniques[keep],
+                metric: est[keep],
+                f"{metric}_ci_low": est[keep] - half[keep],
+                f"{metric}_ci_high": est[keep] + half[keep],
+            }
+        )
+    ]
+    total = rows[~redo].sum()
+    if redo.any():
+        mask = _filter_mask(df, filters) & redo[codes]
+        exact = df.loc[mask, [group_by, metric]].groupby(group_by)[metric].agg(op).reset_index()
+        exact[f"{metric}_ci_low"] = exact[metric]
+        exact[f"{metric}_ci_high"] = exact[metric]
+        parts.append(exact)
+        total += mask.sum()
+    grouped = pd.concat(parts, ignore_index=True)
+    meta.update(estimated_groups=len(keep), exact_groups=len(parts[-1]) if redo.any() else 0)
+    return {
+        "data": _top_groups(grouped, metric, limit).to_dict(orient="records"),
+        "columns": list(df.columns),
+        "recommended_chart": "bar",
+        "rows_after_filter": int(round(total)),
+        "approx": meta,
+    }
 
 
 def _numeric_cols(df: pd.DataFrame):
@@ -43,8 +316,6 @@ def _numeric_cols(df: pd.DataFrame):
 
 
 def run_query(df: pd.DataFrame, query: Dict[str, Any]) -> Dict[str, Any]:
-    # Apply filters
-    dfq = _apply_filters(df, query.get("filters", []))
     metric = query.get("metric")
     group_by = query.get("groupBy")
     split_by = query.get("splitBy")
@@ -53,9 +324,22 @@ def run_query(df: pd.DataFrame, query: Dict[str, Any]) -> Dict[str, Any]:
 
     # If no explicit metric, try to infer first numeric
     if not metric:
-        nums = _numeric_cols(dfq)
+        nums = _numeric_cols(df)
         metric = nums[0] if nums else None
 
+    if query.get("approx") and metric and not split_by:
+        result = _approx_query(df, query, metric, group_by, agg, limit)
+        if result is not None:
+            return result
+
+    # Filters become one mask; only the projected slice is materialized below
+    mask = _filter_mask(df, query.get("filters", []))
+    if metric:
+        needed = [c for c in dict.fromkeys([group_by, split_by, metric]) if c in df.columns]
+        dfq = df.loc[mask, needed]
+    else:
+        dfq = df.iloc[np.flatnonzero(mask)[:100]]
+
     # Basic aggregation
     if group_by and split_by and metric:
         grouped = (
@@ -68,8 +352,13 @@ def run_query(df: pd.DataFrame, query: Dict[str, Any]) -> Dict[str, Any]:
         data = grouped.reset_index().to_dict(orient="records")
         rec_chart = "grouped_bar"
     elif group_by and metric:
-        grouped = dfq.groupby(group_by)[metric].agg(agg if agg != "avg" else "mean").reset_index()
-        data = grouped.sort_values(metric, ascending=False).head(limit).to_dict(orient="records")
+        op = agg if agg != "avg" else "mean"
+        n_partitions = partition_count(len(dfq) * GROUPBY_ROW_BYTES, memory_budget(query))
+        if n_partitions > 1:
+            grouped = _spilled_groupby(dfq, group_by, metric, op, limit, n_partitions)
+        else:
+            grouped = dfq.groupby(group_by)[metric].agg(op).reset_index()
+        data = _top_groups(grouped, metric, limit).to_dict(orient="records")
         rec_chart = "bar"
     elif metric:
         val = (
@@ -83,10 +372,10 @@ def run_query(df: pd.DataFrame, query: Dict[str, Any]) -> Dict[str, Any]:
         data = dfq.head(100).to_dict(orient="records")
         rec_chart = "table"
 
-    cols = list(dfq.columns)
+    cols = list(df.columns)
     return {
         "data": data,
         "columns": cols,
         "recommended_chart": rec_chart,
-        "rows_after_filter": int(len(dfq)),
+        "rows_after_filter": int(mask.sum()),
     }
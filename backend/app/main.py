@@ -66,9 +66,11 @@ print("🌐 Environment variables loaded successfully ✅")
 from app.router.analyze import router as analyze_router
 from app.router.auth_routes import router as auth_router
 from app.router.correlate_routes import router as correlate_router
+from app.router.dataset_routes import router as dataset_router
 from app.router.explore_routes import router as explore_router
 from app.router.history import router as history_router
 from app.router.intelligence import router as intelligence_router
+from app.router.sql_routes import router as sql_router
 
 # ============================================================
 # 🔌 Import & Register All Routers
@@ -85,6 +87,8 @@ routers = [
     (auth_router, "Auth"),
     (users_router, "Users"),
     (correlate_router, "Correlation"),
+    (dataset_router, "Datasets"),
+    (sql_router, "SQL"),
 ]
 
 for router, tag in routers:
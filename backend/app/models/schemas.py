@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
 
 from pydantic import BaseModel, Field
 
@@ -73,21 +73,44 @@ class DeduplicateRequest(BaseModel):
     key_columns: List[str] = ["email"]
     strategy: Literal["keep_latest", "keep_first"] = "keep_latest"
     dry_run: bool = True
+    # Also merge near duplicates (MinHash over character shingles of the keys)
+    fuzzy: bool = False
+    threshold: float = Field(0.85, gt=0, le=1)
+    # Only rows with equal values in these columns are compared in fuzzy mode
+    block_on: Optional[List[str]] = None
 
 
 class DeduplicatePreview(BaseModel):
     will_remove: int
     will_keep: int
+    near_duplicates: int = 0
     affected_records: List[Dict[str, Any]]
     execute_url: str
 
 
+class ExportRequest(BaseModel):
+    dataset_id: str
+    # Explore filters, or {column: value} for exact matches
+    filters: Union[List[Dict[str, Any]], Dict[str, Any], None] = None
+    columns: Optional[List[str]] = None
+    # "json" answers with one JSON body ({rows, count, headers}) instead of a file stream
+    format: Literal["csv", "ndjson", "parquet", "json"] = "csv"
+    gzip: bool = False
+
+
 class ExploreQuery(BaseModel):
     filters: List[Dict[str, Any]] = []
     group_by: Optional[str] = None
-    aggregate: Optional[Dict[str, str]] = None
+    aggregate: Optional[Dict[str, Union[str, List[str]]]] = None
     sort: Optional[Dict[str, str]] = None
     limit: Optional[int] = 100
+    cursor: Optional[str] = None
+    # {"confidence": 0.95, "max_error": 0.01}: estimate aggregates from samples
+    approx: Optional[Dict[str, float]] = None
+    # {"dataset_id": "customers", "on": {"customer_id": "id"}, "how": "inner" | "left"}
+    join: Optional[Dict[str, Any]] = None
+    # Group-by memory budget for this request; over it, partitions spill to disk
+    memory_budget_mb: Optional[float] = Field(None, gt=0)
 
 
 class ExploreRequest(BaseModel):
@@ -100,3 +123,17 @@ class ExploreResponse(BaseModel):
     total_matched: int = 0
     sql_equivalent: Optional[str] = None
     save_as_view: Optional[str] = None
+    execution_ms: Optional[float] = None
+    cached: bool = False
+    next_cursor: Optional[str] = None
+    approx: Optional[Dict[str, Any]] = None
+
+
+class BinSpec(BaseModel):
+    mode: Literal["fixed", "quantile", "fd", "log", "categorical"] = "fixed"
+    bins: int = Field(10, ge=1, le=1000)
+    top_n: int = Field(10, ge=1, le=1000)
+    range: Optional[Tuple[float, float]] = None
+
+    def key(self) -> tuple:
+        return (self.mode, self.bins, self.top_n, self.range)
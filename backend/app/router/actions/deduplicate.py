@@ -9,7 +9,15 @@ executor = ActionExecutor()
 @router.post("/deduplicate", response_model=DeduplicatePreview)
 async def deduplicate(req: DeduplicateRequest):
     try:
-        preview = executor.deduplicate(req.dataset_id, req.key_columns, req.strategy, req.dry_run)
+        preview = executor.deduplicate(
+            req.dataset_id,
+            req.key_columns,
+            req.strategy,
+            req.dry_run,
+            fuzzy=req.fuzzy,
+            threshold=req.threshold,
+            block_on=req.block_on,
+        )
         return preview
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,13 +1,24 @@
+from app.models.schemas import ExportRequest
 from app.services.action_executor import ActionExecutor
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 
 router = APIRouter()
 executor = ActionExecutor()
 
 
 @router.post("/export")
-async def export_segment(payload: dict):
+async def export_segment(req: ExportRequest):
     try:
-        return executor.export_segment(**payload)
+        if req.format == "json":
+            return executor.export_segment(req.dataset_id, req.filters, req.columns)
+        chunks, media_type, filename = executor.stream_segment(
+            req.dataset_id, req.filters, req.columns, req.format, req.gzip
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -4,8 +4,14 @@ from typing import Any, Dict, List, Optional
 
 import numpy as np
 import pandas as pd
+from app.intelligence.correlation_engine import top_correlations
+from app.models.schemas import BinSpec
+from app.services.analysis_scheduler import AnalysisScheduler
+from app.services.binning import compute_bins
+from app.services.downsample import MIN_POINTS, reduce_chart
+from app.services.timeseries import TimeSeriesIndex
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 router = APIRouter(tags=["Analyze"])
 
@@ -21,6 +27,8 @@ ENGINE_VERSION = "7.0.1"
 class AnalyzeRequest(BaseModel):
     upload_id: str
     scrutiny: Dict[str, Any]
+    deadline_ms: Optional[int] = None
+    max_points: Optional[int] = Field(None, ge=MIN_POINTS)
 
 
 # ============================================================
@@ -105,12 +113,8 @@ def _detect_dataset_patterns(df: pd.DataFrame) -> List[str]:
         patterns.append("Time-series features detected – temporal trends available")
 
     if len(num_cols) >= 2:
-        corr = df[num_cols].corr()
         high_corr = [
-            (corr.columns[i], corr.columns[j])
-            for i in range(len(corr.columns))
-            for j in range(i + 1, len(corr.columns))
-            if abs(corr.iloc[i, j]) > 0.7
+            p for p in top_correlations(df[num_cols], k=None, threshold=0.7) if abs(p["r"]) > 0.7
         ]
         if high_corr:
             patterns.append(f"Strong correlations found among {len(high_corr)} variable pairs")
@@ -118,8 +122,13 @@ def _detect_dataset_patterns(df: pd.DataFrame) -> List[str]:
     return patterns
 
 
-def _generate_enhanced_summary(df: pd.DataFrame, upload_id: str, scrutiny: Dict[str, Any]) -> str:
-    """Generate descriptive, natural-language summary."""
+def _generate_enhanced_summary(
+    df: pd.DataFrame, upload_id: str, scrutiny: Dict[str, Any], total_rows: Optional[int] = None
+) -> str:
+    """
+    Generate descriptive, natural-language summary.
+    total_rows is the dataset's size when df is only a sample of it.
+    """
     if df.empty:
         ft = scrutiny.get("file_type", "unknown").upper()
         return f"Uploaded {ft} file requires text-based processing. Use the Intelligence module for document insights."
@@ -131,7 +140,7 @@ def _generate_enhanced_summary(df: pd.DataFrame, upload_id: str, scrutiny: Dict[
 
     missing_pct = (df.isnull().sum().sum() / (n_rows * n_cols)) * 100 if n_rows * n_cols else 0
     summary = [
-        f"This dataset has {n_rows:,} records and {n_cols} columns: "
+        f"This dataset has {n_rows if total_rows is None else total_rows:,} records and {n_cols} columns: "
         f"{len(num_cols)} numeric, {len(cat_cols)} categorical, and {len(date_cols)} date/time fields. "
     ]
     summary.append(
@@ -169,14 +178,13 @@ def _generate_advanced_charts(df: pd.DataFrame) -> List[Dict[str, Any]]:
         # Distribution of numeric
         for col in num_cols[:2]:
             if df[col].nunique() > 1:
-                hist = pd.cut(df[col], bins=min(10, df[col].nunique()))
-                counts = hist.value_counts().sort_index()
+                hist = compute_bins(df[col], BinSpec(bins=min(10, df[col].nunique())))
                 charts.append(
                     {
                         "type": "bar",
                         "title": f"Distribution of {col}",
-                        "labels": [str(x) for x in counts.index],
-                        "values": counts.values.tolist(),
+                        "labels": hist["labels"],
+                        "values": hist["counts"],
                         "color": "#3b82f6",
                     }
                 )
@@ -196,17 +204,10 @@ def _generate_advanced_charts(df: pd.DataFrame) -> List[Dict[str, Any]]:
 
         # Correlation heatmap summary
         if len(num_cols) >= 3:
-            corr = df[num_cols[:5]].corr()
-            pairs = []
-            for i in range(len(corr.columns)):
-                for j in range(i + 1, len(corr.columns)):
-                    pairs.append(
-                        {
-                            "pair": f"{corr.columns[i]} vs {corr.columns[j]}",
-                            "corr": round(corr.iloc[i, j], 3),
-                        }
-                    )
-            pairs = sorted(pairs, key=lambda x: abs(x["corr"]), reverse=True)[:8]
+            pairs = [
+                {"pair": f"{p['a']} vs {p['b']}", "corr": round(p["r"], 3)}
+                for p in top_correlations(df[num_cols[:5]], k=8)
+            ]
             if pairs:
                 charts.append(
                     {
@@ -222,18 +223,14 @@ def _generate_advanced_charts(df: pd.DataFrame) -> List[Dict[str, Any]]:
         for dc in date_cols[:1]:
             if len(num_cols) > 0:
                 try:
-                    df_t = df.copy()
-                    df_t[dc] = pd.to_datetime(df_t[dc], errors="coerce")
-                    df_t.dropna(subset=[dc], inplace=True)
-                    df_t["month"] = df_t[dc].dt.to_period("M")
-                    avg = df_t.groupby("month")[num_cols[0]].mean().reset_index()
-                    avg["month"] = avg["month"].astype(str)
+                    ts = TimeSeriesIndex.from_frame(df, dc, [num_cols[0]])
+                    trend = ts.trend(num_cols[0], "month", "mean")
                     charts.append(
                         {
                             "type": "line",
                             "title": f"Monthly Trend of {num_cols[0]}",
-                            "labels": avg["month"].tolist(),
-                            "values": avg[num_cols[0]].round(2).tolist(),
+                            "labels": trend["labels"],
+                            "values": [round(v, 2) for v in trend["values"]],
                             "color": "#8b5cf6",
                         }
                     )
@@ -284,8 +281,13 @@ def _generate_advanced_charts(df: pd.DataFrame) -> List[Dict[str, Any]]:
     return charts
 
 
-def _generate_comprehensive_insights(df: pd.DataFrame, scrutiny: Dict[str, Any]) -> List[str]:
-    """Generate human-readable statistical insights."""
+def _generate_comprehensive_insights(
+    df: pd.DataFrame, scrutiny: Dict[str, Any], total_rows: Optional[int] = None
+) -> List[str]:
+    """
+    Generate human-readable statistical insights.
+    total_rows is the dataset's size when df is only a sample of it.
+    """
     insights = []
     if df.empty:
         ft = scrutiny.get("file_type", "unknown")
@@ -299,7 +301,7 @@ def _generate_comprehensive_insights(df: pd.DataFrame, scrutiny: Dict[str, Any])
         cat_cols = df.select_dtypes(include=["object"]).columns.tolist()
 
         insights.append(
-            f"Dataset contains {n_rows:,} records and {n_cols} fields ({len(num_cols)} numeric, {len(cat_cols)} categorical)."
+            f"Dataset contains {n_rows if total_rows is None else total_rows:,} records and {n_cols} fields ({len(num_cols)} numeric, {len(cat_cols)} categorical)."
         )
 
         miss = (df.isna().sum().sum() / (n_rows * n_cols)) * 100
@@ -397,12 +399,39 @@ async def analyze(request: AnalyzeRequest):
                 "analysis_type": "document",
             }
         else:
-            quality = _calculate_data_quality_score(df)
-            charts = _generate_advanced_charts(df)
-            insights = _generate_comprehensive_insights(df, scrutiny)
-            recs = _generate_strategic_recommendations(df, scrutiny)
-            summary = _generate_enhanced_summary(df, request.upload_id, scrutiny)
+            # Cheap stages first; expensive ones fall back to samples when the budget runs short.
+            # The budget is measured from request start, so frame construction counts too.
+            budget_ms = None
+            if request.deadline_ms is not None:
+                budget_ms = (
+                    request.deadline_ms - (datetime.now() - start_time).total_seconds() * 1000
+                )
+            scheduler = AnalysisScheduler(df, budget_ms)
+            recs = scheduler.run(
+                "recommendations",
+                lambda d: _generate_strategic_recommendations(d, scrutiny),
+                weight=0.5,
+                default=[],
+            )
+            summary = scheduler.run(
+                "summary",
+                lambda d: _generate_enhanced_summary(d, request.upload_id, scrutiny, len(df)),
+                weight=1.0,
+                default=f"This dataset has {df.shape[0]:,} records and {df.shape[1]} columns.",
+            )
+            insights = scheduler.run(
+                "insights",
+                lambda d: _generate_comprehensive_insights(d, scrutiny, len(df)),
+                weight=1.5,
+                default=[],
+            )
+            quality = scheduler.run(
+                "quality", _calculate_data_quality_score, weight=2.0, default=None
+            )
+            charts = scheduler.run("charts", _generate_advanced_charts, weight=3.0, default=[])
+            charts = [reduce_chart(c, request.max_points) for c in charts]
             proc_time = (datetime.now() - start_time).total_seconds() * 1000
+            schedule = scheduler.report()
 
             result = {
                 "upload_id": request.upload_id,
@@ -418,7 +447,10 @@ async def analyze(request: AnalyzeRequest):
                     "analysis_timestamp": datetime.utcnow().isoformat(),
                     "data_quality_score": quality,
                     "processing_time_ms": int(proc_time),
+                    "deadline_ms": request.deadline_ms,
+                    "partial": schedule["partial"],
                 },
+                "sections": schedule["sections"],
                 "status": "success",
                 "analysis_type": "tabular",
             }
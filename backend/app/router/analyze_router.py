@@ -4,6 +4,8 @@ from typing import Any, Dict, List, Optional
 
 import numpy as np
 import pandas as pd
+from app.models.schemas import BinSpec
+from app.services.binning import compute_bins
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
@@ -183,13 +185,13 @@ def _generate_charts(df: pd.DataFrame) -> List[Dict[str, Any]]:
 
     # Histogram for numeric variable
     for c in numeric_cols[:1]:
-        hist = np.histogram(df[c].dropna(), bins=10)
+        hist = compute_bins(df[c], BinSpec(bins=10))
         charts.append(
             {
                 "type": "bar",
                 "title": f"Distribution of {c}",
-                "labels": [str(round(v, 2)) for v in hist[1][:-1]],
-                "values": hist[0].tolist(),
+                "labels": [str(round(v, 2)) for v in hist["edges"][:-1]],
+                "values": hist["counts"],
                 "color": "#10b981",
             }
         )
@@ -1,7 +1,7 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from app.router.auth_routes import get_current_user
-from app.services.analyze import correlate
+from app.services.analyze import associate, correlate
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
 
@@ -16,3 +16,14 @@ class CorrelatePayload(BaseModel):
 @router.post("/correlate")
 def correlate_api(payload: CorrelatePayload, user=Depends(get_current_user)):
     return correlate(payload.rows, payload.target)
+
+
+class AssociatePayload(BaseModel):
+    rows: List[Dict[str, Any]]
+    target: Optional[str] = None
+
+
+@router.post("/correlate/associations")
+def associate_api(payload: AssociatePayload, user=Depends(get_current_user)):
+    # Mixed-type: Pearson, Cramér's V and correlation ratio in one matrix
+    return associate(payload.rows, payload.target)
@@ -0,0 +1,113 @@
+from typing import Any, Dict, List, Optional
+
+from app.models.schemas import BinSpec
+from app.services.binning import BIN_CACHE, bins_for_dataset
+from app.services.column_store import get_store
+from app.services.downsample import MIN_POINTS, reduce_chart
+from app.services.query_cache import QUERY_CACHE
+from app.services.registry import append_rows, get_dataset, redo, undo, version_history
+from app.services.timeseries import timeseries_for_dataset
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+
+router = APIRouter(prefix="/datasets", tags=["Datasets"])
+
+
+class HistogramRequest(BaseModel):
+    column: str
+    spec: Optional[BinSpec] = None
+
+
+class AppendRequest(BaseModel):
+    rows: List[Dict[str, Any]]
+
+
+class TimeSeriesRequest(BaseModel):
+    date_column: str
+    column: str
+    resolution: str = "month"
+    stat: str = "mean"
+    compare: bool = False
+    max_points: Optional[int] = Field(None, ge=MIN_POINTS)
+
+
+@router.post("/{dataset_id}/rows")
+def append(dataset_id: str, req: AppendRequest):
+    try:
+        version = append_rows(dataset_id, req.rows)
+        return {"ok": True, "appended": len(req.rows), "version": version}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/{dataset_id}/versions")
+def versions(dataset_id: str):
+    try:
+        return version_history(dataset_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+def _history_step(dataset_id: str, step) -> dict:
+    try:
+        get_dataset(dataset_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        version = step(dataset_id)
+    except ValueError as e:
+        # Nothing to undo / redo
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"ok": True, "version": version, **version_history(dataset_id)}
+
+
+@router.post("/{dataset_id}/undo")
+def undo_change(dataset_id: str):
+    return _history_step(dataset_id, undo)
+
+
+@router.post("/{dataset_id}/redo")
+def redo_change(dataset_id: str):
+    return _history_step(dataset_id, redo)
+
+
+@router.post("/{dataset_id}/timeseries")
+def timeseries(dataset_id: str, req: TimeSeriesRequest):
+    try:
+        index = timeseries_for_dataset(dataset_id, req.date_column)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    try:
+        result = index.trend(req.column, req.resolution, req.stat)
+        result = reduce_chart({"type": "line", **result}, req.max_points)
+        if req.compare:
+            result["changes"] = index.period_over_period(req.column, req.resolution, req.stat)
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/{dataset_id}/histogram")
+def histogram(dataset_id: str, req: HistogramRequest):
+    try:
+        return bins_for_dataset(dataset_id, req.column, req.spec)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/cache/bins")
+def histogram_cache_stats():
+    return BIN_CACHE.stats()
+
+
+@router.get("/cache/queries")
+def query_cache_stats():
+    return QUERY_CACHE.stats()
+
+
+@router.get("/{dataset_id}/indexes")
+def indexes(dataset_id: str):
+    try:
+        return get_store(dataset_id).indexes.describe()
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
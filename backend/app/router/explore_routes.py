@@ -1,8 +1,8 @@
 from typing import Any, Dict, List, Optional
 
 from app.router.auth_routes import get_current_user, require_role
-from app.services.analyze import explore_query
-from fastapi import APIRouter, Depends
+from app.services.analyze import explore_dataset, explore_query
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 
 router = APIRouter(tags=["explore"])
@@ -12,10 +12,17 @@ class ExplorePayload(BaseModel):
     rows: List[Dict[str, Any]] = []
     metric: str
     dimension: Optional[str] = None
+    # Explore a registered dataset instead of inline rows (served from cubes when hot)
+    dataset_id: Optional[str] = None
 
 
 @router.post("/explore")
 def explore(payload: ExplorePayload, user=Depends(get_current_user)):
     # viewer+ allowed
+    if payload.dataset_id:
+        try:
+            return explore_dataset(payload.dataset_id, payload.metric, payload.dimension)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
     result = explore_query(payload.rows, payload.metric, payload.dimension)
     return result
@@ -0,0 +1,40 @@
+import itertools
+import json
+from typing import Dict, Optional
+
+from app.router.auth_routes import require_role
+from app.services.sql_engine import run_sql
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+router = APIRouter(tags=["sql"])
+
+
+class SQLRequest(BaseModel):
+    sql: str
+    dataset_id: Optional[str] = None
+    # alias -> dataset_id, for JOINs across uploads
+    datasets: Optional[Dict[str, str]] = None
+    max_rows: int = Field(10000, ge=1, le=1000000)
+    page_size: int = Field(1000, ge=1, le=50000)
+    timeout_ms: int = Field(5000, ge=1, le=60000)
+
+
+@router.post("/sql")
+def sql_query(req: SQLRequest, user=Depends(require_role("analyst"))):
+    # analyst+ allowed; read-only statements only
+    datasets = dict(req.datasets or {})
+    if req.dataset_id:
+        datasets.setdefault("data", req.dataset_id)
+    try:
+        pages = run_sql(datasets, req.sql, req.max_rows, req.page_size, req.timeout_ms)
+        head = next(pages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def ndjson():
+        for page in itertools.chain([head], pages):
+            yield json.dumps(page, default=str) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
@@ -1,100 +1,175 @@
-import statistics
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Union
 
-from app.services.registry import REGISTRY
+import numpy as np
+import pandas as pd
+from app.services.column_store import commit_store, get_store
+from app.services.dedup import exact_duplicates, near_duplicate_groups, normalize_keys
+from app.services.export import (
+    MEDIA_TYPES,
+    check_format,
+    export_columns,
+    segment_positions,
+    stream_rows,
+)
+from app.services.imputation import apply_fills, filled_columns, impute
+from app.services.outliers import get_outliers
+from app.services.registry import REGISTRY, dataset_lock, dataset_version
 
 
 class ActionExecutor:
     def deduplicate(
-        self, dataset_id: str, key_columns: List[str], strategy: str, dry_run: bool = True
+        self,
+        dataset_id: str,
+        key_columns: List[str],
+        strategy: str,
+        dry_run: bool = True,
+        fuzzy: bool = False,
+        threshold: float = 0.85,
+        block_on: Optional[List[str]] = None,
     ):
-        ds = REGISTRY.get(dataset_id)
-        if not ds:
-            raise ValueError("dataset not found")
-        rows = ds.get("rows", [])
-        keys = key_columns or ["email"]
-        seen = set()
-        keep, remove, affected = [], [], []
-        for r in rows:
-            key = tuple((r.get(k) or "").strip().lower() for k in keys)
-            if key in seen:
-                remove.append(r)
-            else:
-                keep.append(r)
-                seen.add(key)
-                affected.append(r)
-        preview = {
-            "will_remove": len(remove),
-            "will_keep": len(keep),
-            "affected_records": affected[:50],
-            "execute_url": "/api/actions/deduplicate?confirm=true",
-        }
-        if not dry_run:
-            ds["rows"] = keep
-        return preview
+        with dataset_lock(dataset_id):
+            ds = REGISTRY.get(dataset_id)
+            if not ds:
+                raise ValueError("dataset not found")
+            rows = ds.get("rows", [])
+            keys = normalize_keys(rows, key_columns or ["email"])
+            keep = "last" if strategy == "keep_latest" else "first"
+            remove = exact_duplicates(keys, keep)
+            near = 0
+            if fuzzy and len(rows):
+                # Near duplicates among the rows exact matching left, e.g. "Jon" vs "John".
+                live = np.flatnonzero(~remove)
+                cols = list(keys.columns)
+                texts = keys[cols[0]].str.cat([keys[c] for c in cols[1:]], sep=" ")
+                blocks = None
+                if block_on:
+                    live_rows = [rows[i] for i in live]
+                    blocks = normalize_keys(live_rows, block_on)
+                    blocks = pd.util.hash_pandas_object(blocks, index=False).to_numpy()
+                labels = near_duplicate_groups(texts.to_numpy()[live], threshold, blocks)
+                dup = pd.Series(labels).duplicated(keep=keep).to_numpy()
+                remove[live[dup]] = True
+                near = int(dup.sum())
 
-    def fill_missing(self, dataset_id: str, strategy: str = "median"):
-        ds = REGISTRY.get(dataset_id)
-        if not ds:
-            raise ValueError("dataset not found")
-        headers = ds.get("headers", [])
-        rows = ds.get("rows", [])
-        # very naive: if numeric -> median, else -> 'N/A'
-        for h in headers:
-            col = [self._to_float(r.get(h)) for r in rows]
-            numeric = [v for v in col if v is not None]
-            if numeric:
-                med = statistics.median(numeric)
-                for r in rows:
-                    if r.get(h) in (None, "", "NaN"):
-                        r[h] = med
-            else:
-                for r in rows:
-                    if r.get(h) in (None, "", "NaN"):
-                        r[h] = "N/A"
-        return {"status": "ok", "message": "Missing values filled"}
+            removed = np.flatnonzero(remove)
+            preview = {
+                "will_remove": len(removed),
+                "will_keep": len(rows) - len(removed),
+                "near_duplicates": near,
+                "affected_records": [rows[i] for i in removed[:50].tolist()],
+                "execute_url": "/api/actions/deduplicate?confirm=true",
+            }
+            if not dry_run and len(removed):
+                kept = np.flatnonzero(~remove)
+                store = get_store(dataset_id).derive([rows[i] for i in kept.tolist()], keep=kept)
+                commit_store(dataset_id, store, "deduplicate")
+            return preview
 
-    def remove_outliers(self, dataset_id: str, column: str, z: float = 3.0):
-        ds = REGISTRY.get(dataset_id)
-        if not ds:
-            raise ValueError("dataset not found")
-        rows = ds.get("rows", [])
-        vals = [self._to_float(r.get(column)) for r in rows]
-        vals = [v for v in vals if v is not None]
-        if not vals:
-            return {"removed": 0}
-        mean = statistics.mean(vals)
-        stdev = statistics.pstdev(vals) or 1.0
-
-        def is_outlier(v):
-            return abs(v - mean) / stdev > z
+    def fill_missing(
+        self,
+        dataset_id: str,
+        strategy: str = "median",
+        columns: Optional[List[str]] = None,
+        value: Any = None,
+        group_by: Optional[str] = None,
+    ):
+        with dataset_lock(dataset_id):
+            ds = REGISTRY.get(dataset_id)
+            if not ds:
+                raise ValueError("dataset not found")
+            store = get_store(dataset_id)
+            fills = impute(store, strategy, columns, value, group_by)
+            version = dataset_version(ds)
+            if fills:
+                # The next version shares untouched row dicts and column arrays with this one.
+                filled = apply_fills(ds.get("rows", []), fills)
+                derived = store.derive(filled, replaced=filled_columns(store, fills))
+                version = commit_store(dataset_id, derived, "fill_missing")
+            return {
+                "status": "ok",
+                "message": "Missing values filled",
+                "strategy": strategy,
+                "filled": {col: int(len(rows)) for col, (rows, _) in fills.items()},
+                "version": version,
+            }
 
-        kept, removed = [], 0
-        for r in rows:
-            v = self._to_float(r.get(column))
-            if v is not None and is_outlier(v):
-                removed += 1
-                continue
-            kept.append(r)
-        ds["rows"] = kept
-        return {"removed": removed, "kept": len(kept)}
+    def remove_outliers(
+        self,
+        dataset_id: str,
+        column: Optional[str] = None,
+        z: float = 3.0,
+        columns: Optional[List[str]] = None,
+        method: str = "zscore",
+        threshold: Optional[float] = None,
+        dry_run: bool = False,
+    ):
+        with dataset_lock(dataset_id):
+            ds = REGISTRY.get(dataset_id)
+            if not ds:
+                raise ValueError("dataset not found")
+            rows = ds.get("rows", [])
+            if method == "zscore" and threshold is None:
+                threshold = z
+            version = dataset_version(ds)
+            flags = get_outliers(
+                dataset_id, version, columns or ([column] if column else None), method, threshold
+            )
+            result = {
+                "removed": flags.count,
+                "kept": len(rows) - flags.count,
+                "method": method,
+                "by_column": flags.counts,
+                "bounds": flags.bounds,
+            }
+            if dry_run:
+                result["affected_records"] = [rows[i] for i in flags.positions()[:50].tolist()]
+            elif flags.count:
+                kept = np.flatnonzero(~flags.mask())
+                store = get_store(dataset_id).derive([rows[i] for i in kept.tolist()], keep=kept)
+                version = commit_store(dataset_id, store, "remove_outliers")
+            result["version"] = version
+            return result
 
-    def export_segment(self, dataset_id: str, filters: Dict[str, Any] = None):
+    def export_segment(
+        self,
+        dataset_id: str,
+        filters: Union[Dict[str, Any], List[Dict[str, Any]], None] = None,
+        columns: Optional[List[str]] = None,
+    ):
         ds = REGISTRY.get(dataset_id)
         if not ds:
             raise ValueError("dataset not found")
         rows = ds.get("rows", [])
-        headers = ds.get("headers", [])
-        filters = filters or {}
-
-        def ok(r):
-            for k, v in filters.items():
-                if str(r.get(k)) != str(v):
-                    return False
-            return True
+        store = get_store(dataset_id)
+        positions = segment_positions(store, filters)
+        if not columns:
+            result = [rows[i] for i in positions.tolist()]
+            return {"rows": result, "count": len(result), "headers": ds.get("headers", [])}
+        columns = export_columns(store, columns)
+        result = [{c: rows[i].get(c) for c in columns} for i in positions.tolist()]
+        return {"rows": result, "count": len(result), "headers": columns}
 
-        result = [r for r in rows if ok(r)]
-        return {"rows": result, "count": len(result), "headers": headers}
+    def stream_segment(
+        self,
+        dataset_id: str,
+        filters: Union[Dict[str, Any], List[Dict[str, Any]], None] = None,
+        columns: Optional[List[str]] = None,
+        format: str = "csv",
+        gzip: bool = False,
+    ):
+        """
+        (byte chunks, media type, file name) of the segment export. Everything that can
+        fail is checked here, before the first chunk is sent.
+        """
+        if not REGISTRY.get(dataset_id):
+            raise ValueError("dataset not found")
+        check_format(format)
+        store = get_store(dataset_id)
+        columns = export_columns(store, columns)
+        positions = segment_positions(store, filters)
+        filename = f"{dataset_id}.{format}" + (".gz" if gzip and format != "parquet" else "")
+        media_type = "application/gzip" if filename.endswith(".gz") else MEDIA_TYPES[format]
+        return stream_rows(store, positions, columns, format, gzip), media_type, filename
 
     def _to_float(self, v):
         try:
@@ -0,0 +1,248 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+QUANTILES = {"median": 0.5, "p90": 0.9, "p99": 0.99}
+EXACT_AGGREGATES = ("sum", "avg", "count", "count_distinct", "min", "max", *QUANTILES)
+# Opt-in sketches for high-cardinality groupings: HyperLogLog for distinct counts and a
+# log-bucketed quantile sketch (relative error SKETCH_ALPHA) for percentiles.
+APPROX_AGGREGATES = ("approx_count_distinct", *(f"approx_{q}" for q in QUANTILES))
+AGGREGATES = EXACT_AGGREGATES + APPROX_AGGREGATES
+
+HLL_PRECISION = 11  # 2048 registers per group, ~2.3% standard error
+SKETCH_ALPHA = 0.01
+_SKETCH_SHIFT = 1 << 20  # keeps positive and negative bucket keys apart
+
+SQL_TEMPLATES = {
+    "sum": "SUM({c})",
+    "avg": "AVG({c})",
+    "count": "COUNT({c})",
+    "count_distinct": "COUNT(DISTINCT {c})",
+    "min": "MIN({c})",
+    "max": "MAX({c})",
+    "median": "MEDIAN({c})",
+    "p90": "PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY {c})",
+    "p99": "PERCENTILE_CONT(0.99) WITHIN GROUP (ORDER BY {c})",
+    "approx_count_distinct": "APPROX_COUNT_DISTINCT({c})",
+    "approx_median": "APPROX_PERCENTILE({c}, 0.5)",
+    "approx_p90": "APPROX_PERCENTILE({c}, 0.9)",
+    "approx_p99": "APPROX_PERCENTILE({c}, 0.99)",
+}
+
+
+def parse_aggregates(aggregate: Dict[str, object]) -> List[tuple]:
+    """[(column, op)] from {"col": "sum"} or {"col": ["sum", "p90"]}, in request order."""
+    specs = []
+    for col, ops in (aggregate or {}).items():
+        for op in [ops] if isinstance(ops, str) else list(ops or []):
+            op = str(op).lower()
+            if op not in AGGREGATES:
+                raise ValueError(f"unsupported aggregate: {op}")
+            specs.append((col, op))
+    return specs
+
+
+def state_bytes(ops, k: int, rows: int) -> int:
+    """Rough peak memory of aggregating `rows` rows into k groups with these ops."""
+    ops = set(ops)
+    per_group = 16 + 8 * len(ops)  # group codes, first positions and one result per op
+    per_group += 16 * bool(ops & {"sum", "avg"}) + 8 * ("count" in ops)
+    per_row = 16  # group codes and positions of the matched rows
+    if ops & {"min", "max", *QUANTILES}:
+        per_row += 24  # values and the sort order
+    if "count_distinct" in ops:
+        per_row += 16
+    if ops & set(APPROX_AGGREGATES):
+        per_row += 16
+    return k * per_group + rows * per_row
+
+
+def _order_stats(groups, x, k, ops, out):
+    """min / max / exact quantiles from one (group, value) sort."""
+    order = np.lexsort((x, groups))
+    xs = x[order]
+    counts = np.bincount(groups, minlength=k)
+    start = np.cumsum(counts) - counts
+    has = counts > 0
+    last = np.maximum(start + counts - 1, 0)
+
+    def pick(pos):
+        vals = np.full(k, np.nan)
+        vals[has] = xs[pos[has]]
+        return vals
+
+    if "min" in ops:
+        out["min"] = pick(start)
+    if "max" in ops:
+        out["max"] = pick(last)
+    for name, q in QUANTILES.items():
+        if name not in ops:
+            continue
+        # Linear interpolation between order statistics, as np.quantile does.
+        pos = start + q * np.maximum(counts - 1, 0)
+        lo = np.floor(pos).astype(np.intp)
+        hi = np.minimum(lo + 1, last)
+        a, b = pick(lo), pick(hi)
+        out[name] = a + (b - a) * (pos - lo)
+
+
+def _hll_registers(groups, value_codes):
+    """Sparse HyperLogLog registers: (group * m + bucket, rank), max rank per key."""
+    m = 1 << HLL_PRECISION
+    h = pd.util.hash_array(value_codes.astype(np.int64)) >> np.uint64(32)
+    bucket = (h >> np.uint64(32 - HLL_PRECISION)).astype(np.int64)
+    w = (h & np.uint64((1 << (32 - HLL_PRECISION)) - 1)).astype(np.float64)
+    # Position of the leading one bit in the remaining 32 - p bits.
+    bits = np.where(w > 0, np.floor(np.log2(np.maximum(w, 1))) + 1, 0)
+    rank = (32 - HLL_PRECISION) - bits + 1
+    return _reduce(groups.astype(np.int64) * m + bucket, rank, "max")
+
+
+def _hll_estimate(keys, ranks, k):
+    m = 1 << HLL_PRECISION
+    g = (keys // m).astype(np.intp)
+    seen = np.bincount(g, minlength=k)
+    inv = np.bincount(g, weights=2.0**-ranks, minlength=k) + (m - seen)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    est = alpha * m * m / inv
+    empty = m - seen
+    small = (est <= 2.5 * m) & (empty > 0)
+    est[small] = m * np.log(m / empty[small])
+    est[seen == 0] = 0
+    return np.round(est)
+
+
+def sketch_buckets(groups, x):
+    """Log-bucketed quantile sketch: (group bucket key, count) pairs."""
+    gamma = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+    mag = np.abs(x)
+    idx = np.ceil(np.log(np.where(mag > 0, mag, 1)) / np.log(gamma)).astype(np.int64)
+    key = np.where(x > 0, idx + _SKETCH_SHIFT, np.where(x < 0, -(idx + _SKETCH_SHIFT), 0))
+    width = 4 * _SKETCH_SHIFT
+    return _reduce(groups.astype(np.int64) * width + key + 2 * _SKETCH_SHIFT, None, "sum")
+
+
+def sketch_quantile(keys, c, k: int, q: float) -> np.ndarray:
+    """Quantile q of each of k groups from merged sketch buckets; NaN for empty groups."""
+    gamma = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+    width = 4 * _SKETCH_SHIFT
+    g = keys // width
+    bucket = keys % width - 2 * _SKETCH_SHIFT
+    cum = np.cumsum(c)
+    totals = np.bincount(g, weights=c, minlength=k)
+    before = np.cumsum(totals) - totals
+    # Representative value of each bucket, within SKETCH_ALPHA of every value in it.
+    rep_idx = np.abs(bucket) - _SKETCH_SHIFT
+    rep = 2 * gamma ** rep_idx.astype(np.float64) / (gamma + 1)
+    rep = np.where(bucket > 0, rep, np.where(bucket < 0, -rep, 0.0))
+    has = totals > 0
+    target = before + np.floor(q * np.maximum(totals - 1, 0))
+    pos = np.searchsorted(cum, target[has], side="right")
+    vals = np.full(k, np.nan)
+    vals[has] = rep[pos]
+    return vals
+
+
+def _sketch_quantiles(keys, c, k, ops, out):
+    for name, q in QUANTILES.items():
+        if f"approx_{name}" in ops:
+            out[f"approx_{name}"] = sketch_quantile(keys, c, k, q)
+
+
+def _reduce(keys, values, how):
+    """(sorted unique keys, values reduced per key); values None counts the keys."""
+    if values is None:
+        counts = pd.Series(keys).value_counts(sort=False)
+        keys = counts.index.to_numpy(dtype=np.int64)
+        order = np.argsort(keys)
+        return keys[order], counts.to_numpy()[order]
+    reduced = pd.Series(values).groupby(keys, sort=True).agg(how)
+    return reduced.index.to_numpy(dtype=np.int64), reduced.to_numpy(dtype=np.float64)
+
+
+def partial_aggregate(store, col: str, groups, k: int, ops, mask, rows=slice(None)) -> dict:
+    """
+    Mergeable state for the requested aggregates of one column over the masked rows of
+    one partition. rows selects the partition, mask is the filter over those rows and
+    groups holds the group code (0..k-1) of every masked row.
+    """
+    ops = set(ops)
+    state: dict = {}
+    x = store.numeric(col)[rows][mask]
+
+    if ops & {"sum", "avg"}:
+        # Values float() rejects count as 0 in sums and averages, as before; inf stays inf.
+        state["sum"] = np.bincount(groups, weights=np.where(np.isnan(x), 0.0, x), minlength=k)
+        state["rows"] = np.bincount(groups, minlength=k)
+
+    if ops & {"count", "count_distinct", "approx_count_distinct"}:
+        value_codes, uniques = store.codes(col)
+        value_codes = value_codes[rows][mask]
+        present = ~np.array([u is None for u in uniques], dtype=bool)[value_codes]
+        g, v = groups[present], value_codes[present]
+        if "count" in ops:
+            state["count"] = np.bincount(g, minlength=k)
+        if "count_distinct" in ops:
+            state["pairs"] = pd.unique(g.astype(np.int64) * max(len(uniques), 1) + v)
+        if "approx_count_distinct" in ops:
+            state["hll"] = _hll_registers(g, v)
+
+    valid = ~np.isnan(x)
+    if ops & set(QUANTILES):
+        # Exact percentiles need every value; partitions hand theirs over, and the one
+        # sort at the end serves min and max too.
+        state["values"] = (groups[valid], x[valid])
+    elif ops & {"min", "max"}:
+        _order_stats(groups[valid], x[valid], k, ops, state)
+    if ops & {f"approx_{q}" for q in QUANTILES}:
+        state["sketch"] = sketch_buckets(groups[valid], x[valid])
+    return state
+
+
+def merge_partials(states: List[dict]) -> dict:
+    """One state from the partition states: counters add, extremes and registers combine."""
+    if len(states) == 1:
+        return states[0]
+    merged: dict = {}
+    for name in states[0]:
+        parts = [s[name] for s in states]
+        if name in ("sum", "rows", "count"):
+            merged[name] = np.sum(parts, axis=0)
+        elif name == "min":
+            merged[name] = np.fmin.reduce(parts)
+        elif name == "max":
+            merged[name] = np.fmax.reduce(parts)
+        elif name == "pairs":
+            merged[name] = pd.unique(np.concatenate(parts))
+        elif name == "values":
+            merged[name] = tuple(np.concatenate(p) for p in zip(*parts))
+        else:
+            keys = np.concatenate([p[0] for p in parts])
+            values = np.concatenate([p[1] for p in parts])
+            merged[name] = _reduce(keys, values, "max" if name == "hll" else "sum")
+    return merged
+
+
+def finish_aggregate(store, col: str, state: dict, k: int, ops) -> Dict[str, np.ndarray]:
+    ops = set(ops)
+    out: Dict[str, np.ndarray] = {}
+    if "sum" in state:
+        out["sum"] = state["sum"].astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["avg"] = state["sum"] / state["rows"]
+    if "count" in state:
+        out["count"] = state["count"].astype(np.float64)
+    if "pairs" in state:
+        width = max(len(store.codes(col)[1]), 1)
+        out["count_distinct"] = np.bincount(state["pairs"] // width, minlength=k).astype(np.float64)
+    if "hll" in state:
+        out["approx_count_distinct"] = _hll_estimate(*state["hll"], k)
+    for op in ("min", "max"):
+        if op in state:
+            out[op] = state[op]
+    if "values" in state:
+        _order_stats(*state["values"], k, ops, out)
+    if "sketch" in state:
+        _sketch_quantiles(*state["sketch"], k, ops, out)
+    return {op: out[op] for op in ops}
@@ -0,0 +1,100 @@
+import time
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+
+# Cost model: every stage declares a relative weight (work per cell). Until a stage
+# has actually been timed we assume this many milliseconds per weighted cell.
+DEFAULT_MS_PER_CELL = 0.0001
+# Keep a slice of the budget for serialization and the network hop.
+BUDGET_SAFETY = 0.8
+# Below this many rows a sampled stage is not worth reporting.
+MIN_SAMPLE_ROWS = 200
+
+EXACT = "exact"
+APPROXIMATE = "approximate"
+SKIPPED = "skipped"
+
+
+class AnalysisScheduler:
+    """
+    Runs analysis stages against a wall-clock budget.
+
+    Stages are executed exactly while the estimated cost fits the remaining budget,
+    on a uniform row sample when it does not, and are skipped once the budget is gone.
+    Without a deadline every stage runs exactly.
+    """
+
+    def __init__(self, df: pd.DataFrame, deadline_ms: Optional[float] = None):
+        self.df = df
+        self.deadline_ms = deadline_ms
+        self.started = time.perf_counter()
+        self.ms_per_cell = DEFAULT_MS_PER_CELL
+        self._calibrated = False
+        self.sections: Dict[str, Dict[str, Any]] = {}
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def remaining_ms(self) -> float:
+        if self.deadline_ms is None:
+            return float("inf")
+        return self.deadline_ms * BUDGET_SAFETY - self.elapsed_ms()
+
+    def _estimate_ms(self, rows: int, weight: float) -> float:
+        return rows * max(self.df.shape[1], 1) * weight * self.ms_per_cell
+
+    def run(
+        self,
+        name: str,
+        fn: Callable[[pd.DataFrame], Any],
+        weight: float = 1.0,
+        default: Any = None,
+    ) -> Any:
+        n_rows = len(self.df)
+        remaining = self.remaining_ms()
+
+        if remaining <= 0:
+            self.sections[name] = {"status": SKIPPED, "ms": 0}
+            return default
+
+        if self._estimate_ms(n_rows, weight) <= remaining:
+            return self._timed(name, fn, self.df, weight, EXACT, default)
+
+        # Not enough budget for the full frame: shrink to what fits.
+        per_row = self._estimate_ms(1, weight)
+        sample_rows = int(remaining / per_row) if per_row > 0 else n_rows
+        if sample_rows < min(MIN_SAMPLE_ROWS, n_rows):
+            self.sections[name] = {"status": SKIPPED, "ms": 0}
+            return default
+        sample = self.df.sample(n=min(sample_rows, n_rows), random_state=0)
+        return self._timed(name, fn, sample, weight, APPROXIMATE, default)
+
+    def _timed(self, name, fn, frame, weight, status, default):
+        t0 = time.perf_counter()
+        try:
+            result = fn(frame)
+        except Exception as e:
+            self.sections[name] = {"status": SKIPPED, "ms": 0, "error": str(e)}
+            return default
+        ms = (time.perf_counter() - t0) * 1000
+
+        # Re-calibrate the cost model from what this stage really took. The first
+        # measurement replaces the default guess; later ones only make it more pessimistic.
+        cells = len(frame) * max(frame.shape[1], 1) * weight
+        if cells:
+            measured = ms / cells
+            self.ms_per_cell = measured if not self._calibrated else max(self.ms_per_cell, measured)
+            self._calibrated = True
+
+        self.sections[name] = {"status": status, "ms": round(ms, 2)}
+        if status == APPROXIMATE:
+            self.sections[name]["sample_rows"] = int(len(frame))
+        return result
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "deadline_ms": self.deadline_ms,
+            "partial": any(s["status"] != EXACT for s in self.sections.values()),
+            "sections": self.sections,
+        }
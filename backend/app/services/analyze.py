@@ -1,6 +1,11 @@
 from typing import Any, Dict, List
 
+import numpy as np
 import pandas as pd
+from app.intelligence.correlation_engine import associations_for, top_correlations
+from app.services.column_store import get_store
+from app.services.query_builder import run_explore_query
+from app.services.registry import get_dataset
 
 
 def explore_query(rows: List[Dict[str, Any]], metric: str, by: str | None = None) -> Dict[str, Any]:
@@ -20,6 +25,36 @@ def explore_query(rows: List[Dict[str, Any]], metric: str, by: str | None = None
     return {"series": [df[metric].sum()], "categories": ["Total"], "ok": True}
 
 
+def explore_dataset(dataset_id: str, metric: str, by: str | None = None) -> Dict[str, Any]:
+    """explore_query over a registered dataset; hot slices are answered from cubes."""
+    ds = get_dataset(dataset_id)
+    headers = ds.get("headers", [])
+    if metric not in headers:
+        return {"series": [], "categories": [], "ok": True, "message": "Metric not found"}
+    if by and by in headers:
+        res = run_explore_query(
+            dataset_id,
+            {
+                "group_by": by,
+                "aggregate": {metric: "sum"},
+                "sort": {by: "asc"},
+                "limit": max(len(ds.get("rows", [])), 1),
+            },
+        )
+        # Like groupby(), leave out rows without a dimension value.
+        groups = [r for r in res["results"] if r[by] is not None]
+        return {
+            "series": [r[f"{metric}_sum"] for r in groups],
+            "categories": [str(r[by]) for r in groups],
+            "ok": True,
+        }
+    return {
+        "series": [float(np.nansum(get_store(dataset_id).numeric(metric)))],
+        "categories": ["Total"],
+        "ok": True,
+    }
+
+
 def correlate(rows: List[Dict[str, Any]], target: str) -> Dict[str, Any]:
     if not rows:
         return {"ok": True, "correlations": []}
@@ -29,11 +64,15 @@ def correlate(rows: List[Dict[str, Any]], target: str) -> Dict[str, Any]:
     num_df = df.select_dtypes(include="number")
     if target not in num_df.columns or len(num_df.columns) < 2:
         return {"ok": True, "correlations": []}
-    corr = (
-        num_df.corr(numeric_only=True)[target]
-        .drop(labels=[target])
-        .dropna()
-        .sort_values(ascending=False)
-    )
-    out = [{"feature": k, "r": float(v)} for k, v in corr.items()]
+    pairs = top_correlations(num_df, k=None, target=str(target))
+    out = [{"feature": p["b"], "r": p["r"]} for p in sorted(pairs, key=lambda p: -p["r"])]
     return {"ok": True, "correlations": out}
+
+
+def associate(rows: List[Dict[str, Any]], target: str | None = None) -> Dict[str, Any]:
+    if not rows:
+        return {"ok": True, "associations": []}
+    df = pd.DataFrame(rows)
+    if target and target not in df.columns:
+        return {"ok": True, "associations": [], "message": "Target not found"}
+    return {"ok": True, **associations_for(df, target=target or None)}
@@ -0,0 +1,209 @@
+import math
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from app.models.schemas import BinSpec
+from app.services.cache import LRUCache
+from app.services.registry import dataset_version, get_dataset, register_version_hook
+
+# Uniform sample kept while streaming, used for quantile and Freedman–Diaconis edges.
+SAMPLE_SIZE = 20000
+# Freedman–Diaconis can ask for absurd bin counts on heavy-tailed data.
+MAX_FD_BINS = 200
+# Rows per chunk when binning a registered dataset.
+CHUNK_ROWS = 100000
+
+BIN_CACHE = LRUCache(max_entries=512)
+
+Chunks = Callable[[], Iterable[Any]]
+
+
+def _to_numeric(chunk) -> np.ndarray:
+    return pd.to_numeric(pd.Series(chunk, dtype=object), errors="coerce").to_numpy(dtype=float)
+
+
+class _Profile:
+    """Single streaming pass: counts, extremes and a uniform bottom-k sample."""
+
+    def __init__(self, seed: int = 0):
+        self.count = 0
+        self.missing = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.min_positive = math.inf
+        self._rng = np.random.default_rng(seed)
+        self._keys = np.empty(0)
+        self._sample = np.empty(0)
+
+    def add(self, x: np.ndarray) -> None:
+        finite = np.isfinite(x)
+        self.missing += int((~finite).sum())
+        x = x[finite]
+        if not len(x):
+            return
+        self.count += len(x)
+        self.min = min(self.min, float(x.min()))
+        self.max = max(self.max, float(x.max()))
+        pos = x[x > 0]
+        if len(pos):
+            self.min_positive = min(self.min_positive, float(pos.min()))
+
+        # Keeping the rows with the k smallest random keys is a uniform sample of
+        # everything seen so far, and merges across chunks.
+        keys = np.concatenate([self._keys, self._rng.random(len(x))])
+        vals = np.concatenate([self._sample, x])
+        if len(keys) > SAMPLE_SIZE:
+            keep = np.argpartition(keys, SAMPLE_SIZE - 1)[:SAMPLE_SIZE]
+            keys, vals = keys[keep], vals[keep]
+        self._keys, self._sample = keys, vals
+
+    @property
+    def sample(self) -> np.ndarray:
+        return self._sample
+
+
+def _edges(spec: BinSpec, prof: _Profile) -> np.ndarray:
+    lo, hi = spec.range if spec.range else (prof.min, prof.max)
+    if spec.mode == "log":
+        lo = max(lo, prof.min_positive)
+        if not (math.isfinite(lo) and hi > 0):
+            return np.empty(0)
+        if lo >= hi:
+            return np.array([lo, lo * 10])
+        return np.geomspace(lo, hi, spec.bins + 1)
+
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    if spec.mode == "quantile":
+        qs = np.quantile(prof.sample, np.linspace(0, 1, spec.bins + 1))
+        qs[0], qs[-1] = lo, hi
+        return np.unique(qs)
+    if spec.mode == "fd":
+        q1, q3 = np.quantile(prof.sample, [0.25, 0.75])
+        width = 2 * (q3 - q1) * prof.count ** (-1 / 3)
+        bins = int(math.ceil((hi - lo) / width)) if width > 0 else spec.bins
+        return np.linspace(lo, hi, max(1, min(bins, MAX_FD_BINS)) + 1)
+    return np.linspace(lo, hi, spec.bins + 1)
+
+
+def _fmt(v: float) -> str:
+    return f"{v:.4g}"
+
+
+def _numeric_bins(chunks: Chunks, spec: BinSpec) -> Dict[str, Any]:
+    prof = _Profile()
+    for chunk in chunks():
+        prof.add(_to_numeric(chunk))
+    if prof.count == 0:
+        return {
+            "mode": spec.mode,
+            "labels": [],
+            "counts": [],
+            "edges": [],
+            "total": 0,
+            "missing": prof.missing,
+            "excluded": 0,
+        }
+
+    edges = _edges(spec, prof)
+    nb = len(edges) - 1
+    counts = np.zeros(max(nb, 0), dtype=np.int64)
+    counted = 0
+    if nb > 0:
+        for chunk in chunks():
+            x = _to_numeric(chunk)
+            x = x[np.isfinite(x)]
+            # Same convention as np.histogram: half-open bins, last one closed.
+            idx = np.searchsorted(edges, x, side="right") - 1
+            idx[x == edges[-1]] = nb - 1
+            idx = idx[(idx >= 0) & (idx < nb)]
+            counts += np.bincount(idx, minlength=nb)
+            counted += len(idx)
+
+    return {
+        "mode": spec.mode,
+        "labels": [f"{_fmt(a)}–{_fmt(b)}" for a, b in zip(edges[:-1], edges[1:])],
+        "counts": counts.tolist(),
+        "edges": edges.tolist(),
+        "total": counted,
+        "missing": prof.missing,
+        "excluded": prof.count - counted,
+    }
+
+
+def _categorical_bins(chunks: Chunks, spec: BinSpec) -> Dict[str, Any]:
+    totals: Optional[pd.Series] = None
+    missing = 0
+    for chunk in chunks():
+        s = pd.Series(chunk, dtype=object)
+        isna = s.isna() | (s == "")
+        missing += int(isna.sum())
+        vc = s[~isna].astype(str).value_counts()
+        totals = vc if totals is None else totals.add(vc, fill_value=0)
+
+    if totals is None or totals.empty:
+        return {
+            "mode": "categorical",
+            "labels": [],
+            "counts": [],
+            "total": 0,
+            "missing": missing,
+            "other": 0,
+        }
+    totals = totals.astype(np.int64).sort_values(ascending=False, kind="stable")
+    top = totals.head(spec.top_n)
+    other = int(totals.iloc[spec.top_n :].sum())
+    labels, counts = top.index.tolist(), top.values.tolist()
+    if other:
+        labels.append("Other")
+        counts.append(other)
+    return {
+        "mode": "categorical",
+        "labels": labels,
+        "counts": counts,
+        "total": int(totals.sum()),
+        "missing": missing,
+        "other": other,
+    }
+
+
+def compute_bins(data, spec: Optional[BinSpec] = None) -> Dict[str, Any]:
+    """
+    Bin a column.
+
+    ``data`` is either an in-memory sequence/Series, or a zero-argument callable that
+    returns a fresh iterator of chunks; numeric modes read it twice (profile, count),
+    so memory stays bounded by the chunk size.
+    """
+    spec = spec or BinSpec()
+    chunks: Chunks = data if callable(data) else (lambda: [data])
+    if spec.mode == "categorical":
+        return _categorical_bins(chunks, spec)
+    return _numeric_bins(chunks, spec)
+
+
+def bins_for_dataset(dataset_id: str, column: str, spec: Optional[BinSpec] = None):
+    spec = spec or BinSpec()
+    ds = get_dataset(dataset_id)
+    if column not in ds.get("headers", []):
+        raise ValueError(f"column not found: {column}")
+    key = (dataset_id, dataset_version(ds), column, spec.key())
+    cached = BIN_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    rows = ds.get("rows", [])
+
+    def chunks():
+        for a in range(0, len(rows), CHUNK_ROWS):
+            yield [r.get(column) for r in rows[a : a + CHUNK_ROWS]]
+
+    result = {"column": column, **compute_bins(chunks, spec)}
+    BIN_CACHE.put(key, result)
+    return result
+
+
+@register_version_hook
+def _drop_stale(dataset_id: str, ds: dict, old_version: int, new_version: int, appended) -> None:
+    BIN_CACHE.invalidate(lambda k: k[0] == dataset_id)
@@ -0,0 +1,231 @@
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Columns with more distinct values than this get no bitmap (k bitmaps of n bits each).
+BITMAP_MAX_CARDINALITY = 128
+# Missing timestamps in int64 nanosecond columns.
+NAT = np.iinfo(np.int64).min
+
+
+class BitmapIndex:
+    """One packed bitmap per distinct value; eq/in become byte-wise AND/OR."""
+
+    kind = "bitmap"
+
+    def __init__(self, values: np.ndarray):
+        self.n_rows = len(values)
+        codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+        self.lookup = {u: i for i, u in enumerate(uniques)}
+        self.bitmaps = np.empty((len(uniques), (self.n_rows + 7) // 8), dtype=np.uint8)
+        for i in range(len(uniques)):
+            self.bitmaps[i] = np.packbits(codes == i)
+
+    def eq(self, value) -> np.ndarray:
+        i = self.lookup.get(value)
+        if i is None:
+            return np.zeros(self.bitmaps.shape[1], dtype=np.uint8)
+        return self.bitmaps[i]
+
+    def isin(self, values: Iterable) -> np.ndarray:
+        rows = [self.lookup[v] for v in values if v in self.lookup]
+        if not rows:
+            return np.zeros(self.bitmaps.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bitmaps[rows], axis=0)
+
+    def nbytes(self) -> int:
+        return int(self.bitmaps.nbytes)
+
+
+class SortedIndex:
+    """Sort permutation over non-missing values; range filters are two binary searches."""
+
+    kind = "sorted"
+
+    def __init__(self, values: np.ndarray, present: Optional[np.ndarray] = None):
+        self.n_rows = len(values)
+        if present is None:
+            present = ~pd.isna(values) if values.dtype == object else ~np.isnan(values)
+        rows = np.flatnonzero(present)
+        order = np.argsort(values[rows], kind="stable")
+        self.perm = rows[order]
+        self.sorted = values[self.perm]
+
+    def rows(
+        self,
+        lo: Any = None,
+        hi: Any = None,
+        lo_inclusive: bool = True,
+        hi_inclusive: bool = True,
+    ) -> np.ndarray:
+        """Positions of rows in the range (in value order): two searches plus the output."""
+        i0 = (
+            0
+            if lo is None
+            else np.searchsorted(self.sorted, lo, "left" if lo_inclusive else "right")
+        )
+        i1 = (
+            len(self.sorted)
+            if hi is None
+            else np.searchsorted(self.sorted, hi, "right" if hi_inclusive else "left")
+        )
+        return self.perm[i0 : max(i0, i1)]
+
+    def range(
+        self,
+        lo: Any = None,
+        hi: Any = None,
+        lo_inclusive: bool = True,
+        hi_inclusive: bool = True,
+    ) -> np.ndarray:
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[self.rows(lo, hi, lo_inclusive, hi_inclusive)] = True
+        return mask
+
+    def nbytes(self) -> int:
+        return int(self.perm.nbytes + self.sorted.nbytes)
+
+
+class TrigramIndex:
+    """
+    Inverted index from lowercased character trigrams to rows. A substring or prefix
+    search intersects the postings of the needle's trigrams and verifies only those rows.
+    """
+
+    kind = "trigram"
+
+    def __init__(self, strings: np.ndarray):
+        self.lowered = pd.Series(strings, dtype=object).str.lower().to_numpy(dtype=object)
+        n = len(self.lowered)
+        lengths = np.fromiter(map(len, self.lowered), dtype=np.int64, count=n)
+        # One code point per character, values separated by NUL, so every window maps
+        # back to its row through the lengths.
+        text = "\x00".join(self.lowered) + "\x00"
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        row_of = np.repeat(np.arange(n, dtype=np.int32), lengths + 1)
+        a, b, c = codes[:-2], codes[1:-1], codes[2:]
+        keep = (a != 0) & (b != 0) & (c != 0)
+        keys = ((a << 42) | (b << 21) | c)[keep]
+        rows = row_of[:-2][keep]
+        # Stable sort keeps rows ascending within each trigram; drop repeats within a row.
+        order = np.argsort(keys, kind="stable")
+        keys, rows = keys[order], rows[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+        keys, self.rows = keys[first], rows[first]
+        self.keys, self.starts = np.unique(keys, return_index=True)
+        self.ends = np.append(self.starts[1:], len(self.rows))
+
+    @staticmethod
+    def _trigrams(needle: str) -> List[int]:
+        cp = [ord(ch) for ch in needle]
+        return sorted({(cp[i] << 42) | (cp[i + 1] << 21) | cp[i + 2] for i in range(len(cp) - 2)})
+
+    def _candidates(self, needle: str) -> Optional[np.ndarray]:
+        if len(needle) < 3:
+            return None
+        postings = []
+        for key in self._trigrams(needle):
+            i = np.searchsorted(self.keys, key)
+            if i == len(self.keys) or self.keys[i] != key:
+                return np.empty(0, dtype=np.int32)
+            postings.append(self.rows[self.starts[i] : self.ends[i]])
+        postings.sort(key=len)
+        rows = postings[0]
+        for p in postings[1:]:
+            rows = np.intersect1d(rows, p, assume_unique=True)
+            if not len(rows):
+                break
+        return rows
+
+    def search(self, needle: str, prefix: bool = False) -> np.ndarray:
+        """Sorted positions of rows containing (or starting with) needle, ignoring case."""
+        needle = needle.lower()
+        rows = self._candidates(needle)
+        values = pd.Series(self.lowered if rows is None else self.lowered[rows], dtype=object)
+        hit = values.str.startswith(needle) if prefix else values.str.contains(needle, regex=False)
+        hit = hit.to_numpy(dtype=bool)
+        return np.flatnonzero(hit) if rows is None else rows[hit].astype(np.intp)
+
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes + self.starts.nbytes + self.ends.nbytes + self.rows.nbytes)
+
+
+class IndexManager:
+    """
+    Lazily built secondary indexes for one ColumnStore.
+
+    A column is indexed only after it has been filtered on ``build_after`` times, so
+    one-off filters never pay the build cost.
+    """
+
+    def __init__(self, store, build_after: int = 3, enabled: bool = True):
+        self.store = store
+        self.build_after = build_after
+        self.enabled = enabled
+        self._uses: Dict[tuple, int] = {}
+        self._indexes: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: tuple, build, build_after: Optional[int] = None) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            if key in self._indexes:
+                return self._indexes[key]
+            self._uses[key] = self._uses.get(key, 0) + 1
+            if self._uses[key] < (self.build_after if build_after is None else build_after):
+                return None
+        index = build()
+        with self._lock:
+            self._indexes[key] = index
+        return index
+
+    def bitmap(self, col: str) -> Optional[BitmapIndex]:
+        """Bitmap over str() values, or None if not (yet) indexed or too many values."""
+        key = (col, "bitmap")
+        if self._indexes.get(key, True) is None:
+            return None
+
+        def build():
+            strings = self.store.strings(col)
+            if len(pd.unique(strings)) > BITMAP_MAX_CARDINALITY:
+                return None
+            return BitmapIndex(strings)
+
+        return self._get(key, build)
+
+    def sorted_numeric(self, col: str) -> Optional[SortedIndex]:
+        return self._get((col, "numeric"), lambda: SortedIndex(self.store.numeric(col)))
+
+    def sorted_strings(self, col: str) -> Optional[SortedIndex]:
+        return self._get((col, "string"), lambda: SortedIndex(self.store.strings(col)))
+
+    def trigram(self, col: str) -> Optional[TrigramIndex]:
+        return self._get((col, "trigram"), lambda: TrigramIndex(self.store.strings(col)))
+
+    def time(self, col: str) -> Optional[SortedIndex]:
+        """Sorted index over parsed timestamps; built on first use, next to the parse."""
+        dates = self.store.dates(col)
+        if dates is None:
+            return None
+        return self._get((col, "time"), lambda: SortedIndex(dates, dates != NAT), build_after=1)
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "build_after": self.build_after,
+                "indexes": [
+                    {"column": col, "kind": kind, "bytes": idx.nbytes()}
+                    for (col, kind), idx in self._indexes.items()
+                    if idx is not None
+                ],
+                "filter_counts": {f"{c}:{k}": n for (c, k), n in self._uses.items()},
+            }
+
+
+def unpack(bitmap: np.ndarray, n_rows: int) -> np.ndarray:
+    return np.unpackbits(bitmap, count=n_rows).astype(bool)
@@ -0,0 +1,176 @@
+import warnings
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from app.config import settings
+from app.services.cache import LRUCache
+from app.services.column_index import IndexManager
+from app.services.registry import (
+    commit_rows,
+    dataset_token,
+    dataset_version,
+    get_dataset,
+    register_version_hook,
+)
+
+STORE_CACHE = LRUCache(max_entries=16)
+# Share of non-missing values that must parse for a column to count as a date column.
+DATE_MIN_PARSED = 0.9
+
+
+class ColumnStore:
+    """
+    Column arrays for one version of a registered dataset.
+
+    Rows are converted to columns once; typed views (numeric, string, factorized codes)
+    are derived lazily per column and kept for the lifetime of the version.
+    """
+
+    def __init__(self, headers: List[str], rows: List[dict]):
+        self.headers = list(headers)
+        self.rows = rows
+        self.n_rows = len(rows)
+        # Values are kept exactly as stored (no dtype inference), so str()/float()
+        # semantics of the row-wise code are preserved.
+        self._raw: Dict[str, np.ndarray] = {
+            h: np.fromiter((r.get(h) for r in rows), dtype=object, count=self.n_rows)
+            for h in self.headers
+        }
+        self._numeric: Dict[str, np.ndarray] = {}
+        self._strings: Dict[str, np.ndarray] = {}
+        self._codes: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._dates: Dict[str, Optional[np.ndarray]] = {}
+        self.indexes = IndexManager(
+            self,
+            build_after=settings.EXPLORE_INDEX_BUILD_AFTER,
+            enabled=settings.EXPLORE_INDEXES_ENABLED,
+        )
+
+    @classmethod
+    def from_columns(cls, headers: List[str], columns: Dict[str, np.ndarray]) -> "ColumnStore":
+        """Store over ready-made object columns (e.g. a join result); rows are built on demand."""
+        store = cls(headers, [])
+        store._raw = {h: columns[h] for h in store.headers}
+        store.n_rows = len(columns[store.headers[0]]) if store.headers else 0
+        store.rows = None
+        return store
+
+    def derive(
+        self,
+        rows: List[dict],
+        keep: Optional[np.ndarray] = None,
+        replaced: Optional[Dict[str, np.ndarray]] = None,
+    ) -> "ColumnStore":
+        """
+        Store for a child version holding `rows`: this store's rows at `keep` (all of
+        them when None), with the `replaced` columns swapped in. Other columns share
+        this store's arrays and typed views, or are sliced from them when rows were
+        dropped; nothing is read back out of the row dicts.
+        """
+        replaced = replaced or {}
+        store = ColumnStore(self.headers, [])
+        store.rows = rows
+        store.n_rows = len(rows)
+
+        def pick(values):
+            return values if keep is None or values is None else values[keep]
+
+        store._raw = {h: replaced[h] if h in replaced else pick(self._raw[h]) for h in self._raw}
+        for name in ("_numeric", "_strings", "_dates"):
+            views = getattr(self, name)
+            setattr(store, name, {h: pick(v) for h, v in views.items() if h not in replaced})
+        if keep is None:
+            # Dropping rows can leave unused uniques behind, so codes are only shared.
+            store._codes = {h: v for h, v in self._codes.items() if h not in replaced}
+        return store
+
+    def has(self, col: str) -> bool:
+        return col in self._raw
+
+    def raw(self, col: str) -> np.ndarray:
+        if col not in self._raw:
+            # Same as r.get(col) on a row without the key.
+            return np.full(self.n_rows, None, dtype=object)
+        return self._raw[col]
+
+    def numeric(self, col: str) -> np.ndarray:
+        """float64 view; values that float() would reject become NaN."""
+        if col not in self._numeric:
+            raw = self.raw(col)
+            self._numeric[col] = pd.to_numeric(pd.Series(raw), errors="coerce").to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )
+        return self._numeric[col]
+
+    def strings(self, col: str) -> np.ndarray:
+        """str() of every value, as the row-wise code compared them."""
+        if col not in self._strings:
+            self._strings[col] = pd.Series(self.raw(col)).astype(str).to_numpy(dtype=object)
+        return self._strings[col]
+
+    def codes(self, col: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Factorized (codes, uniques); missing values form their own group."""
+        if col not in self._codes:
+            codes, uniques = pd.factorize(pd.Series(self.raw(col)), use_na_sentinel=False)
+            uniques = np.asarray(uniques, dtype=object)
+            uniques[pd.isna(uniques)] = None
+            self._codes[col] = (codes.astype(np.intp), uniques)
+        return self._codes[col]
+
+    def dates(self, col: str) -> Optional[np.ndarray]:
+        """
+        UTC timestamps as int64 nanoseconds (NaT for missing), parsed once per column; None
+        when the column does not hold dates. Numbers are never read as epoch offsets.
+        """
+        if col not in self._dates:
+            self._dates[col] = _parse_dates(self.raw(col))
+        return self._dates[col]
+
+    def take(self, idx: np.ndarray) -> List[Dict[str, Any]]:
+        if self.rows is None:
+            columns = [self._raw[h][idx] for h in self.headers]
+            return [dict(zip(self.headers, values)) for values in zip(*columns)]
+        return [self.rows[i] for i in idx]
+
+
+def _parse_dates(raw: np.ndarray) -> Optional[np.ndarray]:
+    values = pd.Series(raw)
+    present = values.notna()
+    if not present.any():
+        return None
+    sample = values[present].head(1000)
+    if sample.map(lambda v: isinstance(v, (int, float, np.number))).any():
+        return None
+    with warnings.catch_warnings():
+        # Mixed formats fall back to per-value parsing, which is what we want here.
+        warnings.simplefilter("ignore", UserWarning)
+        parsed = pd.to_datetime(values, errors="coerce", utc=True)
+    if parsed[present].notna().mean() < DATE_MIN_PARSED:
+        # Inference follows the first value's format; retry per value for mixed formats.
+        parsed = pd.to_datetime(values, errors="coerce", utc=True, format="mixed")
+        if parsed[present].notna().mean() < DATE_MIN_PARSED:
+            return None
+    return parsed.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def get_store(dataset_id: str) -> ColumnStore:
+    ds = get_dataset(dataset_id)
+    key = (dataset_id, dataset_token(ds), dataset_version(ds))
+    store = STORE_CACHE.get(key)
+    if store is None:
+        store = ColumnStore(ds.get("headers", []), ds.get("rows", []))
+        STORE_CACHE.put(key, store)
+    return store
+
+
+def commit_store(dataset_id: str, store: ColumnStore, action: str) -> int:
+    """Publish a derived store's rows as the next version, and its columns along with them."""
+    version = commit_rows(dataset_id, store.rows, action, headers=store.headers)
+    STORE_CACHE.put((dataset_id, dataset_token(get_dataset(dataset_id)), version), store)
+    return version
+
+
+@register_version_hook
+def _drop_stale(dataset_id: str, ds: dict, old_version: int, new_version: int, appended) -> None:
+    STORE_CACHE.invalidate(lambda k: k[0] == dataset_id)
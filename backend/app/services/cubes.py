@@ -0,0 +1,212 @@
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from app.config import settings
+from app.services.aggregates import parse_aggregates
+from app.services.cache import LRUCache
+from app.services.column_store import get_store
+from app.services.explore_engine import grouped_plan
+from app.services.query_cache import normalize_operator
+from app.services.registry import register_version_hook
+
+# Aggregates answerable from a cube; each derives from mergeable per-cell partials.
+CUBE_OPS = ("sum", "avg", "count", "min", "max")
+_PARTIALS = {
+    "_sum": "sum",
+    "_rows": "sum",
+    "_count": "sum",
+    "_min": "min",
+    "_max": "max",
+    "_first": "min",  # first row position, to keep Explore's group order
+}
+
+# (dataset_id, dims, metric) -> {"version": int, "frame": one row per dimension cell}
+CUBE_CACHE = LRUCache(max_entries=settings.CUBE_MAX_ENTRIES)
+
+# How often each (dims, metric) pattern was asked for, and patterns whose cube turned
+# out too large to be worth keeping.
+_PATTERNS: Dict[str, Counter] = {}
+_REJECTED: Dict[str, set] = {}
+_LOCK = threading.Lock()
+
+
+def _text(dim: str) -> str:
+    # str() form of a dimension, which is what eq / in filters compare.
+    return f"{dim}\x00str"
+
+
+def _group_cells(frame: pd.DataFrame, dims: Tuple[str, ...]) -> pd.DataFrame:
+    """
+    Merge rows sharing the same dimension values. Cells are keyed by each raw value
+    (grouped like Explore's factorized codes) together with its str() form, so filters
+    see exactly the strings a scan would.
+    """
+    codes, values = [], {}
+    for d in dims:
+        for col in (d, _text(d)):
+            c, u = pd.factorize(frame[col].to_numpy(dtype=object), use_na_sentinel=False)
+            codes.append(c)
+            values[col] = np.asarray(u, dtype=object)
+    grouped = frame[list(_PARTIALS)].groupby(codes, sort=False).agg(_PARTIALS)
+    cells = {
+        col: u[grouped.index.get_level_values(i).to_numpy()]
+        for i, (col, u) in enumerate(values.items())
+    }
+    cells.update({c: grouped[c].to_numpy() for c in _PARTIALS})
+    return pd.DataFrame(cells)
+
+
+def _build(dims: Tuple[str, ...], columns: Dict[str, np.ndarray], metric: str, offset: int):
+    raw = columns[metric]
+    x = pd.to_numeric(pd.Series(raw), errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    frame = pd.DataFrame(
+        {
+            **{d: np.asarray(columns[d], dtype=object) for d in dims},
+            **{_text(d): pd.Series(columns[d]).astype(str).to_numpy(dtype=object) for d in dims},
+        }
+    )
+    frame["_sum"] = np.where(np.isnan(x), 0.0, x)
+    frame["_rows"] = 1
+    frame["_count"] = ~pd.isna(raw)
+    frame["_min"] = x
+    frame["_max"] = x
+    frame["_first"] = np.arange(offset, offset + len(raw))
+    return _group_cells(frame, dims)
+
+
+def _pattern(query: Dict[str, Any]):
+    """(dims, specs, filters) when a query can be served from a cube, else None."""
+    group_by = query.get("group_by")
+    if not group_by or not query.get("aggregate"):
+        return None
+    try:
+        specs = parse_aggregates(query["aggregate"])
+    except ValueError:
+        return None
+    if any(op not in CUBE_OPS for _, op in specs):
+        return None
+    filters = []
+    for f in query.get("filters") or []:
+        op = normalize_operator(f.get("operator"))
+        if op not in ("eq", "in") or not f.get("column"):
+            return None
+        filters.append((f["column"], op, f.get("value")))
+    dims = tuple(sorted({group_by, *(c for c, _, _ in filters)}))
+    return dims, specs, filters
+
+
+def _find(dataset_id: str, version: int, dims: Tuple[str, ...], metric: str):
+    """Smallest cube over a superset of dims for this metric (roll-up source)."""
+    best = None
+    for key in CUBE_CACHE.keys():
+        if key[0] != dataset_id or key[2] != metric or not set(dims) <= set(key[1]):
+            continue
+        entry = CUBE_CACHE.get(key)
+        if entry and entry["version"] == version:
+            if best is None or len(entry["frame"]) < len(best):
+                best = entry["frame"]
+    return best
+
+
+def _materialize(dataset_id: str, version: int, dims: Tuple[str, ...], metric: str):
+    store = get_store(dataset_id)
+    columns = {c: store.raw(c) for c in (*dims, metric)}
+    frame = _build(dims, columns, metric, offset=0)
+    if len(frame) > min(settings.CUBE_MAX_CELLS, store.n_rows // 2):
+        # Nearly one cell per row: scanning the rows is as cheap as the cube.
+        with _LOCK:
+            _REJECTED.setdefault(dataset_id, set()).add((dims, metric))
+        return None
+    CUBE_CACHE.put((dataset_id, dims, metric), {"version": version, "frame": frame})
+    return frame
+
+
+def _rollup(frame: pd.DataFrame, group_by: str, filters: List[tuple]) -> pd.DataFrame:
+    cells = frame
+    for col, op, val in filters:
+        text = cells[_text(col)]
+        if op == "in":
+            keep = text.isin([str(v) for v in (val if isinstance(val, (list, tuple)) else [val])])
+        else:
+            keep = text == str(val)
+        cells = cells[keep.to_numpy()]
+    codes, uniques = pd.factorize(cells[group_by].to_numpy(dtype=object), use_na_sentinel=False)
+    out = cells[list(_PARTIALS)].groupby(codes, sort=False).agg(_PARTIALS)
+    keys = np.asarray(uniques, dtype=object)[out.index.to_numpy()]
+    keys[pd.isna(keys)] = None  # missing values form one group, as in Explore
+    out.index = pd.RangeIndex(len(out))
+    out.insert(0, "_key", keys)
+    return out.sort_values("_first", kind="stable")
+
+
+def cube_plan(dataset_id: str, version: int, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Explore plan answered from materialized cubes, or None to fall back to a scan.
+    Every eligible query counts towards its pattern; hot patterns get a cube.
+    """
+    if not settings.CUBES_ENABLED:
+        return None
+    pattern = _pattern(query or {})
+    if pattern is None:
+        return None
+    dims, specs, filters = pattern
+    metrics = list(dict.fromkeys(c for c, _ in specs))
+
+    rollups = {}
+    for metric in metrics:
+        with _LOCK:
+            hits = _PATTERNS.setdefault(dataset_id, Counter())
+            hits[(dims, metric)] += 1
+            hot = hits[(dims, metric)] >= settings.CUBE_BUILD_AFTER
+            rejected = (dims, metric) in _REJECTED.get(dataset_id, ())
+        frame = _find(dataset_id, version, dims, metric)
+        if frame is None and hot and not rejected:
+            frame = _materialize(dataset_id, version, dims, metric)
+        if frame is None:
+            return None
+        rollups[metric] = _rollup(frame, query["group_by"], filters)
+
+    base = rollups[metrics[0]]
+    keys = base["_key"].to_numpy()
+    # Every metric rolls up to the same groups; line them up with the first one.
+    positions = {
+        m: pd.Index(r["_key"].to_numpy(), dtype=object).get_indexer(keys)
+        for m, r in rollups.items()
+    }
+    columns = {}
+    for col, op in specs:
+        part = rollups[col].iloc[positions[col]]
+        if op == "avg":
+            values = part["_sum"].to_numpy() / part["_rows"].to_numpy()
+        else:
+            values = part[f"_{op}"].to_numpy(dtype=np.float64)
+        columns[f"{col}_{op}"] = values
+    sort = query.get("sort") or {}
+    total = int(base["_rows"].sum())
+    return grouped_plan(total, query["group_by"], keys, columns, specs, sort)
+
+
+@register_version_hook
+def _refresh(dataset_id: str, ds: dict, old_version: int, new_version: int, appended) -> None:
+    """Roll cubes forward over appended rows; any other change drops them."""
+    rows = ds.get("rows", [])
+    for key in CUBE_CACHE.keys():
+        if key[0] != dataset_id:
+            continue
+        entry = CUBE_CACHE.pop(key)
+        if appended is None or not entry or entry["version"] != old_version:
+            continue
+        _, dims, metric = key
+        columns = {
+            c: np.fromiter((r.get(c) for r in appended), dtype=object, count=len(appended))
+            for c in (*dims, metric)
+        }
+        fresh = _build(dims, columns, metric, offset=len(rows) - len(appended))
+        frame = _group_cells(pd.concat([entry["frame"], fresh], ignore_index=True), dims)
+        CUBE_CACHE.put(key, {"version": new_version, "frame": frame})
+    if appended is None:
+        with _LOCK:
+            _REJECTED.pop(dataset_id, None)
@@ -0,0 +1,161 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+# MinHash / LSH: NUM_PERM signature values split into LSH_BANDS bands. Rows sharing any
+# band become candidates; with 16 bands of 4 the candidate curve rises around a Jaccard
+# similarity of (1/16) ** (1/4) = 0.5, well below the default threshold, so candidates
+# rarely miss a true pair. Each candidate's exact Jaccard similarity is then checked.
+NUM_PERM = 64
+LSH_BANDS = 16
+# Rows are compared with this many neighbours in a sorted LSH bucket, so one huge
+# bucket cannot make candidate pairs quadratic.
+BUCKET_WINDOW = 16
+# Rows hashed per pass, to bound the shingle x permutation working set.
+MINHASH_CHUNK_ROWS = 10_000
+
+_PRIME = (1 << 31) - 1
+_COEFFS = np.random.default_rng(0).integers(1, _PRIME, size=(2, NUM_PERM), dtype=np.int64)
+
+
+def normalize_keys(rows: List[dict], columns: List[str]) -> pd.DataFrame:
+    """Key columns as stripped, lowercased text; empty and missing values become ""."""
+    out = {}
+    for col in columns:
+        raw = pd.Series([r.get(col) for r in rows], dtype=object)
+        # Same rule as `(value or "")`: every falsy value is blank.
+        blank = np.fromiter((not v for v in raw), dtype=bool, count=len(raw))
+        text = raw.astype(str).str.strip().str.lower()
+        text[blank] = ""
+        out[col] = text
+    return pd.DataFrame(out)
+
+
+def exact_duplicates(keys: pd.DataFrame, keep: str = "first") -> np.ndarray:
+    """
+    Rows whose normalized key repeats an earlier (keep="first") or later (keep="last")
+    row. Rows are grouped by a 64-bit hash of the whole key; rare hash collisions are
+    told apart by comparing the keys themselves.
+    """
+    if keys.empty:
+        return np.zeros(len(keys), dtype=bool)
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+    codes, _ = pd.factorize(hashes)
+    # The row each group keeps, and whether every member really has its key.
+    first = (
+        pd.Series(np.arange(len(keys)))
+        .groupby(codes)
+        .transform("first" if keep == "first" else "last")
+    )
+    rep = first.to_numpy()
+    same = np.ones(len(keys), dtype=bool)
+    for col in keys.columns:
+        values = keys[col].to_numpy()
+        same &= values == values[rep]
+    dup = same & (np.arange(len(keys)) != rep)
+    if not same.all():
+        # Collision: fall back to exact comparison for the rows involved.
+        clash = np.isin(codes, codes[~same])
+        dup[clash] = keys[clash].duplicated(keep=keep).to_numpy()
+    return dup
+
+
+def _shingles(texts: np.ndarray):
+    """(row, shingle hash) for the character trigrams of every space-padded text."""
+    padded = [f" {t} " for t in texts]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    # One code point per character, texts separated by NUL.
+    joined = "\x00".join(padded) + "\x00"
+    codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    row_of = np.repeat(np.arange(len(padded)), lengths + 1)
+    a, b, c = codes[:-2], codes[1:-1], codes[2:]
+    keep = (a != 0) & (b != 0) & (c != 0)
+    return row_of[:-2][keep], ((a << 42) | (b << 21) | c)[keep] % _PRIME
+
+
+def minhash_signatures(texts: np.ndarray) -> np.ndarray:
+    """NUM_PERM-value MinHash signature of each text's character shingles."""
+    a, b = _COEFFS
+    # Texts too short for a shingle share one all-max signature.
+    signatures = np.full((len(texts), NUM_PERM), _PRIME, dtype=np.int64)
+    for start in range(0, len(texts), MINHASH_CHUNK_ROWS):
+        rows, values = _shingles(texts[start : start + MINHASH_CHUNK_ROWS])
+        if not len(rows):
+            continue
+        bounds = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        hashed = (values[:, None] * a + b) % _PRIME
+        signatures[start + rows[bounds]] = np.minimum.reduceat(hashed, bounds, axis=0)
+    return signatures
+
+
+def _candidate_pairs(signatures: np.ndarray, blocks: np.ndarray):
+    """Row pairs sharing a block and at least one LSH band."""
+    per_band = NUM_PERM // LSH_BANDS
+    left, right = [], []
+    for band in range(LSH_BANDS):
+        part = signatures[:, band * per_band : (band + 1) * per_band]
+        frame = pd.DataFrame(part)
+        frame["_block"] = blocks
+        bucket = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        order = np.argsort(bucket, kind="stable")
+        sorted_bucket = bucket[order]
+        for d in range(1, BUCKET_WINDOW):
+            same = sorted_bucket[d:] == sorted_bucket[:-d]
+            if not same.any():
+                break
+            left.append(order[:-d][same])
+            right.append(order[d:][same])
+    if not left:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    pairs = np.unique(
+        np.sort(np.column_stack([np.concatenate(left), np.concatenate(right)])), axis=0
+    )
+    return pairs[:, 0], pairs[:, 1]
+
+
+def _shingle_matrix(texts: np.ndarray) -> csr_matrix:
+    """Binary (texts x shingle) incidence matrix of the texts' character shingles."""
+    rows, values = _shingles(texts)
+    codes, uniques = pd.factorize(values)
+    m = csr_matrix((np.ones(len(rows)), (rows, codes)), shape=(len(texts), len(uniques)))
+    m.sum_duplicates()
+    m.data[:] = 1.0
+    return m
+
+
+def _jaccard(shingles: csr_matrix, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Exact Jaccard similarity of the shingle sets of rows i and rows j."""
+    if not len(i):
+        return np.empty(0)
+    sizes = np.asarray(shingles.sum(axis=1)).ravel()
+    common = np.asarray(shingles[i].multiply(shingles[j]).sum(axis=1)).ravel()
+    union = sizes[i] + sizes[j] - common
+    # Texts too short for a shingle are never near duplicates of anything.
+    return np.divide(common, union, out=np.zeros(len(i)), where=union > 0)
+
+
+def near_duplicate_groups(
+    texts: np.ndarray, threshold: float, blocks: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Cluster label per text. Each cluster is one representative (its first row) and the
+    later rows whose Jaccard similarity to it (over character shingles) reaches
+    threshold. Similarity is not followed transitively, so texts that merely share a
+    common part such as "@gmail.com" never chain into one cluster. Only rows in the
+    same block are compared.
+    """
+    n = len(texts)
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    blocks = np.zeros(n, dtype=np.int64) if blocks is None else blocks
+    i, j = _candidate_pairs(minhash_signatures(texts), blocks)
+    similar = _jaccard(_shingle_matrix(texts), i, j) >= threshold
+    labels = np.arange(n)
+    # Pairs come sorted with i < j, so a row's own members are claimed only after every
+    # earlier representative had its turn.
+    for a, b in zip(i[similar].tolist(), j[similar].tolist()):
+        if labels[a] == a and labels[b] == b:
+            labels[b] = a
+    return labels
@@ -0,0 +1,91 @@
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# Fewest points a reduced chart keeps: LTTB needs the first, the last and one between.
+MIN_POINTS = 3
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-triangle-three-buckets: indices of at most ``max_points`` points that keep
+    the visual shape of a line series. First and last points are always kept.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (max_points - 2)
+    out = np.empty(max_points, dtype=np.intp)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        # Average of the next bucket is the third triangle vertex.
+        nxt_lo = int((i + 1) * every) + 1
+        nxt_hi = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def grid_bin(x: np.ndarray, y: np.ndarray, max_points: int) -> Dict[str, Any]:
+    """Aggregate a scatter into at most ``max_points`` non-empty cells of a square grid."""
+    side = max(1, int(np.sqrt(max_points)))
+    counts, xe, ye = np.histogram2d(x, y, bins=side)
+    ix, iy = np.nonzero(counts)
+    return {
+        "x": ((xe[ix] + xe[ix + 1]) / 2).tolist(),
+        "y": ((ye[iy] + ye[iy + 1]) / 2).tolist(),
+        "counts": counts[ix, iy].astype(int).tolist(),
+        "cell_width": float(xe[1] - xe[0]),
+        "cell_height": float(ye[1] - ye[0]),
+    }
+
+
+def _meta(method: str, original: int, points: int) -> Dict[str, Any]:
+    return {
+        "method": method,
+        "original_points": original,
+        "points": points,
+        "reduction_ratio": round(points / original, 4) if original else 1.0,
+    }
+
+
+def reduce_chart(chart: Dict[str, Any], max_points: Optional[int]) -> Dict[str, Any]:
+    """
+    Bound a chart payload to ``max_points``. Line series are downsampled with LTTB and
+    scatter data is grid-binned; other chart types pass through unchanged.
+    """
+    if not max_points or not isinstance(chart, dict):
+        return chart
+    max_points = max(int(max_points), MIN_POINTS)
+    kind = chart.get("type")
+
+    if kind == "line" and len(chart.get("values") or []) > max_points:
+        y = np.asarray(chart["values"], dtype=float)
+        keep = np.flatnonzero(np.isfinite(y))
+        x = np.asarray(chart["x"], dtype=float)[keep] if "x" in chart else keep.astype(float)
+        idx = keep[lttb_indices(x, y[keep], max_points)]
+        out = dict(chart)
+        for field in ("labels", "values", "x"):
+            if field in chart:
+                out[field] = [chart[field][i] for i in idx]
+        out["meta"] = _meta("lttb", len(y), len(idx))
+        return out
+
+    if kind == "scatter" and len(chart.get("x") or []) > max_points:
+        x = np.asarray(chart["x"], dtype=float)
+        y = np.asarray(chart["y"], dtype=float)
+        ok = np.isfinite(x) & np.isfinite(y)
+        binned = grid_bin(x[ok], y[ok], max_points)
+        out = {k: v for k, v in chart.items() if k not in ("x", "y", "labels")}
+        out.update(binned)
+        out["type"] = "scatter_binned"
+        out["meta"] = _meta("grid", len(x), len(binned["x"]))
+        return out
+
+    return chart
@@ -0,0 +1,486 @@
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from app.services.aggregates import (
+    SQL_TEMPLATES,
+    finish_aggregate,
+    merge_partials,
+    parse_aggregates,
+    partial_aggregate,
+    state_bytes,
+)
+from app.services.column_index import NAT, unpack
+from app.services.column_store import ColumnStore
+from app.services.parallel import map_partitions, partitions
+from app.services.query_cache import normalize_operator
+from app.services.spill import memory_budget, partition_count, spill_rows
+
+# Date ranges matching at most 1/N of the rows restrict the other filters to those rows.
+TIME_SUBSET_FACTOR = 4
+
+
+def _index_mask(store: ColumnStore, f: Dict[str, Any]) -> Optional[np.ndarray]:
+    """
+    Mask for one filter over all rows from a secondary index, or None when no index
+    answers it (yet). A bitmap index may answer with a packed bitmap (uint8).
+    """
+    col, op, val = f.get("column"), normalize_operator(f.get("operator")), f.get("value")
+    indexes = store.indexes
+    if op in (">", "<"):
+        try:
+            v = float(val)
+        except Exception:
+            return None
+        index = indexes.sorted_numeric(col)
+        if index is None:
+            return None
+        if op == ">":
+            return index.range(lo=v, lo_inclusive=False)
+        return index.range(hi=v, hi_inclusive=False)
+    if op == "between":
+        lo, hi = val
+        index = indexes.sorted_strings(col)
+        return None if index is None else index.range(str(lo), str(hi))
+    if op in ("in", "eq"):
+        index = indexes.bitmap(col)
+        if index is None:
+            return None
+        if op == "eq":
+            return index.eq(str(val))
+        return index.isin([str(v) for v in (val if isinstance(val, (list, tuple)) else [val])])
+    if op in ("contains", "startswith"):
+        index = indexes.trigram(col)
+        if index is None:
+            return None
+        hit = np.zeros(store.n_rows, dtype=bool)
+        hit[index.search(str(val), prefix=op == "startswith")] = True
+        return hit
+    return None
+
+
+def _scan_mask(store: ColumnStore, f: Dict[str, Any], rows=slice(None)) -> np.ndarray:
+    """Mask for one filter over the rows selected by `rows` (positions or a slice)."""
+    col, op, val = f.get("column"), normalize_operator(f.get("operator")), f.get("value")
+    if isinstance(rows, slice):
+        n = len(range(store.n_rows)[rows])
+    else:
+        n = len(rows)
+
+    if op in (">", "<"):
+        try:
+            v = float(val)
+        except Exception:
+            return np.zeros(n, dtype=bool)
+        x = store.numeric(col)[rows]
+        # NaN compares False, matching rows whose value float() rejects.
+        return x > v if op == ">" else x < v
+    if op == "between":
+        lo, hi = val
+        s = store.strings(col)[rows]
+        return (s >= str(lo)) & (s <= str(hi))
+    if op == "in":
+        vals = [str(v) for v in (val if isinstance(val, (list, tuple)) else [val])]
+        return np.isin(store.strings(col)[rows], vals)
+    if op in ("contains", "startswith"):
+        # Case-insensitive literal match.
+        s = pd.Series(store.strings(col)[rows], dtype=object).str.lower()
+        needle = str(val).lower()
+        hit = (
+            s.str.startswith(needle) if op == "startswith" else s.str.contains(needle, regex=False)
+        )
+        return hit.to_numpy(dtype=bool)
+    if op == "eq":
+        return store.strings(col)[rows] == str(val)
+    return np.ones(n, dtype=bool)
+
+
+def _timestamp(value: Any) -> int:
+    """UTC nanoseconds for a date bound; numbers are not dates."""
+    if value is None or isinstance(value, (bool, int, float, np.number)):
+        raise ValueError("not a date")
+    ts = pd.to_datetime(value, utc=True)
+    if pd.isna(ts):
+        raise ValueError("not a date")
+    return ts.value
+
+
+def _time_rows(store: ColumnStore, f: Dict[str, Any]) -> Optional[np.ndarray]:
+    """
+    Row positions for a between / > / < filter on a date column, found by binary search
+    in the parsed time index; None when the filter is not a date range.
+    """
+    col, op, val = f.get("column"), normalize_operator(f.get("operator")), f.get("value")
+    if op not in ("between", ">", "<") or not store.has(col):
+        return None
+    try:
+        if op == "between":
+            lo, hi = val
+            bounds = dict(lo=_timestamp(lo), hi=_timestamp(hi))
+        elif op == ">":
+            bounds = dict(lo=_timestamp(val), lo_inclusive=False)
+        else:
+            bounds = dict(hi=_timestamp(val), hi_inclusive=False)
+    except (TypeError, ValueError):
+        return None
+    dates = store.dates(col)
+    if dates is None:
+        return None
+    index = store.indexes.time(col)
+    if index is not None:
+        return index.rows(**bounds)
+    # Indexes disabled: compare the parsed column directly.
+    keep = dates != NAT
+    if "lo" in bounds:
+        keep &= dates >= bounds["lo"] if bounds.get("lo_inclusive", True) else dates > bounds["lo"]
+    if "hi" in bounds:
+        keep &= dates <= bounds["hi"] if bounds.get("hi_inclusive", True) else dates < bounds["hi"]
+    return np.flatnonzero(keep)
+
+
+def compile_filters(store: ColumnStore, filters: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    AND all filters into one boolean mask over the dataset rows.
+
+    Date ranges resolve first, to row positions. When they leave few rows, the other
+    filters are evaluated on those rows only instead of on every row.
+    """
+    rows, rest = None, []
+    for f in filters or []:
+        found = _time_rows(store, f)
+        if found is None:
+            rest.append(f)
+        else:
+            found = np.sort(found)
+            rows = found if rows is None else np.intersect1d(rows, found, assume_unique=True)
+
+    if rows is not None and len(rows) * TIME_SUBSET_FACTOR <= store.n_rows:
+        keep = np.ones(len(rows), dtype=bool)
+        for f in rest:
+            keep &= _scan_mask(store, f, rows)
+        mask = np.zeros(store.n_rows, dtype=bool)
+        mask[rows[keep]] = True
+        return mask
+
+    if rows is None:
+        mask = np.ones(store.n_rows, dtype=bool)
+    else:
+        mask = np.zeros(store.n_rows, dtype=bool)
+        mask[rows] = True
+    packed, scans = None, []
+    for f in rest:
+        m = _index_mask(store, f)
+        if m is None:
+            scans.append(f)
+        elif m.dtype == np.uint8:
+            packed = m if packed is None else packed & m
+        else:
+            mask &= m
+    if packed is not None:
+        mask &= unpack(packed, store.n_rows)
+    if scans:
+        mask = _scan_partitions(store, scans, mask)
+    return mask
+
+
+def _scan_partitions(store: ColumnStore, filters: List[Dict[str, Any]], mask: np.ndarray):
+    """AND the filters no index answers into mask, one row partition per worker."""
+    parts = partitions(store.n_rows)
+    if len(parts) > 1:
+        # Build the column views once here rather than racing to build them per worker.
+        for f in filters:
+            _scan_mask(store, f, slice(0, 0))
+
+    def scan(rows: slice) -> np.ndarray:
+        keep = mask[rows].copy()
+        for f in filters:
+            keep &= _scan_mask(store, f, rows)
+        return keep
+
+    return np.concatenate(map_partitions(scan, parts))
+
+
+def _sort_key(values: np.ndarray) -> np.ndarray:
+    """Numeric key when every value is a number, string key otherwise."""
+    kind = pd.api.types.infer_dtype(values, skipna=False)
+    if kind in ("integer", "floating", "mixed-integer-float", "decimal"):
+        return values.astype(np.float64)
+    return pd.Series(values).astype(str).to_numpy(dtype=object)
+
+
+def _sort_order(key: np.ndarray, descending: bool) -> np.ndarray:
+    if not descending:
+        return np.argsort(key, kind="stable")
+    # Descending while keeping ties in their original order, like sorted(reverse=True).
+    n = len(key)
+    return (n - 1 - np.argsort(key[::-1], kind="stable"))[::-1]
+
+
+def _smallest(v: np.ndarray, m: int) -> np.ndarray:
+    """Positions of the m smallest values of v, ordered by (value, position)."""
+    if m <= 0:
+        return np.empty(0, dtype=np.intp)
+    if m >= len(v):
+        return np.argsort(v, kind="stable")
+    cutoff = v[np.argpartition(v, m - 1)[:m]].max()
+    below = np.flatnonzero(v < cutoff)
+    ties = np.flatnonzero(v == cutoff)[: m - len(below)]
+    sel = np.concatenate([below, ties])
+    sel.sort()
+    return sel[np.argsort(v[sel], kind="stable")]
+
+
+def _top_k(key: np.ndarray, k: int, descending: bool) -> np.ndarray:
+    """The first k positions of _sort_order(key, descending), without sorting every row."""
+    n = len(key)
+    if k >= n:
+        return _sort_order(key, descending)
+    if key.dtype == object:
+        # Sorted factorization ranks strings exactly as comparing them would.
+        key = pd.factorize(key, sort=True)[0].astype(np.float64)
+    nan = np.isnan(key)
+    finite = np.flatnonzero(~nan)
+    v = -key[finite] if descending else key[finite]
+    # NaN keys lead a descending order and trail an ascending one.
+    if descending:
+        head = np.flatnonzero(nan)[:k]
+        return np.concatenate([head, finite[_smallest(v, k - len(head))]])
+    order = finite[_smallest(v, min(k, len(finite)))]
+    return np.concatenate([order, np.flatnonzero(nan)[: k - len(order)]])
+
+
+def _order(key: np.ndarray, descending: bool, k: Optional[int]) -> np.ndarray:
+    return _sort_order(key, descending) if k is None else _top_k(key, k, descending)
+
+
+def _partitioned_order(key: np.ndarray, descending: bool, k: Optional[int]) -> np.ndarray:
+    """_order for many rows: each partition picks its own top k, then the winners merge."""
+    parts = partitions(len(key))
+    if k is None or len(parts) == 1:
+        return _order(key, descending, k)
+    tops = map_partitions(lambda p: p.start + _top_k(key[p], k, descending), parts)
+    # Candidates in position order, so ties still resolve by position.
+    candidates = np.sort(np.concatenate(tops))
+    return candidates[_top_k(key[candidates], k, descending)]
+
+
+def group_aggregate(store, mask, group_by, specs):
+    """
+    Group codes and keys in first-appearance order, with {result name: values} for each
+    aggregate over the masked rows. Large datasets aggregate per row partition on the
+    worker pool and merge the partial states.
+    """
+    codes, uniques = store.codes(group_by)
+    k = len(uniques)
+    by_column: Dict[str, List[str]] = {}
+    for col, op in specs:
+        by_column.setdefault(col, []).append(op)
+
+    parts = partitions(store.n_rows)
+    if len(parts) > 1:
+        # Build the column views once here rather than racing to build them per worker.
+        for col, ops in by_column.items():
+            partial_aggregate(store, col, codes[:0], k, ops, mask[:0], slice(0, 0))
+
+    def run(rows: slice):
+        m = mask[rows]
+        g = codes[rows][m]
+        present, first = np.unique(g, return_index=True)
+        states = {
+            col: partial_aggregate(store, col, g, k, ops, m, rows) for col, ops in by_column.items()
+        }
+        return present, rows.start + np.flatnonzero(m)[first], states
+
+    results = map_partitions(run, parts)
+
+    # Groups in order of first appearance among the matched rows; partitions are in row
+    # order, so a group's first occurrence in the concatenation is its earliest.
+    present, idx = np.unique(np.concatenate([r[0] for r in results]), return_index=True)
+    first = np.concatenate([r[1] for r in results])[idx]
+    present = present[np.argsort(first, kind="stable")]
+
+    columns = {}
+    for col, ops in by_column.items():
+        state = merge_partials([r[2][col] for r in results])
+        computed = finish_aggregate(store, col, state, k, ops)
+        columns.update({f"{col}_{op}": computed[op][present] for op in ops})
+    return present, uniques[present], {f"{c}_{op}": columns[f"{c}_{op}"] for c, op in specs}
+
+
+def spilled_group_aggregate(store, mask, group_by, specs, n_partitions: int):
+    """
+    group_aggregate over rows hash-partitioned to disk by group code, so only one
+    partition's groups are in memory at a time. Yields (group codes, first positions,
+    {result name: values}) per partition.
+    """
+    codes, uniques = store.codes(group_by)
+    k_local = len(uniques) // n_partitions + 1
+    by_column: Dict[str, List[str]] = {}
+    for col, op in specs:
+        by_column.setdefault(col, []).append(op)
+
+    with spill_rows(mask, lambda pos: codes[pos] % n_partitions, n_partitions) as spilled:
+        for p, positions in spilled:
+            local = codes[positions] // n_partitions
+            present, first = np.unique(local, return_index=True)
+            everywhere = np.ones(len(positions), dtype=bool)
+            columns = {}
+            for col, ops in by_column.items():
+                state = partial_aggregate(store, col, local, k_local, ops, everywhere, positions)
+                computed = finish_aggregate(store, col, state, k_local, ops)
+                columns.update({f"{col}_{op}": computed[op][present] for op in ops})
+            yield present * n_partitions + p, positions[first], columns
+
+
+def _spilled_plan(store, mask, group_by, specs, sort, k, n_partitions) -> Dict[str, Any]:
+    """
+    grouped_plan from spilled partitions. With a bounded k, only the groups that can
+    still reach the top k are kept between partitions.
+    """
+    names = [f"{c}_{op}" for c, op in specs]
+    col, direction = next(iter(sort.items())) if sort else (None, "asc")
+    descending = str(direction).lower() == "desc"
+    # Ordering by the group key itself needs every key (numeric or text order).
+    bounded = k is not None and col != group_by
+    kept: List[tuple] = []
+    size = n_groups = 0
+
+    def compact(trim: bool) -> None:
+        nonlocal size
+        codes = np.concatenate([c for c, _, _ in kept])
+        first = np.concatenate([f for _, f, _ in kept])
+        columns = {n: np.concatenate([cols[n] for _, _, cols in kept]) for n in names}
+        # First-appearance order, which also breaks ties in the top k.
+        sel = np.argsort(first, kind="stable")
+        if trim:
+            top = _top_k(columns[col][sel], k, descending) if col in names else np.arange(k)
+            sel = sel[np.sort(top[top < len(sel)])]
+        kept[:] = [(codes[sel], first[sel], {n: v[sel] for n, v in columns.items()})]
+        size = len(sel)
+
+    for part in spilled_group_aggregate(store, mask, group_by, specs, n_partitions):
+        kept.append(part)
+        size += len(part[0])
+        n_groups += len(part[0])
+        if bounded and size > 4 * k:
+            compact(trim=True)
+    if not kept:
+        kept.append((np.empty(0, np.intp), np.empty(0, np.int64), {n: np.empty(0) for n in names}))
+    compact(trim=False)
+
+    codes, _, columns = kept[0]
+    uniques = store.codes(group_by)[1]
+    plan = grouped_plan(int(mask.sum()), group_by, uniques[codes], columns, specs, sort, k)
+    plan["n_results"] = n_groups
+    return plan
+
+
+def _json_number(v: float):
+    return float(v) if np.isfinite(v) else None
+
+
+def grouped_plan(
+    total_matched: int,
+    group_by: str,
+    keys: np.ndarray,
+    columns: Dict[str, np.ndarray],
+    specs: List[tuple],
+    sort: Dict[str, str],
+    k: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Plan for aggregated groups given in first-appearance order."""
+    order = np.arange(len(keys))
+    if sort:
+        col, direction = next(iter(sort.items()))
+        if col == group_by or col in columns:
+            key = _sort_key(keys) if col == group_by else columns[col]
+            order = _order(key, direction.lower() == "desc", k)
+    selects = ", ".join(SQL_TEMPLATES[op].format(c=c) for c, op in specs)
+    return {
+        "total_matched": total_matched,
+        "sql_equivalent": f"SELECT {group_by}, {selects} FROM data GROUP BY {group_by}",
+        "order": order,
+        "groups": (group_by, keys, columns),
+        "n_results": len(keys),
+    }
+
+
+def plan_query(store: ColumnStore, query: Dict[str, Any], k: Optional[int] = None):
+    """
+    Results of a query in final order, resolved only as far as the first k (all when k
+    is None). Row results are kept as row positions, aggregates as group arrays, so a
+    full plan can be cached and sliced page by page.
+    """
+    q = query or {}
+    group_by = q.get("group_by")
+    aggregate = q.get("aggregate") or {}
+    sort = q.get("sort") or {}
+
+    mask = compile_filters(store, q.get("filters", []))
+    plan = {"total_matched": int(mask.sum()), "sql_equivalent": "SELECT * FROM data"}
+
+    if group_by and aggregate:
+        specs = parse_aggregates(aggregate)
+        ops = {op for _, op in specs}
+        groups = len(store.codes(group_by)[1])
+        n_partitions = partition_count(
+            state_bytes(ops, groups, plan["total_matched"]), memory_budget(q)
+        )
+        if n_partitions > 1:
+            return _spilled_plan(store, mask, group_by, specs, sort, k, n_partitions)
+        _, keys, columns = group_aggregate(store, mask, group_by, specs)
+        return grouped_plan(plan["total_matched"], group_by, keys, columns, specs, sort, k)
+
+    idx = np.flatnonzero(mask)
+    if sort:
+        col, direction = next(iter(sort.items()))
+        key = _sort_key(store.raw(col)[idx])
+        idx = idx[_partitioned_order(key, direction.lower() == "desc", k)]
+    plan.update(order=idx, groups=None, n_results=plan["total_matched"])
+    return plan
+
+
+def plan_bytes(plan: Dict[str, Any]) -> int:
+    size = plan["order"].nbytes + 256
+    if plan["groups"]:
+        _, keys, columns = plan["groups"]
+        size += keys.nbytes + sum(v.nbytes for v in columns.values())
+    return size
+
+
+def execute(
+    store: ColumnStore,
+    query: Dict[str, Any],
+    offset: int = 0,
+    plan: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    One page of results starting at offset. Without a precomputed full plan only the
+    top offset + limit results are ordered (argpartition rather than a full sort).
+    """
+    started = time.perf_counter()
+    limit = (query or {}).get("limit") or 100
+    if plan is None:
+        plan = plan_query(store, query, k=offset + limit)
+
+    sel = plan["order"][offset : offset + limit]
+    if plan["groups"]:
+        group_by, keys, columns = plan["groups"]
+        results = [
+            {group_by: keys[i], **{name: _json_number(v[i]) for name, v in columns.items()}}
+            for i in sel
+        ]
+    else:
+        results = store.take(sel)
+
+    out = {
+        "results": results,
+        "total_matched": plan["total_matched"],
+        "sql_equivalent": plan["sql_equivalent"],
+        "execution_ms": round((time.perf_counter() - started) * 1000, 3),
+        "has_more": offset + limit < plan["n_results"],
+    }
+    if plan.get("approx"):
+        out["approx"] = plan["approx"]
+    return out
@@ -0,0 +1,166 @@
+import io
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from app.services.column_store import ColumnStore
+from app.services.explore_engine import compile_filters
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:  # Parquet export is optional
+    pa = pq = None
+
+EXPORT_FORMATS = ("csv", "ndjson", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+# Rows serialized per chunk (and per Parquet row group); bounds the memory of an export.
+EXPORT_CHUNK_ROWS = 50_000
+
+
+def segment_positions(
+    store: ColumnStore, filters: Union[Dict[str, Any], List[Dict[str, Any]], None]
+) -> np.ndarray:
+    """
+    Rows of the segment, in dataset order. filters is a list of Explore filters, or the
+    older {column: value} form, where a row matches when str(value) equals each value.
+    """
+    if isinstance(filters, dict):
+        mask = np.ones(store.n_rows, dtype=bool)
+        for col, value in filters.items():
+            mask &= store.strings(col) == str(value)
+    else:
+        mask = compile_filters(store, filters or [])
+    return np.flatnonzero(mask)
+
+
+def export_columns(store: ColumnStore, columns: Optional[List[str]] = None) -> List[str]:
+    for c in columns or []:
+        if not store.has(c):
+            raise ValueError(f"column not found: {c}")
+    return list(columns or store.headers)
+
+
+def check_format(fmt: str) -> None:
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unsupported export format: {fmt}")
+    if fmt == "parquet" and pq is None:
+        raise ValueError("parquet export needs pyarrow installed")
+
+
+def _frame(store: ColumnStore, columns: List[str], positions: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({c: store.raw(c)[positions] for c in columns}, columns=columns)
+
+
+def _text_chunks(store, columns, positions, fmt) -> Iterator[bytes]:
+    for start in range(0, max(len(positions), 1), EXPORT_CHUNK_ROWS):
+        frame = _frame(store, columns, positions[start : start + EXPORT_CHUNK_ROWS])
+        if fmt == "csv":
+            text = frame.to_csv(index=False, header=start == 0, lineterminator="\n")
+        elif len(frame):
+            text = frame.to_json(
+                orient="records", lines=True, date_format="iso", default_handler=str
+            )
+            text = text if text.endswith("\n") else text + "\n"
+        else:
+            text = ""
+        if text:
+            yield text.encode("utf-8")
+
+
+def _arrow_types(store: ColumnStore, columns: List[str]) -> Dict[str, Any]:
+    """
+    One Parquet type per column, fixed up front so every row group shares the schema:
+    int64 / float64 when no value is text and all convert, otherwise strings.
+    """
+    types = {}
+    for c in columns:
+        raw, x = store.raw(c), store.numeric(c)
+        present = ~pd.isna(raw)
+        is_str = np.fromiter((isinstance(v, str) for v in raw), dtype=bool, count=len(raw))
+        if is_str.any() or np.isnan(x[present]).any():
+            types[c] = pa.string()
+        elif present.all() and np.all(np.mod(x, 1) == 0) and np.all(np.abs(x) < 2**63):
+            types[c] = pa.int64()
+        else:
+            types[c] = pa.float64()
+    return types
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+def _parquet_chunks(store, columns, positions, compression) -> Iterator[bytes]:
+    types = _arrow_types(store, columns)
+    schema = pa.schema([(c, types[c]) for c in columns])
+    sink = _Drain()
+    with pq.ParquetWriter(sink, schema, compression=compression) as writer:
+        for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+            chunk = positions[start : start + EXPORT_CHUNK_ROWS]
+            arrays = []
+            for c in columns:
+                if types[c] == pa.string():
+                    raw = store.raw(c)[chunk]
+                    values = np.where(pd.isna(raw), None, store.strings(c)[chunk])
+                    arrays.append(pa.array(values, type=pa.string()))
+                else:
+                    # from_pandas: NaN (missing) becomes a Parquet null.
+                    x = store.numeric(c)[chunk]
+                    arrays.append(pa.array(x, type=types[c], from_pandas=True))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def _gzipped(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def stream_rows(
+    store: ColumnStore,
+    positions: np.ndarray,
+    columns: List[str],
+    fmt: str = "csv",
+    gzip: bool = False,
+) -> Iterator[bytes]:
+    """
+    The rows at positions serialized a chunk at a time. gzip compresses CSV / NDJSON
+    into a .gz stream; Parquet uses it as the column codec instead.
+    """
+    check_format(fmt)
+    if fmt == "parquet":
+        yield from _parquet_chunks(store, columns, positions, "gzip" if gzip else "snappy")
+        return
+    chunks = _text_chunks(store, columns, positions, fmt)
+    yield from _gzipped(chunks) if gzip else chunks
@@ -0,0 +1,127 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from app.services.column_store import ColumnStore
+
+IMPUTE_STRATEGIES = ("median", "mean", "mode", "constant", "ffill", "group_median")
+# Filled into text columns by the numeric strategies, and the default constant.
+TEXT_FILL = "N/A"
+
+
+def missing_mask(raw: np.ndarray) -> np.ndarray:
+    """Cells that count as missing: None / NaN, empty strings and the text "NaN"."""
+    return pd.isna(raw) | (raw == "") | (raw == "NaN")
+
+
+def _numeric_matrix(store: ColumnStore, columns: List[str], missing: Dict[str, np.ndarray]):
+    """float64 (rows x columns) with NaN for missing or non-numeric cells."""
+    x = np.column_stack([store.numeric(c) for c in columns]) if columns else np.empty((0, 0))
+    for j, c in enumerate(columns):
+        x[missing[c], j] = np.nan
+    return x
+
+
+def _mode(raw: np.ndarray, missing: np.ndarray) -> Any:
+    """Most frequent present value; ties go to the one seen first."""
+    codes, uniques = pd.factorize(raw[~missing])
+    if not len(uniques):
+        return None
+    return uniques[np.argmax(np.bincount(codes))]
+
+
+def _ffill(missing: np.ndarray) -> np.ndarray:
+    """Position of the latest present cell at or before each row (-1 if none yet)."""
+    last = np.where(~missing, np.arange(len(missing)), -1)
+    return np.maximum.accumulate(last) if len(last) else last
+
+
+def _group_medians(x: np.ndarray, group_codes: np.ndarray, fallback: np.ndarray) -> np.ndarray:
+    """Per-row median of each column within the row's group; global median if none."""
+    medians = pd.DataFrame(x).groupby(group_codes).median().to_numpy()
+    out = medians[group_codes]
+    return np.where(np.isnan(out), fallback, out)
+
+
+def impute(
+    store: ColumnStore,
+    strategy: str = "median",
+    columns: Optional[List[str]] = None,
+    value: Any = None,
+    group_by: Optional[str] = None,
+) -> Dict[str, tuple]:
+    """
+    {column: (row positions, fill values)} for the missing cells of each column. The
+    statistics of all numeric columns come from one pass over a stacked matrix; text
+    columns get TEXT_FILL under the numeric strategies.
+    """
+    if strategy not in IMPUTE_STRATEGIES:
+        raise ValueError(f"unsupported strategy: {strategy}")
+    if strategy == "group_median" and (not group_by or not store.has(group_by)):
+        raise ValueError("group_median needs a group_by column")
+    columns = [c for c in (columns or store.headers) if store.has(c) and c != group_by]
+    missing = {c: missing_mask(store.raw(c)) for c in columns}
+    columns = [c for c in columns if missing[c].any()]
+
+    fills: Dict[str, tuple] = {}
+    if strategy in ("constant", "mode", "ffill"):
+        for c in columns:
+            rows = np.flatnonzero(missing[c])
+            raw = store.raw(c)
+            if strategy == "constant":
+                values = np.full(len(rows), TEXT_FILL if value is None else value, dtype=object)
+            elif strategy == "mode":
+                values = np.full(len(rows), _mode(raw, missing[c]), dtype=object)
+            else:
+                source = _ffill(missing[c])[rows]
+                rows, values = rows[source >= 0], raw[source[source >= 0]]
+            if len(rows):
+                fills[c] = (rows, values)
+        return fills
+
+    x = _numeric_matrix(store, columns, missing)
+    numeric = ~np.isnan(x).all(axis=0) if len(x) else np.zeros(len(columns), dtype=bool)
+    with np.errstate(all="ignore"):
+        if strategy == "mean":
+            stats = np.nanmean(x[:, numeric], axis=0) if numeric.any() else np.empty(0)
+        else:
+            stats = np.nanmedian(x[:, numeric], axis=0) if numeric.any() else np.empty(0)
+    by_group = None
+    if strategy == "group_median" and numeric.any():
+        group_codes, _ = pd.factorize(store.raw(group_by), use_na_sentinel=False)
+        by_group = _group_medians(x[:, numeric], group_codes, stats)
+
+    position = np.cumsum(numeric) - 1
+    for j, c in enumerate(columns):
+        rows = np.flatnonzero(missing[c])
+        if not numeric[j]:
+            values = np.full(len(rows), TEXT_FILL, dtype=object)
+        elif by_group is not None:
+            values = by_group[rows, position[j]].astype(object)
+        else:
+            values = np.full(len(rows), float(stats[position[j]]), dtype=object)
+        fills[c] = (rows, values)
+    return fills
+
+
+def apply_fills(rows: List[dict], fills: Dict[str, tuple]) -> List[dict]:
+    """New row list with the fills applied; untouched rows are shared, touched ones copied."""
+    out = list(rows)
+    copied = set()
+    for col, (positions, values) in fills.items():
+        for i, v in zip(positions.tolist(), values.tolist()):
+            if i not in copied:
+                out[i] = dict(out[i])
+                copied.add(i)
+            out[i][col] = v
+    return out
+
+
+def filled_columns(store: ColumnStore, fills: Dict[str, tuple]) -> Dict[str, np.ndarray]:
+    """New raw arrays for the filled columns; the store's own arrays are left as they are."""
+    out = {}
+    for col, (positions, values) in fills.items():
+        column = store.raw(col).copy()
+        column[positions] = values
+        out[col] = column
+    return out
@@ -0,0 +1,184 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from app.config import settings
+from app.services.cache import LRUCache
+from app.services.column_store import ColumnStore, get_store
+from app.services.parallel import map_partitions, partitions
+from app.services.registry import dataset_version, get_dataset, register_version_hook
+
+JOIN_HOWS = ("inner", "left")
+_KEY_SEP = "\x1f"
+
+# (left_id, left_version, right_id, right_version, join spec) -> joined ColumnStore
+JOIN_CACHE = LRUCache(max_entries=settings.JOIN_CACHE_MAX_ENTRIES)
+
+
+def parse_join(join: Dict[str, Any]) -> Tuple[str, List[str], List[str], str, str]:
+    """
+    (right dataset, left keys, right keys, how, suffix) from a join clause. `on` is a
+    column name, a list of names shared by both sides, or {left column: right column}.
+    """
+    join = join or {}
+    right_id, on = join.get("dataset_id"), join.get("on")
+    if not right_id or not on:
+        raise ValueError("join needs dataset_id and on")
+    if isinstance(on, str):
+        on = [on]
+    pairs = list(on.items()) if isinstance(on, dict) else [(c, c) for c in on]
+    how = str(join.get("how") or "inner").lower()
+    if how not in JOIN_HOWS:
+        raise ValueError(f"unsupported join: {how}")
+    suffix = str(join.get("suffix") or "right")
+    return right_id, [left for left, _ in pairs], [right for _, right in pairs], how, suffix
+
+
+def join_version(join: Dict[str, Any]) -> int:
+    return dataset_version(get_dataset(parse_join(join)[0]))
+
+
+def _key_text(store: ColumnStore, cols: List[str]) -> np.ndarray:
+    """
+    One comparable text per row for the key columns; None when any part is missing.
+    Numbers compare by value, so 42, 42.0 and "42" all meet.
+    """
+    parts = []
+    missing = np.zeros(store.n_rows, dtype=bool)
+    for col in cols:
+        if not store.has(col):
+            raise ValueError(f"join column not found: {col}")
+        raw = store.raw(col)
+        text = store.strings(col).copy()
+        x = store.numeric(col)
+        is_str = np.fromiter((isinstance(v, str) for v in raw), dtype=bool, count=len(raw))
+        integral = ~is_str & np.isfinite(x) & (np.mod(x, 1) == 0) & (np.abs(x) < 2**53)
+        text[integral] = x[integral].astype(np.int64).astype(str)
+        missing |= pd.isna(raw)
+        parts.append(text)
+    key = parts[0] if len(parts) == 1 else pd.Series(parts[0]).str.cat(parts[1:], sep=_KEY_SEP)
+    key = np.asarray(key, dtype=object)
+    key[missing] = None
+    return key
+
+
+def _build(keys: np.ndarray):
+    """Hash table of a build side: key index, plus its rows grouped by key code."""
+    codes, uniques = pd.factorize(keys)
+    order = np.argsort(codes, kind="stable")[np.count_nonzero(codes < 0) :]
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    starts = np.cumsum(counts) - counts
+    return pd.Index(uniques), order, starts, counts
+
+
+def _probe(table, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(probe rows, build rows) of every match for a chunk of probe keys."""
+    index, order, starts, counts = table
+    codes = index.get_indexer(keys)
+    # Missing probe keys never match, even against a missing build key.
+    codes[pd.isna(keys)] = -1
+    found = codes >= 0
+    hits = np.zeros(len(keys), dtype=np.int64)
+    hits[found] = counts[codes[found]]
+    probe = np.repeat(np.arange(len(keys)), hits)
+    within = np.arange(len(probe)) - np.repeat(np.cumsum(hits) - hits, hits)
+    build = order[np.repeat(starts[codes[found]], hits[found]) + within]
+    return probe, build
+
+
+def _broadcast(build_keys: np.ndarray, probe_keys: np.ndarray):
+    """Every probe partition looks up the one build table."""
+    table = _build(build_keys)
+
+    def probe(rows: slice):
+        p, b = _probe(table, probe_keys[rows])
+        return p + rows.start, b
+
+    found = map_partitions(probe, partitions(len(probe_keys)))
+    return np.concatenate([p for p, _ in found]), np.concatenate([b for _, b in found])
+
+
+def _partitioned(build_keys: np.ndarray, probe_keys: np.ndarray, n_partitions: int):
+    """Both sides split by key hash; each partition joins on its own, smaller table."""
+
+    def split(keys):
+        # Rows of each partition, in row order, from one stable sort.
+        filled = np.where(pd.isna(keys), "", keys)
+        part = (pd.util.hash_array(filled) % np.uint64(n_partitions)).astype(np.intp)
+        order = np.argsort(part, kind="stable")
+        return np.split(order, np.cumsum(np.bincount(part, minlength=n_partitions))[:-1])
+
+    build_rows, probe_rows = split(build_keys), split(probe_keys)
+
+    def join(p: int):
+        b_rows, p_rows = build_rows[p], probe_rows[p]
+        probe, build = _probe(_build(build_keys[b_rows]), probe_keys[p_rows])
+        return p_rows[probe], b_rows[build]
+
+    found = map_partitions(join, list(range(n_partitions)))
+    return np.concatenate([p for p, _ in found]), np.concatenate([b for _, b in found])
+
+
+def hash_join(left_keys: np.ndarray, right_keys: np.ndarray, how: str):
+    """
+    (left rows, right rows) of the join, in left row order; right is -1 for unmatched
+    left rows. The smaller side is the build side; it is broadcast whole when small
+    enough, otherwise both sides are hash-partitioned.
+    """
+    left_builds = len(left_keys) < len(right_keys)
+    build, probe = (left_keys, right_keys) if left_builds else (right_keys, left_keys)
+    limit = max(settings.JOIN_BROADCAST_MAX_ROWS, 1)
+    if len(build) <= limit:
+        p, b = _broadcast(build, probe)
+    else:
+        p, b = _partitioned(build, probe, -(-len(build) // limit))
+    li, ri = (b, p) if left_builds else (p, b)
+
+    if how == "left":
+        unmatched = np.flatnonzero(np.bincount(li, minlength=len(left_keys)) == 0)
+        li = np.concatenate([li, unmatched])
+        ri = np.concatenate([ri, np.full(len(unmatched), -1, dtype=ri.dtype)])
+    order = np.lexsort((ri, li))
+    return li[order], ri[order]
+
+
+def _joined_store(left: ColumnStore, right: ColumnStore, join: Dict[str, Any]) -> ColumnStore:
+    _, left_on, right_on, how, suffix = parse_join(join)
+    li, ri = hash_join(_key_text(left, left_on), _key_text(right, right_on), how)
+    if len(li) > settings.JOIN_MAX_ROWS:
+        raise ValueError(f"join result too large: {len(li)} rows")
+
+    columns = {h: left.raw(h)[li] for h in left.headers}
+    headers = list(left.headers)
+    # A right key named like the left key it matches carries nothing new.
+    same_key = {right for left, right in zip(left_on, right_on) if left == right}
+    unmatched = ri < 0
+    for h in right.headers:
+        if h in same_key:
+            continue
+        name = f"{h}_{suffix}" if h in columns else h
+        values = np.full(len(ri), None, dtype=object)
+        values[~unmatched] = right.raw(h)[ri[~unmatched]]
+        columns[name] = values
+        headers.append(name)
+    return ColumnStore.from_columns(headers, columns)
+
+
+def joined_store(dataset_id: str, version: int, join: Dict[str, Any]) -> ColumnStore:
+    """dataset_id joined with the clause's dataset; cached per pair of versions."""
+    right_id = parse_join(join)[0]
+    spec = json.dumps(
+        {k: v for k, v in join.items() if k != "version"}, sort_keys=True, default=str
+    )
+    key = (dataset_id, version, right_id, join_version(join), spec)
+    store = JOIN_CACHE.get(key)
+    if store is None:
+        store = _joined_store(get_store(dataset_id), get_store(right_id), join)
+        JOIN_CACHE.put(key, store)
+    return store
+
+
+@register_version_hook
+def _drop_stale(dataset_id: str, ds: dict, old_version: int, new_version: int, appended) -> None:
+    JOIN_CACHE.invalidate(lambda k: dataset_id in (k[0], k[2]))
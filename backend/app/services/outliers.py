@@ -0,0 +1,172 @@
+import warnings
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from app.services.aggregates import SKETCH_ALPHA, merge_partials, sketch_buckets, sketch_quantile
+from app.services.cache import LRUCache
+from app.services.column_store import ColumnStore, get_store
+from app.services.registry import register_version_hook
+
+OUTLIER_METHODS = ("zscore", "iqr", "mad")
+# z-score cut-off, IQR fence multiplier and modified z-score (MAD) cut-off.
+DEFAULT_THRESHOLDS = {"zscore": 3.0, "iqr": 1.5, "mad": 3.5}
+# Rows per pass; statistics and flags never hold more than a chunk of every column.
+CHUNK_ROWS = 1 << 18
+# Up to this many rows quantiles are exact; beyond it they come from mergeable
+# log-bucketed sketches (relative error aggregates.SKETCH_ALPHA).
+EXACT_QUANTILE_MAX_ROWS = 1_000_000
+# MAD of a standard normal, so MAD thresholds read like z-scores.
+_MAD_SCALE = 0.6745
+
+# (dataset_id, version, columns, method, threshold) -> OutlierFlags
+OUTLIER_CACHE = LRUCache(max_entries=16)
+
+
+def _chunks(n: int) -> List[slice]:
+    return [slice(start, min(start + CHUNK_ROWS, n)) for start in range(0, n, CHUNK_ROWS)]
+
+
+def _matrix(store: ColumnStore, columns: List[str], rows: slice) -> np.ndarray:
+    """float64 (rows x columns); values float() rejects are NaN and never flagged."""
+    return np.column_stack([store.numeric(c)[rows] for c in columns])
+
+
+def _moments(store: ColumnStore, columns: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-column mean and population standard deviation, merged chunk by chunk."""
+    k = len(columns)
+    n, mean, m2 = np.zeros(k), np.zeros(k), np.zeros(k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for rows in _chunks(store.n_rows):
+            x = _matrix(store, columns, rows)
+            cn = (~np.isnan(x)).sum(axis=0)
+            cmean = np.nansum(x, axis=0) / cn
+            cm2 = np.nansum((x - cmean) ** 2, axis=0)
+            # Chan et al.'s pairwise update of (count, mean, sum of squared deviations).
+            total = n + cn
+            delta = cmean - mean
+            has = cn > 0
+            mean = np.where(has, mean + delta * cn / total, mean)
+            m2 = np.where(has, m2 + cm2 + delta * delta * n * cn / total, m2)
+            n = total
+        return np.where(n > 0, mean, np.nan), np.sqrt(m2 / n)
+
+
+def _quantiles(store: ColumnStore, columns: List[str], qs, center=None) -> np.ndarray:
+    """
+    (len(qs) x columns) quantiles of every column, or of its distance from center when
+    given. Exact for small data, otherwise from sketches merged across chunks.
+    """
+    k = len(columns)
+    if store.n_rows <= EXACT_QUANTILE_MAX_ROWS:
+        x = _matrix(store, columns, slice(None))
+        if center is not None:
+            x = np.abs(x - center)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN columns
+            return np.nanquantile(x, qs, axis=0).reshape(len(qs), k)
+    sketch = None
+    for rows in _chunks(store.n_rows):
+        x = _matrix(store, columns, rows)
+        if center is not None:
+            x = np.abs(x - center)
+        valid = ~np.isnan(x)
+        groups = np.broadcast_to(np.arange(k), x.shape)[valid]
+        part = {"sketch": sketch_buckets(groups, x[valid])}
+        sketch = part if sketch is None else merge_partials([sketch, part])
+    return np.array([sketch_quantile(*sketch["sketch"], k, q) for q in qs])
+
+
+def outlier_bounds(
+    store: ColumnStore, columns: List[str], method: str, threshold: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-column (low, high) fences; values strictly outside them are outliers."""
+    if method == "zscore":
+        mean, std = _moments(store, columns)
+        return mean - threshold * std, mean + threshold * std
+    if method == "iqr":
+        q1, q3 = _quantiles(store, columns, [0.25, 0.75])
+        spread = q3 - q1
+        lo, hi = q1 - threshold * spread, q3 + threshold * spread
+    else:
+        median = _quantiles(store, columns, [0.5])[0]
+        mad = _quantiles(store, columns, [0.5], center=median)[0]
+        lo, hi = median - threshold * mad / _MAD_SCALE, median + threshold * mad / _MAD_SCALE
+    if store.n_rows > EXACT_QUANTILE_MAX_ROWS:
+        # A sketched quantile may sit a bucket (2 * SKETCH_ALPHA, relative) off the true
+        # one; widen the fences by that much so, e.g., a constant column flags nothing.
+        slack = 2 * SKETCH_ALPHA
+        lo, hi = lo - slack * np.abs(lo), hi + slack * np.abs(hi)
+    return lo, hi
+
+
+class OutlierFlags:
+    """Flagged rows of one dataset version as a bitmap, with per-column counts."""
+
+    def __init__(self, mask: np.ndarray, counts: Dict[str, int], bounds: Dict[str, tuple]):
+        self.n_rows = len(mask)
+        self.bits = np.packbits(mask)
+        self.count = int(mask.sum())
+        self.counts = counts
+        self.bounds = bounds
+
+    def mask(self) -> np.ndarray:
+        return np.unpackbits(self.bits, count=self.n_rows).astype(bool)
+
+    def positions(self) -> np.ndarray:
+        return np.flatnonzero(self.mask())
+
+
+def flag_outliers(
+    store: ColumnStore, columns: List[str], method: str, threshold: float
+) -> OutlierFlags:
+    """Rows with an outlier in any of the columns, checked a chunk at a time."""
+    lo, hi = outlier_bounds(store, columns, method, threshold)
+    mask = np.zeros(store.n_rows, dtype=bool)
+    counts = np.zeros(len(columns), dtype=np.int64)
+    for rows in _chunks(store.n_rows):
+        x = _matrix(store, columns, rows)
+        flagged = (x < lo) | (x > hi)
+        counts += flagged.sum(axis=0)
+        mask[rows] = flagged.any(axis=1)
+    bounds = {
+        c: (None if np.isnan(l) else float(l), None if np.isnan(h) else float(h))
+        for c, l, h in zip(columns, lo.tolist(), hi.tolist())
+    }
+    return OutlierFlags(mask, dict(zip(columns, counts.tolist())), bounds)
+
+
+def get_outliers(
+    dataset_id: str,
+    version: int,
+    columns: Optional[List[str]] = None,
+    method: str = "zscore",
+    threshold: Optional[float] = None,
+) -> OutlierFlags:
+    """
+    Outlier flags of one dataset version, cached so a preview and the removal that
+    follows it share one computation. columns defaults to every numeric column.
+    """
+    if method not in OUTLIER_METHODS:
+        raise ValueError(f"unsupported method: {method}")
+    threshold = float(DEFAULT_THRESHOLDS[method] if threshold is None else threshold)
+    store = get_store(dataset_id)
+    if columns:
+        for c in columns:
+            if not store.has(c):
+                raise ValueError(f"column not found: {c}")
+    else:
+        columns = [c for c in store.headers if (~np.isnan(store.numeric(c))).any()]
+    key = (dataset_id, version, tuple(columns), method, threshold)
+    flags = OUTLIER_CACHE.get(key)
+    if flags is None:
+        if columns:
+            flags = flag_outliers(store, list(columns), method, threshold)
+        else:
+            flags = OutlierFlags(np.zeros(store.n_rows, dtype=bool), {}, {})
+        OUTLIER_CACHE.put(key, flags)
+    return flags
+
+
+@register_version_hook
+def _drop_stale(dataset_id: str, ds: dict, old_version: int, new_version: int, appended) -> None:
+    OUTLIER_CACHE.invalidate(lambda k: k[0] == dataset_id)
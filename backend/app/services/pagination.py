@@ -0,0 +1,59 @@
+import base64
+import binascii
+import hashlib
+import json
+from typing import Any, Callable, Dict
+
+from app.config import settings
+from app.services.cache import LRUCache
+from app.services.query_cache import canonical_query
+from app.services.registry import register_version_hook
+
+# Fully ordered query plans, kept so later pages are slices rather than re-runs.
+PLAN_CACHE = LRUCache(max_entries=64, max_bytes=settings.QUERY_CACHE_MAX_BYTES)
+
+
+def query_fingerprint(query: Dict[str, Any]) -> str:
+    """Identity of a query for paging; the page size may change between pages."""
+    q = {k: v for k, v in (query or {}).items() if k not in ("cursor", "limit")}
+    return hashlib.sha1(canonical_query(q).encode()).hexdigest()[:16]
+
+
+def encode_cursor(dataset_id: str, version: int, fingerprint: str, offset: int) -> str:
+    payload = json.dumps({"d": dataset_id, "v": version, "q": fingerprint, "o": offset})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, dataset_id: str, version: int, fingerprint: str) -> int:
+    """Offset encoded in a cursor, after checking it belongs to this query and version."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        offset = int(payload["o"])
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValueError("invalid cursor")
+    if payload.get("d") != dataset_id or payload.get("q") != fingerprint or offset < 0:
+        raise ValueError("cursor does not belong to this query")
+    if payload.get("v") != version:
+        raise ValueError("cursor expired: dataset has changed")
+    return offset
+
+
+def cached_plan(
+    dataset_id: str,
+    version: int,
+    fingerprint: str,
+    build: Callable[[], Dict[str, Any]],
+    size: Callable[[Dict[str, Any]], int],
+) -> Dict[str, Any]:
+    key = (dataset_id, version, fingerprint)
+    plan = PLAN_CACHE.get(key)
+    if plan is None:
+        plan = build()
+        PLAN_CACHE.put(key, plan, size=size(plan))
+    return plan
+
+
+@register_version_hook
+def _invalidate(dataset_id: str, ds: dict, old_version: int, new_version: int, appended) -> None:
+    PLAN_CACHE.invalidate(lambda k: k[0] == dataset_id)
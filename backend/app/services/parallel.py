@@ -0,0 +1,46 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, TypeVar
+
+import numpy as np
+from app.config import settings
+
+P = TypeVar("P")
+T = TypeVar("T")
+
+MAX_AUTO_WORKERS = 16
+
+_POOL: Optional[ThreadPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def workers() -> int:
+    return max(int(settings.QUERY_WORKERS or min(os.cpu_count() or 1, MAX_AUTO_WORKERS)), 1)
+
+
+def partitions(n_rows: int) -> List[slice]:
+    """
+    Contiguous row ranges to process independently, at most one per worker. Small
+    datasets (or a single worker) get one range and run on the calling thread.
+    """
+    count = min(workers(), n_rows // max(settings.QUERY_PARTITION_MIN_ROWS, 1))
+    if n_rows < settings.QUERY_PARALLEL_MIN_ROWS or count <= 1:
+        return [slice(0, n_rows)]
+    bounds = np.linspace(0, n_rows, count + 1).astype(np.int64)
+    return [slice(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=workers(), thread_name_prefix="query")
+        return _POOL
+
+
+def map_partitions(fn: Callable[[P], T], parts: List[P]) -> List[T]:
+    """fn over every partition, results in partition order. Tasks must not nest."""
+    if len(parts) == 1:
+        return [fn(parts[0])]
+    return list(_pool().map(fn, parts))
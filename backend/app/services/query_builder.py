@@ -1,77 +1,58 @@
-from typing import Any, Dict, List
+from typing import Any, Dict
 
-from app.services.registry import REGISTRY
+from app.services.column_store import get_store
+from app.services.cubes import cube_plan
+from app.services.explore_engine import execute, plan_bytes, plan_query
+from app.services.joins import join_version, joined_store
+from app.services.pagination import cached_plan, decode_cursor, encode_cursor, query_fingerprint
+from app.services.query_cache import cached_query
+from app.services.registry import dataset_version, get_dataset
+from app.services.sampling import approx_plan
 
 
 def run_explore_query(dataset_id: str, query: Dict[str, Any]) -> Dict[str, Any]:
-    ds = REGISTRY.get(dataset_id)
-    if not ds:
-        raise ValueError("dataset not found")
-    headers = ds.get("headers", [])
-    rows: List[dict] = ds.get("rows", [])
-    q = query or {}
-    filters = q.get("filters", [])
-    group_by = q.get("group_by")
-    aggregate = q.get("aggregate") or {}
-    sort = q.get("sort") or {}
-    limit = q.get("limit") or 100
+    ds = get_dataset(dataset_id)
+    version = dataset_version(ds)
+    q = dict(query or {})
+    token = q.pop("cursor", None)
+    if q.get("join"):
+        # The joined dataset's version is part of the query, so its changes expire
+        # cached results and cursors too.
+        q["join"] = {**q["join"], "version": join_version(q["join"])}
+    fingerprint = query_fingerprint(q)
+    offset = decode_cursor(token, dataset_id, version, fingerprint) if token else 0
 
-    def match(r):
-        for f in filters:
-            col = f.get("column")
-            op = f.get("operator")
-            val = f.get("value")
-            rv = r.get(col)
-            if op == ">":
-                try:
-                    if float(rv) <= float(val):
-                        return False
-                except Exception:
-                    return False
-            elif op == "<":
-                try:
-                    if float(rv) >= float(val):
-                        return False
-                except Exception:
-                    return False
-            elif op == "between":
-                lo, hi = val
-                if not (str(lo) <= str(rv) <= str(hi)):
-                    return False
-            elif op == "eq" or op is None:
-                if str(rv) != str(val):
-                    return False
-        return True
+    def load():
+        if q.get("join"):
+            return joined_store(dataset_id, version, q["join"])
+        return get_store(dataset_id)
 
-    filtered = [r for r in rows if match(r)]
+    def shortcut():
+        # Samples and cubes describe the dataset itself, not a join.
+        if q.get("join"):
+            return None
+        return approx_plan(dataset_id, version, q) or cube_plan(dataset_id, version, q)
 
-    results = filtered
-    sql_equiv = "SELECT * FROM data"
-    if group_by and aggregate:
-        # naive group + sum/avg only
-        op_col, op = next(iter(aggregate.items()))
-        buckets = {}
-        for r in filtered:
-            key = r.get(group_by)
-            try:
-                v = float(r.get(op_col))
-            except Exception:
-                v = 0.0
-            buckets.setdefault(key, []).append(v)
-        agg_rows = []
-        for k, vals in buckets.items():
-            if op.lower() == "sum":
-                agg_rows.append({group_by: k, f"{op_col}_sum": sum(vals)})
-            elif op.lower() == "avg":
-                avg = (sum(vals) / len(vals)) if vals else 0
-                agg_rows.append({group_by: k, f"{op_col}_avg": avg})
-        results = agg_rows
-        sql_equiv = f"SELECT {group_by}, {op.upper()}({op_col}) FROM data GROUP BY {group_by}"
+    def compute() -> Dict[str, Any]:
+        if offset:
+            # Paging past the first page: order everything once, then slice.
+            plan = cached_plan(
+                dataset_id,
+                version,
+                fingerprint,
+                lambda: shortcut() or plan_query(load(), q),
+                plan_bytes,
+            )
+        else:
+            plan = shortcut()
+        # Aggregates served from a cube never touch the row store.
+        store = None if plan is not None and plan["groups"] else load()
+        res = execute(store, q, offset=offset, plan=plan)
+        more = res.pop("has_more")
+        limit = q.get("limit") or 100
+        res["next_cursor"] = (
+            encode_cursor(dataset_id, version, fingerprint, offset + limit) if more else None
+        )
+        return res
 
-    # sort
-    if sort:
-        col, direction = next(iter(sort.items()))
-        results = sorted(results, key=lambda r: r.get(col), reverse=(direction.lower() == "desc"))
-    # limit
-    results = results[:limit]
-    return {"results": results, "total_matched": len(filtered), "sql_equivalent": sql_equiv}
+    return cached_query(dataset_id, version, {**q, "cursor": token} if token else q, compute)
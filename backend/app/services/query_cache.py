@@ -0,0 +1,85 @@
+import json
+import time
+from typing import Any, Callable, Dict
+
+from app.config import settings
+from app.services.cache import LRUCache
+from app.services.registry import register_version_hook
+
+QUERY_CACHE = LRUCache(
+    max_entries=settings.QUERY_CACHE_MAX_ENTRIES, max_bytes=settings.QUERY_CACHE_MAX_BYTES
+)
+
+OPERATOR_ALIASES = {
+    None: "eq",
+    "=": "eq",
+    "==": "eq",
+    "gt": ">",
+    "lt": "<",
+    "starts_with": "startswith",
+    "prefix": "startswith",
+}
+
+
+def normalize_operator(op):
+    return OPERATOR_ALIASES.get(op, op)
+
+
+def canonical_query(query: Dict[str, Any]) -> str:
+    """
+    Stable text form of an Explore query: filters sorted, operators normalized and
+    defaults filled, so equivalent queries share one cache entry.
+    """
+    q = query or {}
+    filters = []
+    for f in q.get("filters") or []:
+        op = normalize_operator(f.get("operator"))
+        val = f.get("value")
+        if op == "in" and isinstance(val, (list, tuple)):
+            val = sorted({str(v) for v in val})
+        filters.append({"column": f.get("column"), "operator": op, "value": val})
+    filters.sort(key=lambda f: json.dumps(f, sort_keys=True, default=str))
+    sort = {k: str(v).lower() for k, v in (q.get("sort") or {}).items()}
+    canon = {
+        "filters": filters,
+        "group_by": q.get("group_by"),
+        "aggregate": q.get("aggregate") or None,
+        "sort": sort or None,
+        "limit": q.get("limit") or 100,
+    }
+    # Engine options beyond the core DSL still distinguish queries.
+    for k in sorted(set(q) - set(canon)):
+        canon[k] = q[k]
+    return json.dumps(canon, sort_keys=True, default=str)
+
+
+def _estimate_bytes(result: Dict[str, Any]) -> int:
+    rows = result.get("results") or []
+    if not rows:
+        return 256
+    sample = rows[:20]
+    per_row = len(json.dumps(sample, default=str)) / len(sample)
+    return int(per_row * len(rows)) + 256
+
+
+def cached_query(
+    dataset_id: str, version: int, query: Dict[str, Any], compute: Callable[[], Dict[str, Any]]
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    key = (dataset_id, version, canonical_query(query))
+    hit = QUERY_CACHE.get(key)
+    if hit is not None:
+        return {
+            **hit,
+            "cached": True,
+            "execution_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+    result = compute()
+    QUERY_CACHE.put(key, result, size=_estimate_bytes(result))
+    return {**result, "cached": False}
+
+
+@register_version_hook
+def _invalidate(dataset_id: str, ds: dict, old_version: int, new_version: int, appended) -> None:
+    # Only this dataset's entries go; other datasets keep their cache.
+    QUERY_CACHE.invalidate(lambda k: k[0] == dataset_id)
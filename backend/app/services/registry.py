@@ -1,2 +1,159 @@
+import threading
+import time
+import uuid
+
+from app.config import settings
+
 # Simple in-memory dataset registry for demo
 REGISTRY = {}
+
+# A dataset's published state (headers, rows, version) is replaced wholesale, never
+# edited: each change builds new lists (sharing unchanged row dicts) and swaps them in.
+# "undo" / "redo" hold the states an undo or redo would bring back, newest last.
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+# Called as hook(dataset_id, ds, old_version, new_version, appended) whenever a dataset
+# changes. ``appended`` holds the new rows for a pure append (derived structures may be
+# rolled forward) and is None for any other mutation (they must be dropped).
+_VERSION_HOOKS = []
+
+
+def get_dataset(dataset_id: str) -> dict:
+    ds = REGISTRY.get(dataset_id)
+    if not ds:
+        raise ValueError("dataset not found")
+    return ds
+
+
+def dataset_version(ds: dict) -> int:
+    return ds.get("version", 0)
+
+
+def dataset_token(ds: dict) -> str:
+    """
+    Identity of one registration of a dataset. Versions restart at 0 when an id is
+    registered again, so caches that can outlive a registration key on this too.
+    """
+    token = ds.get("token")
+    if token is None:
+        token = ds.setdefault("token", uuid.uuid4().hex)
+    return token
+
+
+def dataset_lock(dataset_id: str) -> threading.RLock:
+    """Serializes writers of one dataset, so each change builds on the latest version."""
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(dataset_id, threading.RLock())
+
+
+def register_version_hook(fn):
+    _VERSION_HOOKS.append(fn)
+    return fn
+
+
+def bump_version(dataset_id: str, appended: list = None) -> int:
+    """Mark a dataset as changed so anything cached against the old version is ignored."""
+    ds = get_dataset(dataset_id)
+    old_version = dataset_version(ds)
+    ds["version"] = old_version + 1
+    for hook in _VERSION_HOOKS:
+        hook(dataset_id, ds, old_version, ds["version"], appended)
+    return ds["version"]
+
+
+def _snapshot(ds: dict) -> dict:
+    return {
+        "version": dataset_version(ds),
+        "headers": list(ds.get("headers", [])),
+        "rows": ds.get("rows", []),
+        "action": ds.get("action", "upload"),
+        "created_at": ds.get("created_at"),
+    }
+
+
+def _publish(dataset_id: str, ds: dict, state: dict, appended: list = None) -> int:
+    # Rows go in before the version moves, so a reader that sees the new version also
+    # sees its rows.
+    ds["headers"] = state["headers"]
+    ds["rows"] = state["rows"]
+    ds["action"] = state["action"]
+    ds["created_at"] = state["created_at"]
+    return bump_version(dataset_id, appended)
+
+
+def commit_rows(
+    dataset_id: str, rows: list, action: str, headers: list = None, appended: list = None
+) -> int:
+    """
+    Publish rows as the dataset's next version. The current state moves to the undo
+    history (at most DATASET_HISTORY_LIMIT kept) and the redo history is cleared.
+    """
+    with dataset_lock(dataset_id):
+        ds = get_dataset(dataset_id)
+        undo = ds.setdefault("undo", [])
+        undo.append(_snapshot(ds))
+        del undo[: max(len(undo) - settings.DATASET_HISTORY_LIMIT, 0)]
+        ds["redo"] = []
+        state = {
+            "headers": list(ds.get("headers", []) if headers is None else headers),
+            "rows": rows,
+            "action": action,
+            "created_at": time.time(),
+        }
+        return _publish(dataset_id, ds, state, appended)
+
+
+def _step(dataset_id: str, source: str, target: str) -> int:
+    with dataset_lock(dataset_id):
+        ds = get_dataset(dataset_id)
+        if not ds.get(source):
+            raise ValueError(f"nothing to {source}")
+        state = ds[source].pop()
+        ds.setdefault(target, []).append(_snapshot(ds))
+        # A restored state is published under a new version number, so nothing cached
+        # for the versions in between is mistaken for it.
+        return _publish(dataset_id, ds, state)
+
+
+def undo(dataset_id: str) -> int:
+    """Bring back the state before the latest change; returns the new version."""
+    return _step(dataset_id, "undo", "redo")
+
+
+def redo(dataset_id: str) -> int:
+    """Re-apply the change the latest undo reverted; returns the new version."""
+    return _step(dataset_id, "redo", "undo")
+
+
+def version_history(dataset_id: str) -> dict:
+    ds = get_dataset(dataset_id)
+
+    def describe(state: dict) -> dict:
+        return {
+            "version": state["version"],
+            "action": state["action"],
+            "rows": len(state["rows"]),
+            "created_at": state["created_at"],
+        }
+
+    return {
+        "current": describe(_snapshot(ds)),
+        "undo": [describe(s) for s in reversed(ds.get("undo", []))],
+        "redo": [describe(s) for s in reversed(ds.get("redo", []))],
+    }
+
+
+def append_rows(dataset_id: str, rows: list) -> int:
+    with dataset_lock(dataset_id):
+        ds = get_dataset(dataset_id)
+        rows = list(rows or [])
+        headers = list(ds.get("headers", []))
+        for r in rows:
+            for k in r:
+                if k not in headers:
+                    headers.append(k)
+        # A new list rather than extending, so readers never see a half-appended one.
+        return commit_rows(
+            dataset_id, ds.get("rows", []) + rows, "append", headers=headers, appended=rows
+        )
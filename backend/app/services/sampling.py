@@ -0,0 +1,334 @@
+import weakref
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from app.services.aggregates import parse_aggregates
+from app.services.cache import LRUCache
+from app.services.column_store import ColumnStore, get_store
+from app.services.explore_engine import compile_filters, group_aggregate, grouped_plan
+from app.services.registry import register_version_hook
+
+# Nested sample sizes: each is a prefix of one random permutation, so a larger sample
+# refines a smaller one instead of replacing it.
+UNIFORM_SAMPLE_SIZES = (10_000, 100_000, 1_000_000)
+# Rows kept per stratum (group value) in stratified samples.
+STRATUM_SAMPLE_SIZES = (1_000, 10_000, 100_000)
+# Below this many rows an exact scan is as quick as any sample.
+APPROX_MIN_ROWS = 50_000
+# Groups with fewer matching sample rows are computed exactly.
+APPROX_MIN_MATCHES = 30
+APPROX_OPS = ("sum", "avg", "count")
+SAMPLE_SEED = 0
+
+# (dataset_id, version) -> DatasetSamples
+SAMPLE_CACHE = LRUCache(max_entries=8)
+# id(frame) -> FrameSamples, for run_query over in-memory frames
+FRAME_SAMPLE_CACHE = LRUCache(max_entries=8)
+
+
+def z_value(confidence: float) -> float:
+    return NormalDist().inv_cdf(0.5 + min(max(confidence, 0.5), 0.9999) / 2)
+
+
+class Strata:
+    """Per-stratum random order of rows; the first `cap` of each stratum form a sample."""
+
+    def __init__(self, codes: np.ndarray, k: int, priority: np.ndarray):
+        self.codes = codes
+        self.pop = np.bincount(codes, minlength=k)
+        order = np.lexsort((priority, codes))
+        start = np.cumsum(self.pop) - self.pop
+        self.rank = np.empty(len(codes), dtype=np.int64)
+        self.rank[order] = np.arange(len(codes)) - start[codes[order]]
+
+    def positions(self, cap: int) -> np.ndarray:
+        return np.flatnonzero(self.rank < cap)
+
+    def drawn(self, cap: int) -> np.ndarray:
+        return np.minimum(self.pop, cap)
+
+
+def uniform_positions(priority: np.ndarray, size: int) -> np.ndarray:
+    if size >= len(priority):
+        return np.arange(len(priority))
+    return np.sort(np.argpartition(priority, size - 1)[:size])
+
+
+def estimate(groups, k, strata, pop, drawn, y, z, ratio=False, confidence=0.95):
+    """
+    Per-group estimates from a stratified sample (a uniform sample is one stratum).
+
+    groups / strata give each sampled row's group and stratum; pop / drawn are rows per
+    stratum in the data and in the sample. y is the value of matched rows (0 elsewhere)
+    and z the match indicator. Returns (estimate, CI half-width) of the group total of y,
+    or of the ratio sum(y) / sum(z) when ratio is set.
+    """
+    key = strata.astype(np.int64) * k + groups
+    cells, inv = np.unique(key, return_inverse=True)
+    sy = np.bincount(inv, weights=y)
+    syy = np.bincount(inv, weights=y * y)
+    sz = np.bincount(inv, weights=z)
+    h, g = cells // k, cells % k
+    N, n = pop[h].astype(np.float64), drawn[h].astype(np.float64)
+    weight = N / n
+    total_y = np.bincount(g, weights=weight * sy, minlength=k)
+    total_z = np.bincount(g, weights=weight * sz, minlength=k)
+    fpc = 1 - n / N
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if ratio:
+            est = total_y / total_z
+            r = np.nan_to_num(est)[g]
+            # Linearized ratio estimator: residuals d = y - R z.
+            sd = sy - r * sz
+            sdd = syy - 2 * r * sy + r * r * sz
+            s2 = (sdd - sd * sd / n) / np.maximum(n - 1, 1)
+            var = np.bincount(g, weights=N * N * fpc * s2 / n, minlength=k) / total_z**2
+        else:
+            est = total_y
+            s2 = (syy - sy * sy / n) / np.maximum(n - 1, 1)
+            var = np.bincount(g, weights=N * N * fpc * s2 / n, minlength=k)
+    return est, z_value(confidence) * np.sqrt(np.maximum(np.nan_to_num(var), 0))
+
+
+def unreliable_groups(estimates, matched, whole, max_error):
+    """
+    Groups to compute exactly: too few matching sample rows, or an interval wider than
+    max_error relative to the estimate. Strata sampled whole are exact already.
+    """
+    thin = ~whole & (matched < APPROX_MIN_MATCHES)
+    wide = np.zeros(len(matched), dtype=bool)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for value, half in estimates:
+            wide |= np.nan_to_num(half / np.abs(value), nan=np.inf) > max_error
+    return thin | (wide & ~whole)
+
+
+class _Sample:
+    def __init__(self, store, positions, strata, pop, drawn, stratified):
+        self.store = store
+        self.stratified = stratified
+        self.positions = positions
+        self.strata = strata
+        self.pop = pop
+        self.drawn = drawn
+
+
+class DatasetSamples:
+    """Uniform and per-column stratified samples of one dataset version, built lazily."""
+
+    def __init__(self, store: Optional[ColumnStore]):
+        self.store = store
+        self.priority = np.random.default_rng(SAMPLE_SEED).random(self.n_rows)
+        self._strata: Dict[str, Strata] = {}
+        self._samples: Dict[tuple, _Sample] = {}
+        self._first: Dict[str, np.ndarray] = {}
+
+    @property
+    def n_rows(self) -> int:
+        return self.store.n_rows
+
+    def first_positions(self, column: str) -> np.ndarray:
+        """Row position where each group value first appears, for Explore's group order."""
+        if column not in self._first:
+            codes, uniques = self.store.codes(column)
+            first = np.full(len(uniques), self.n_rows, dtype=np.int64)
+            present, idx = np.unique(codes, return_index=True)
+            first[present] = idx
+            self._first[column] = first
+        return self._first[column]
+
+    def strata(self, column: str) -> Strata:
+        if column not in self._strata:
+            codes, uniques = self.store.codes(column)
+            self._strata[column] = Strata(codes, len(uniques), self.priority)
+        return self._strata[column]
+
+    def _subset(self, positions: np.ndarray) -> ColumnStore:
+        return ColumnStore(self.store.headers, [self.store.rows[i] for i in positions])
+
+    def uniform(self, size: int) -> _Sample:
+        key = ("uniform", size)
+        if key not in self._samples:
+            pos = uniform_positions(self.priority, size)
+            n = np.array([self.n_rows])
+            self._samples[key] = _Sample(
+                self._subset(pos), pos, np.zeros(len(pos), np.intp), n, np.array([len(pos)]), False
+            )
+        return self._samples[key]
+
+    def stratified(self, column: str, cap: int) -> _Sample:
+        key = ("stratified", column, cap)
+        if key not in self._samples:
+            strata = self.strata(column)
+            pos = strata.positions(cap)
+            self._samples[key] = _Sample(
+                self._subset(pos), pos, strata.codes[pos], strata.pop, strata.drawn(cap), True
+            )
+        return self._samples[key]
+
+    def candidates(self, column: Optional[str]) -> List[_Sample]:
+        """
+        Samples to try, smallest first; each must be well below the data size. Samples
+        are stratified by column when it is given and has few enough groups.
+        """
+        limit = self.n_rows // 2
+        if column is not None:
+            strata = self.strata(column)
+            stratified = [c for c in STRATUM_SAMPLE_SIZES if strata.drawn(c).sum() <= limit]
+            if stratified:
+                return [self.stratified(column, c) for c in stratified]
+            # Too many groups to stratify usefully.
+        return [self.uniform(s) for s in UNIFORM_SAMPLE_SIZES if s <= limit]
+
+
+class FrameSamples(DatasetSamples):
+    """
+    DatasetSamples over a pandas frame; each sample's ``store`` is a slice of the frame.
+    Rows without a group key (dropped by groupby) form one extra stratum, coded
+    len(uniques).
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        # Weak, so cached samples do not keep the frame alive.
+        self.frame = weakref.ref(df)
+        self._n_rows = len(df)
+        self._groups: Dict[str, tuple] = {}
+        super().__init__(None)
+
+    @property
+    def n_rows(self) -> int:
+        return self._n_rows
+
+    def groups(self, column: str):
+        """(codes, uniques) of a column, in pandas factorize order."""
+        if column not in self._groups:
+            codes, uniques = pd.factorize(self.frame()[column])
+            self._groups[column] = (np.where(codes < 0, len(uniques), codes), uniques)
+        return self._groups[column]
+
+    def strata(self, column: str) -> Strata:
+        if column not in self._strata:
+            codes, uniques = self.groups(column)
+            self._strata[column] = Strata(codes, len(uniques) + 1, self.priority)
+        return self._strata[column]
+
+    def _subset(self, positions: np.ndarray) -> pd.DataFrame:
+        return self.frame().iloc[positions]
+
+
+def get_samples(dataset_id: str, version: int) -> DatasetSamples:
+    key = (dataset_id, version)
+    samples = SAMPLE_CACHE.get(key)
+    if samples is None:
+        samples = DatasetSamples(get_store(dataset_id))
+        SAMPLE_CACHE.put(key, samples)
+    return samples
+
+
+def frame_samples(df: pd.DataFrame) -> FrameSamples:
+    """Samples of a frame, kept for as long as that frame is alive and unchanged."""
+    samples = FRAME_SAMPLE_CACHE.get(id(df))
+    if samples is None or samples.frame() is not df or samples.n_rows != len(df):
+        samples = FrameSamples(df)
+        FRAME_SAMPLE_CACHE.put(id(df), samples)
+    return samples
+
+
+def _sample_estimates(sample: _Sample, codes, k, specs, filters, confidence):
+    """{name: (estimate, half)} per group code, plus matched sample rows and row counts."""
+    z = compile_filters(sample.store, filters).astype(np.float64)
+    groups = codes[sample.positions]
+    args = (groups, k, sample.strata, sample.pop, sample.drawn)
+    rows, _ = estimate(*args, z, z, confidence=confidence)
+    out = {}
+    for col, op in specs:
+        if op == "count":
+            value_codes, uniques = sample.store.codes(col)
+            y = z * ~np.array([u is None for u in uniques], dtype=bool)[value_codes]
+            out[f"{col}_{op}"] = estimate(*args, y, z, confidence=confidence)
+        else:
+            # Values float() rejects count as 0, as in the exact engine. Unmatched rows are
+            # zeroed with where, not z *, so an inf there does not turn into NaN.
+            x = sample.store.numeric(col)
+            y = np.where((z > 0) & ~np.isnan(x), x, 0.0)
+            out[f"{col}_{op}"] = estimate(*args, y, z, ratio=op == "avg", confidence=confidence)
+    matched = np.bincount(groups, weights=z, minlength=k)
+    return out, matched, rows
+
+
+def approx_plan(dataset_id: str, version: int, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Explore plan estimated from samples when the query asks for `approx`, or None for
+    exact execution. Groups whose sample is too thin, or whose interval is wider than
+    max_error (relative), are computed exactly.
+    """
+    q = query or {}
+    approx = q.get("approx")
+    group_by = q.get("group_by")
+    if not approx or not group_by or not q.get("aggregate"):
+        return None
+    specs = parse_aggregates(q["aggregate"])
+    if any(op not in APPROX_OPS for _, op in specs):
+        return None
+    store = get_store(dataset_id)
+    if store.n_rows < APPROX_MIN_ROWS:
+        return None
+    confidence = float(approx.get("confidence") or 0.95)
+    max_error = float(approx.get("max_error") or 0.01)
+    filters = q.get("filters", [])
+
+    samples = get_samples(dataset_id, version)
+    candidates = samples.candidates(group_by)
+    if not candidates:
+        return None
+    codes, uniques = store.codes(group_by)
+    k = len(uniques)
+    for sample in candidates:
+        est, matched, rows = _sample_estimates(sample, codes, k, specs, filters, confidence)
+        whole = sample.drawn == sample.pop if sample.stratified else np.zeros(k, dtype=bool)
+        redo = unreliable_groups(est.values(), matched, whole, max_error)
+        if not redo.any():
+            break
+
+    # Thin and imprecise groups are recomputed exactly; the rest keep their estimates.
+    estimated = np.flatnonzero(~redo & (matched > 0))
+    exact_codes, exact_cols, exact_rows = np.empty(0, dtype=np.intp), {}, 0
+    if redo.any():
+        mask = compile_filters(store, filters) & redo[codes]
+        exact_codes, _, exact_cols = group_aggregate(store, mask, group_by, specs)
+        exact_rows = int(mask.sum())
+
+    chosen = np.concatenate([estimated, exact_codes])
+    order = np.argsort(samples.first_positions(group_by)[chosen], kind="stable")
+    columns: Dict[str, np.ndarray] = {}
+    for name, (value, half) in est.items():
+        exact = exact_cols.get(name, np.empty(0))
+        v = np.concatenate([value[estimated], exact])[order]
+        h = np.concatenate([half[estimated], np.zeros(len(exact))])[order]
+        columns[name] = v
+        columns[f"{name}_ci_low"] = v - h
+        columns[f"{name}_ci_high"] = v + h
+
+    plan = grouped_plan(
+        int(round(rows[estimated].sum())) + exact_rows,
+        group_by,
+        uniques[chosen[order]],
+        columns,
+        specs,
+        q.get("sort") or {},
+    )
+    plan["approx"] = {
+        "confidence": confidence,
+        "max_error": max_error,
+        "sample_rows": int(len(sample.positions)),
+        "estimated_groups": int(len(estimated)),
+        "exact_groups": int(len(exact_codes)),
+    }
+    return plan
+
+
+@register_version_hook
+def _drop_stale(dataset_id: str, ds: dict, old_version: int, new_version: int, appended) -> None:
+    SAMPLE_CACHE.invalidate(lambda k: k[0] == dataset_id)
@@ -0,0 +1,90 @@
+import os
+import tempfile
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+from app.config import settings
+
+# Matched rows handed to the partition files per write.
+SPILL_CHUNK_ROWS = 1 << 20
+MAX_SPILL_PARTITIONS = 256
+
+
+def memory_budget(query: Optional[Dict[str, Any]] = None) -> int:
+    """Aggregation memory budget in bytes: the request's own, else the configured one."""
+    mb = (query or {}).get("memory_budget_mb")
+    if mb is None:
+        mb = settings.AGGREGATION_MEMORY_BUDGET_MB
+    return int(float(mb) * 1024 * 1024)
+
+
+def partition_count(state_bytes: int, budget: int) -> int:
+    """Partitions needed so one partition's aggregation state fits the budget (1 = no spill)."""
+    if state_bytes <= budget:
+        return 1
+    # Headroom for uneven partitions.
+    return int(min(-(-2 * state_bytes // max(budget, 1)), MAX_SPILL_PARTITIONS))
+
+
+class SpilledPartitions:
+    """
+    Row positions hash-partitioned into temporary files, so aggregation state is built
+    for one partition at a time. Positions are written in ascending order and read back
+    in that order.
+    """
+
+    def __init__(self, n_partitions: int):
+        self.n_partitions = n_partitions
+        self._dir = tempfile.TemporaryDirectory(
+            prefix="smartdoc-spill-", dir=settings.SPILL_DIR or None
+        )
+        self._files = [
+            open(os.path.join(self._dir.name, f"{p}.bin"), "wb") for p in range(n_partitions)
+        ]
+        self.bytes_written = 0
+
+    def add(self, positions: np.ndarray, partition: np.ndarray) -> None:
+        order = np.argsort(partition, kind="stable")
+        counts = np.bincount(partition, minlength=self.n_partitions)
+        for p, chunk in enumerate(
+            np.split(positions[order].astype(np.int64), np.cumsum(counts)[:-1])
+        ):
+            if len(chunk):
+                self._files[p].write(chunk.tobytes())
+                self.bytes_written += chunk.nbytes
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        for f in self._files:
+            f.close()
+        for p in range(self.n_partitions):
+            positions = np.fromfile(os.path.join(self._dir.name, f"{p}.bin"), dtype=np.int64)
+            if len(positions):
+                yield p, positions
+
+    def close(self) -> None:
+        for f in self._files:
+            f.close()
+        self._dir.cleanup()
+
+    def __enter__(self) -> "SpilledPartitions":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def spill_rows(mask: np.ndarray, partition_of, n_partitions: int) -> SpilledPartitions:
+    """
+    Write the positions of the masked rows to their partition files, a chunk at a time.
+    partition_of maps a chunk of positions to partition numbers.
+    """
+    spilled = SpilledPartitions(n_partitions)
+    try:
+        for start in range(0, len(mask), SPILL_CHUNK_ROWS):
+            positions = start + np.flatnonzero(mask[start : start + SPILL_CHUNK_ROWS])
+            if len(positions):
+                spilled.add(positions, partition_of(positions))
+    except BaseException:
+        spilled.close()
+        raise
+    return spilled
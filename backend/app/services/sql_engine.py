@@ -0,0 +1,250 @@
+import atexit
+import math
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+from app.services.column_store import get_store
+from app.services.registry import dataset_token, dataset_version, get_dataset, register_version_hook
+
+INSERT_BATCH_ROWS = 50000
+# Progress handler granularity, in SQLite VM instructions.
+PROGRESS_STEPS = 10000
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+# Private to this process (mode 0700) and removed at exit: snapshots hold dataset rows.
+_cache_dir = None
+
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_INDEXED_CLAUSES = re.compile(
+    r"\b(?:WHERE|ON)\b(.*?)(?=\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|\bHAVING\b|"
+    r"\bWINDOW\b|\bJOIN\b|\bUNION\b|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+class SQLError(ValueError):
+    pass
+
+
+def _quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _lock_for(path: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def _sql_dir() -> str:
+    global _cache_dir
+    with _locks_guard:
+        if _cache_dir is None:
+            _cache_dir = tempfile.mkdtemp(prefix="smartdoc-sql-")
+            atexit.register(shutil.rmtree, _cache_dir, ignore_errors=True)
+        return _cache_dir
+
+
+def _db_path(dataset_id: str, ds: dict, version: int) -> str:
+    # The registration token tells apart ids that sanitize alike ("a/b", "a_b") and an
+    # id registered again, whose versions restart at 0.
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", dataset_id)
+    return os.path.join(_sql_dir(), f"{safe}.{dataset_token(ds)}.v{version}.sqlite")
+
+
+def _column_type(store, col: str) -> str:
+    raw = store.raw(col)
+    present = ~pd.isna(raw) & (store.strings(col) != "")
+    if not present.any():
+        return "TEXT"
+    x = store.numeric(col)[present]
+    if np.isnan(x).any():
+        return "TEXT"
+    return "INTEGER" if np.all(np.mod(x, 1) == 0) and np.abs(x).max() < 2**53 else "REAL"
+
+
+def _column_values(store, col: str, kind: str) -> List[Any]:
+    raw = store.raw(col)
+    missing = pd.isna(raw) | (store.strings(col) == "")
+    if kind == "TEXT":
+        vals = store.strings(col).copy()
+    else:
+        x = store.numeric(col)
+        vals = x.astype(np.int64).astype(object) if kind == "INTEGER" else x.astype(object)
+    vals = vals.astype(object)
+    vals[missing] = None
+    return vals
+
+
+def _build(dataset_id: str, path: str) -> None:
+    """Materialize a dataset version as a typed SQLite table named ``data``."""
+    store = get_store(dataset_id)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    conn = sqlite3.connect(tmp)
+    try:
+        types = {h: _column_type(store, h) for h in store.headers}
+        cols = ", ".join(f"{_quote(h)} {t}" for h, t in types.items())
+        conn.execute(f"CREATE TABLE data ({cols})")
+        columns = [_column_values(store, h, types[h]) for h in store.headers]
+        placeholders = ", ".join("?" for _ in store.headers)
+        for a in range(0, store.n_rows, INSERT_BATCH_ROWS):
+            batch = zip(*(c[a : a + INSERT_BATCH_ROWS] for c in columns))
+            conn.executemany(f"INSERT INTO data VALUES ({placeholders})", batch)
+        # Columns Explore users already filter on are indexed up front.
+        for key, _ in store.indexes.describe()["filter_counts"].items():
+            col = key.rsplit(":", 1)[0]
+            if col in types:
+                _create_index(conn, col)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp, path)
+
+
+def _create_index(conn: sqlite3.Connection, col: str) -> None:
+    name = "ix_" + re.sub(r"\W", "_", col)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(name)} ON data ({_quote(col)})")
+
+
+def ensure_table(dataset_id: str) -> str:
+    ds = get_dataset(dataset_id)
+    path = _db_path(dataset_id, ds, dataset_version(ds))
+    if not os.path.exists(path):
+        with _lock_for(path):
+            if not os.path.exists(path):
+                _build(dataset_id, path)
+    return path
+
+
+def _index_filtered_columns(path: str, headers: List[str], sql: str) -> None:
+    """Index columns referenced in WHERE / JOIN ON clauses of the submitted query."""
+    clauses = " ".join(m.group(1) for m in _INDEXED_CLAUSES.finditer(sql))
+    if not clauses:
+        return
+    used = [
+        h
+        for h in headers
+        if re.search(r"(?<![\w\"])" + re.escape(h) + r"(?![\w\"])", clauses) or _quote(h) in clauses
+    ]
+    if not used:
+        return
+    with _lock_for(path):
+        conn = sqlite3.connect(path)
+        try:
+            for col in used:
+                _create_index(conn, col)
+            conn.commit()
+        except sqlite3.Error:
+            # A locked or read-only file just means the query runs without the index.
+            pass
+        finally:
+            conn.close()
+
+
+def _authorizer(action, arg1, arg2, dbname, source):
+    allowed = {
+        sqlite3.SQLITE_SELECT,
+        sqlite3.SQLITE_READ,
+        sqlite3.SQLITE_FUNCTION,
+        sqlite3.SQLITE_RECURSIVE,
+    }
+    return sqlite3.SQLITE_OK if action in allowed else sqlite3.SQLITE_DENY
+
+
+def run_sql(
+    datasets: Dict[str, str],
+    sql: str,
+    max_rows: int = 10000,
+    page_size: int = 1000,
+    timeout_ms: int = 5000,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Run one read-only statement over registered datasets and yield result pages.
+
+    ``datasets`` maps a table alias to a dataset id; each dataset is materialized once
+    per version as a SQLite file and attached read-only under its alias. Yields a header
+    page with column names, then row pages, then a summary.
+    """
+    if not datasets:
+        raise SQLError("no datasets given")
+    for alias in datasets:
+        if not _IDENT.match(alias) or alias.lower() in ("main", "temp"):
+            raise SQLError(f"invalid table alias: {alias}")
+
+    started = time.perf_counter()
+    deadline = started + timeout_ms / 1000
+    paths = {}
+    for alias, dataset_id in datasets.items():
+        paths[alias] = ensure_table(dataset_id)
+        _index_filtered_columns(paths[alias], get_dataset(dataset_id).get("headers", []), sql)
+
+    conn = sqlite3.connect("file::memory:", uri=True, check_same_thread=False)
+    try:
+        for alias, path in paths.items():
+            conn.execute(f"ATTACH DATABASE ? AS {_quote(alias)}", (f"file:{path}?mode=ro",))
+            # Every dataset is also exposed as <alias>, the ``data`` table inside it.
+            conn.execute(f"CREATE TEMP VIEW {_quote(alias)} AS SELECT * FROM {_quote(alias)}.data")
+        conn.execute("PRAGMA query_only = ON")
+        conn.set_authorizer(_authorizer)
+        conn.set_progress_handler(lambda: int(time.perf_counter() > deadline), PROGRESS_STEPS)
+
+        try:
+            cur = conn.execute(sql)
+        except sqlite3.Warning as e:
+            raise SQLError(str(e))
+        except sqlite3.DatabaseError as e:
+            raise SQLError(_describe(e, deadline))
+
+        columns = [d[0] for d in cur.description or []]
+        yield {"columns": columns}
+
+        sent, page, truncated = 0, 0, False
+        try:
+            while sent < max_rows:
+                rows = cur.fetchmany(min(page_size, max_rows - sent))
+                if not rows:
+                    break
+                sent += len(rows)
+                yield {"page": page, "rows": [_clean(r) for r in rows]}
+                page += 1
+            else:
+                truncated = cur.fetchone() is not None
+        except sqlite3.DatabaseError as e:
+            yield {"error": _describe(e, deadline)}
+            return
+        yield {
+            "done": True,
+            "row_count": sent,
+            "truncated": truncated,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+    finally:
+        conn.close()
+
+
+def _describe(e: Exception, deadline: float) -> str:
+    if "interrupted" in str(e) and time.perf_counter() > deadline:
+        return "query timed out"
+    return str(e)
+
+
+def _clean(row) -> List[Any]:
+    return [None if isinstance(v, float) and not math.isfinite(v) else v for v in row]
+
+
+@register_version_hook
+def _drop_stale(dataset_id: str, ds: dict, old_version: int, new_version: int, appended) -> None:
+    path = _db_path(dataset_id, ds, old_version)
+    with _lock_for(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
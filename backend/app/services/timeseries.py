@@ -0,0 +1,174 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from app.services.cache import LRUCache
+from app.services.registry import dataset_version, get_dataset, register_version_hook
+
+RESOLUTIONS = ("day", "week", "month", "quarter")
+STATS = ("sum", "mean", "count", "min", "max")
+
+TS_CACHE = LRUCache(max_entries=64)
+
+
+def _parse_dates(values) -> np.ndarray:
+    """Parse once to datetime64[ns]; unparseable values become NaT."""
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce")
+    if getattr(parsed.dt, "tz", None) is not None:
+        parsed = parsed.dt.tz_convert(None)
+    return parsed.to_numpy(dtype="datetime64[ns]")
+
+
+def _period_keys(ts: np.ndarray, resolution: str) -> np.ndarray:
+    """Period start of every timestamp as datetime64[D], fully vectorized."""
+    if resolution == "day":
+        return ts.astype("datetime64[D]")
+    if resolution == "week":
+        days = ts.astype("datetime64[D]")
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday.
+        weekday = (days.astype(np.int64) + 3) % 7
+        return days - weekday.astype("timedelta64[D]")
+    months = ts.astype("datetime64[M]")
+    if resolution == "quarter":
+        m = months.astype(np.int64)
+        months = (m - m % 3).astype("datetime64[M]")
+    return months.astype("datetime64[D]")
+
+
+def _label(key: np.datetime64, resolution: str) -> str:
+    ts = pd.Timestamp(key)
+    if resolution == "month":
+        return ts.strftime("%Y-%m")
+    if resolution == "quarter":
+        return f"{ts.year}-Q{(ts.month - 1) // 3 + 1}"
+    return ts.strftime("%Y-%m-%d")
+
+
+class TimeSeriesIndex:
+    """
+    Multi-resolution rollups (sum/count/min/max per numeric column) over one date column.
+
+    Means are derived as sum / count, so every stored statistic is mergeable and an
+    append only needs to roll up the new rows and fold them in.
+    """
+
+    def __init__(self, date_column: str, value_columns: Sequence[str]):
+        self.date_column = date_column
+        self.value_columns = list(value_columns)
+        self.rows = 0
+        self.unparsed = 0
+        self.rollups: Dict[str, pd.DataFrame] = {}
+
+    @classmethod
+    def from_frame(
+        cls, df: pd.DataFrame, date_column: str, value_columns: Optional[Sequence[str]] = None
+    ) -> "TimeSeriesIndex":
+        if value_columns is None:
+            value_columns = [
+                c for c in df.select_dtypes(include=["number"]).columns if c != date_column
+            ]
+        index = cls(date_column, value_columns)
+        index.append(df)
+        return index
+
+    def _rollup(self, ts: np.ndarray, values: pd.DataFrame, resolution: str) -> pd.DataFrame:
+        keys = _period_keys(ts, resolution)
+        return values.groupby(keys, sort=True).agg(["sum", "count", "min", "max"])
+
+    def append(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        ts = _parse_dates(df[self.date_column].to_numpy())
+        ok = ~np.isnat(ts)
+        self.rows += int(ok.sum())
+        self.unparsed += int((~ok).sum())
+        values = df.loc[ok, self.value_columns].apply(pd.to_numeric, errors="coerce")
+        values = values.reset_index(drop=True)
+        ts = ts[ok]
+        for res in RESOLUTIONS:
+            new = self._rollup(ts, values, res)
+            old = self.rollups.get(res)
+            if old is None or old.empty:
+                self.rollups[res] = new
+                continue
+            merged = pd.concat([old, new])
+            how = {c: ("sum" if c[1] in ("sum", "count") else c[1]) for c in merged.columns}
+            self.rollups[res] = merged.groupby(level=0, sort=True).agg(how)
+
+    def trend(self, column: str, resolution: str = "month", stat: str = "mean") -> Dict[str, Any]:
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"unsupported resolution: {resolution}")
+        if stat not in STATS:
+            raise ValueError(f"unsupported stat: {stat}")
+        if column not in self.value_columns:
+            raise ValueError(f"column not indexed: {column}")
+        r = self.rollups.get(resolution)
+        if r is None or r.empty:
+            return {"labels": [], "values": [], "resolution": resolution, "stat": stat}
+        counts = r[(column, "count")]
+        r = r[counts > 0]
+        if stat == "mean":
+            values = r[(column, "sum")] / r[(column, "count")]
+        else:
+            values = r[(column, stat)]
+        return {
+            "labels": [_label(k, resolution) for k in r.index.to_numpy()],
+            "values": values.astype(float).round(4).tolist(),
+            "resolution": resolution,
+            "stat": stat,
+        }
+
+    def period_over_period(
+        self, column: str, resolution: str = "month", stat: str = "sum"
+    ) -> List[Dict[str, Any]]:
+        """Percent change between consecutive periods (month-over-month by default)."""
+        t = self.trend(column, resolution, stat)
+        labels, values = t["labels"], np.asarray(t["values"], dtype=float)
+        if len(values) < 2:
+            return []
+        prev, cur = values[:-1], values[1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.round((cur - prev) / prev * 100, 2)
+        return [
+            {
+                "period": labels[i + 1],
+                "previous": float(prev[i]),
+                "value": float(cur[i]),
+                "pct_change": float(pct[i]),
+            }
+            for i in range(len(pct))
+            if prev[i] != 0 and np.isfinite(pct[i])
+        ]
+
+
+def _frame(rows: List[dict], headers: List[str]) -> pd.DataFrame:
+    return pd.DataFrame.from_records(rows, columns=headers)
+
+
+def timeseries_for_dataset(dataset_id: str, date_column: str) -> TimeSeriesIndex:
+    ds = get_dataset(dataset_id)
+    headers = ds.get("headers", [])
+    if date_column not in headers:
+        raise ValueError(f"column not found: {date_column}")
+    key = (dataset_id, dataset_version(ds), date_column)
+    index = TS_CACHE.get(key)
+    if index is None:
+        df = _frame(ds.get("rows", []), headers)
+        numeric = df.drop(columns=[date_column]).apply(pd.to_numeric, errors="coerce")
+        value_columns = [c for c in numeric.columns if numeric[c].notna().any()]
+        index = TimeSeriesIndex.from_frame(df, date_column, value_columns)
+        TS_CACHE.put(key, index)
+    return index
+
+
+@register_version_hook
+def _on_version(dataset_id: str, ds: dict, old_version: int, new_version: int, appended) -> None:
+    """Roll cached indexes forward on append instead of rebuilding; drop them otherwise."""
+    for key in TS_CACHE.keys():
+        if key[0] != dataset_id or key[1] != old_version:
+            continue
+        index = TS_CACHE.pop(key)
+        if index is None or appended is None:
+            continue
+        index.append(_frame(appended, ds.get("headers", [])))
+        TS_CACHE.put((dataset_id, new_version, key[2]), index)
@@ -0,0 +1,189 @@
+import gzip
+import io
+import json
+
+import pytest
+from app.models.schemas import DeduplicateRequest
+from app.router.actions.export import router as export_router
+from app.services import export
+from app.services.action_executor import ActionExecutor
+from app.services.column_store import get_store
+from app.services.registry import REGISTRY, redo, undo
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+ROWS = [
+    {"email": "a@x.com", "name": "Jon Smith", "n": 1},
+    {"email": " A@X.com", "name": "Jon Smith", "n": 2},
+    {"email": "b@y.com", "name": "John Smith", "n": 3},
+    {"email": "c@z.com", "name": "Mary Jones", "n": 4},
+]
+
+
+def test_deduplicate_honors_strategy():
+    executor = ActionExecutor()
+    REGISTRY["test-dedup"] = {"headers": ["email", "name", "n"], "rows": list(ROWS)}
+    preview = executor.deduplicate("test-dedup", ["email"], "keep_first")
+    assert preview["will_remove"] == 1
+    assert preview["affected_records"] == [ROWS[1]]
+
+    executor.deduplicate("test-dedup", ["email"], "keep_latest", dry_run=False)
+    assert [r["n"] for r in REGISTRY["test-dedup"]["rows"]] == [2, 3, 4]
+
+
+def test_fuzzy_deduplicate_catches_near_matches():
+    executor = ActionExecutor()
+    REGISTRY["test-dedup"] = {"headers": ["email", "name", "n"], "rows": list(ROWS)}
+    exact = executor.deduplicate("test-dedup", ["name"], "keep_first")
+    fuzzy = executor.deduplicate("test-dedup", ["name"], "keep_first", fuzzy=True, threshold=0.5)
+    assert exact["will_remove"] == 1
+    assert fuzzy["will_remove"] == 2 and fuzzy["near_duplicates"] == 1
+    assert fuzzy["affected_records"][-1]["name"] == "John Smith"
+    for threshold in (0, 1.5):
+        with pytest.raises(ValidationError):
+            DeduplicateRequest(dataset_id="test-dedup", fuzzy=True, threshold=threshold)
+
+
+def test_fuzzy_deduplicate_keeps_distinct_keys():
+    first = (
+        "james mary john patricia robert jennifer michael linda william elizabeth david "
+        "barbara richard susan joseph jessica thomas sarah charles karen christopher nancy "
+        "daniel lisa matthew betty anthony margaret mark sandra donald ashley steven "
+        "kimberly paul emily andrew donna joshua michelle"
+    ).split()
+    last = (
+        "smith johnson williams brown jones garcia miller davis rodriguez martinez hernandez "
+        "lopez gonzalez wilson anderson thomas taylor moore jackson martin lee perez "
+        "thompson white harris sanchez clark ramirez lewis robinson walker young allen king "
+        "wright scott torres nguyen hill flores"
+    ).split()
+    rows = [{"email": f"{a}.{b}@gmail.com", "name": f"{a} {b}"} for a in first for b in last]
+    REGISTRY["test-dedup-distinct"] = {"headers": ["email", "name"], "rows": rows}
+    executor = ActionExecutor()
+    for key in ("email", "name"):
+        preview = executor.deduplicate("test-dedup-distinct", [key], "keep_first", fuzzy=True)
+        assert preview["will_remove"] == 0, key
+
+    # A typo of one address is still caught, and only that row goes.
+    rows.append({"email": "andrew.alen@gmail.com", "name": "andrew alen"})
+    preview = executor.deduplicate("test-dedup-distinct", ["email"], "keep_first", fuzzy=True)
+    assert preview["will_remove"] == 1 and preview["affected_records"] == [rows[-1]]
+
+
+def test_fill_missing_writes_new_version():
+    executor = ActionExecutor()
+    rows = [
+        {"region": "N", "amount": 10, "tier": "gold"},
+        {"region": "N", "amount": None, "tier": ""},
+        {"region": "S", "amount": "30", "tier": "silver"},
+        {"region": "S", "amount": "NaN", "tier": "silver"},
+        {"region": "S", "amount": 50, "tier": None},
+    ]
+    REGISTRY["test-fill"] = {"headers": ["region", "amount", "tier"], "rows": rows}
+
+    res = executor.fill_missing("test-fill", "group_median", group_by="region")
+    filled = REGISTRY["test-fill"]["rows"]
+    assert [r["amount"] for r in filled] == [10, 10.0, "30", 40.0, 50]
+    assert [r["tier"] for r in filled] == ["gold", "N/A", "silver", "silver", "N/A"]
+    assert res["filled"] == {"amount": 2, "tier": 2}
+    assert res["version"] == 1
+    # The previous version's rows are left as they were.
+    assert rows[1]["amount"] is None and filled[0] is rows[0]
+
+
+def test_remove_outliers_previews_then_removes_flagged_rows():
+    executor = ActionExecutor()
+    rows = [{"a": v, "b": 10 + v % 3, "note": "x"} for v in range(20)]
+    rows[3]["a"] = 500
+    rows[7]["b"] = "-400"
+    rows[9]["b"] = "n/a"
+    REGISTRY["test-outliers"] = {"headers": ["a", "b", "note"], "rows": rows}
+
+    preview = executor.remove_outliers("test-outliers", method="iqr", dry_run=True)
+    assert preview["removed"] == 2 and preview["by_column"] == {"a": 1, "b": 1}
+    assert preview["affected_records"] == [rows[3], rows[7]]
+    assert REGISTRY["test-outliers"]["rows"] is rows
+
+    res = executor.remove_outliers("test-outliers", columns=["a", "b"], method="iqr")
+    kept = REGISTRY["test-outliers"]["rows"]
+    assert res["removed"] == 2 and res["version"] == preview["version"] + 1
+    assert len(kept) == 18 and rows[3] not in kept and rows[9] in kept
+
+
+def test_stream_segment_exports_filtered_rows():
+    executor = ActionExecutor()
+    rows = [{"id": i, "city": ["Paris", "Rome"][i % 2], "amt": i * 1.5} for i in range(6)]
+    REGISTRY["test-export"] = {"headers": ["id", "city", "amt"], "rows": rows}
+
+    chunks, media_type, filename = executor.stream_segment("test-export", {"city": "Rome"})
+    assert media_type == "text/csv" and filename == "test-export.csv"
+    assert b"".join(chunks).decode() == "id,city,amt\n1,Rome,1.5\n3,Rome,4.5\n5,Rome,7.5\n"
+
+    filters = [{"column": "amt", "operator": ">", "value": 5}]
+    chunks, media_type, _ = executor.stream_segment(
+        "test-export", filters, ["id"], format="ndjson", gzip=True
+    )
+    assert media_type == "application/gzip"
+    lines = gzip.decompress(b"".join(chunks)).decode().splitlines()
+    assert [json.loads(line) for line in lines] == [{"id": 4}, {"id": 5}]
+
+
+def test_export_route_streams_files_or_answers_json():
+    app = FastAPI()
+    app.include_router(export_router)
+    client = TestClient(app)
+    rows = [{"id": i, "city": ["Paris", "Rome"][i % 2]} for i in range(4)]
+    REGISTRY["test-export-route"] = {"headers": ["id", "city"], "rows": rows}
+    body = {"dataset_id": "test-export-route", "filters": {"city": "Rome"}}
+
+    streamed = client.post("/export", json=body)
+    assert streamed.headers["content-type"].startswith("text/csv")
+    assert streamed.text == "id,city\n1,Rome\n3,Rome\n"
+    answered = client.post("/export", json={**body, "format": "json", "columns": ["id"]})
+    assert answered.json() == {"rows": [{"id": 1}, {"id": 3}], "count": 2, "headers": ["id"]}
+    assert client.post("/export", json={**body, "dataset_id": "missing"}).status_code == 400
+
+
+def test_parquet_export_round_trips(monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(export, "EXPORT_CHUNK_ROWS", 4)
+    executor = ActionExecutor()
+    rows = [
+        {"id": float(i), "amt": None if i == 3 else i * 0.5, "tag": i if i % 2 else f"t{i}"}
+        for i in range(10)
+    ]
+    REGISTRY["test-parquet"] = {"headers": ["id", "amt", "tag"], "rows": rows}
+
+    chunks, media_type, filename = executor.stream_segment("test-parquet", format="parquet")
+    parts = list(chunks)
+    assert filename == "test-parquet.parquet" and media_type == export.MEDIA_TYPES["parquet"]
+    # Each row group is handed out as soon as it is written.
+    assert sum(1 for p in parts if p) > 2
+    table = pq.read_table(io.BytesIO(b"".join(parts)))
+    assert pq.ParquetFile(io.BytesIO(b"".join(parts))).num_row_groups == 3
+    assert [str(f.type) for f in table.schema] == ["int64", "double", "string"]
+    assert table.column("id").to_pylist() == list(range(10))
+    assert table.column("amt").to_pylist()[2:5] == [1.0, None, 2.0]
+    assert table.column("tag").to_pylist()[:3] == ["t0", "1", "t2"]
+
+
+def test_cleaning_versions_share_columns_and_undo():
+    executor = ActionExecutor()
+    rows = [{"id": i, "amt": None if i == 2 else i, "city": "P"} for i in range(6)]
+    REGISTRY["test-versions"] = {"headers": ["id", "amt", "city"], "rows": rows}
+    before = get_store("test-versions")
+
+    executor.fill_missing("test-versions", "median", columns=["amt"])
+    filled = get_store("test-versions")
+    assert filled.raw("id") is before.raw("id") and filled.raw("amt")[2] == 3.0
+    executor.remove_outliers("test-versions", "amt", z=1.0)
+    assert len(REGISTRY["test-versions"]["rows"]) == 4
+
+    undo("test-versions")
+    undo("test-versions")
+    assert REGISTRY["test-versions"]["rows"] is rows
+    assert get_store("test-versions").raw("amt")[2] is None
+    redo("test-versions")
+    assert REGISTRY["test-versions"]["rows"][2]["amt"] == 3.0
+    assert REGISTRY["test-versions"]["version"] == 5
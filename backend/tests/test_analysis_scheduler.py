@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from app.router.analyze import _generate_comprehensive_insights, _generate_enhanced_summary
+from app.services.analysis_scheduler import APPROXIMATE, EXACT, SKIPPED, AnalysisScheduler
+
+
+def _frame(n=10_000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"a": rng.normal(size=n), "b": rng.integers(0, 5, n)})
+
+
+def test_without_deadline_every_stage_is_exact():
+    df = _frame()
+    scheduler = AnalysisScheduler(df)
+    assert scheduler.run("rows", len) == len(df)
+    assert scheduler.run("boom", lambda d: 1 / 0, default="x") == "x"
+    report = scheduler.report()
+    assert report["sections"]["rows"]["status"] == EXACT
+    assert report["sections"]["boom"]["status"] == SKIPPED and "error" in report["sections"]["boom"]
+    assert report["partial"]
+
+
+def test_stage_over_budget_runs_on_a_sample():
+    df = _frame()
+    scheduler = AnalysisScheduler(df, deadline_ms=60_000)
+    # 10k rows x 2 columns at 5 ms per cell is far over the budget; ~4.8k rows fit.
+    scheduler.ms_per_cell = 5.0
+    seen = scheduler.run("rows", len)
+    section = scheduler.report()["sections"]["rows"]
+    assert section["status"] == APPROXIMATE
+    assert 1_000 < seen == section["sample_rows"] < len(df)
+
+
+def test_spent_budget_skips_stages():
+    scheduler = AnalysisScheduler(_frame(), deadline_ms=0)
+    assert scheduler.run("rows", len, default=-1) == -1
+    assert scheduler.report()["sections"]["rows"]["status"] == SKIPPED
+
+
+def test_sampled_summary_reports_dataset_size():
+    df = _frame()
+    sample = df.sample(n=500, random_state=0)
+    assert "has 10,000 records" in _generate_enhanced_summary(sample, "u", {}, len(df))
+    assert "contains 10,000 records" in _generate_comprehensive_insights(sample, {}, len(df))[0]
@@ -0,0 +1,50 @@
+import numpy as np
+from app.models.schemas import BinSpec
+from app.services.binning import bins_for_dataset, compute_bins
+from app.services.registry import REGISTRY, append_rows
+
+
+def _values():
+    rng = np.random.default_rng(0)
+    values = list(rng.lognormal(size=5_000))
+    values[::50] = [None] * len(values[::50])
+    values[1::97] = ["n/a"] * len(values[1::97])
+    return values
+
+
+def test_fixed_bins_match_numpy_histogram():
+    values = _values()
+    x = np.array([v for v in values if isinstance(v, float)])
+    result = compute_bins(values, BinSpec(mode="fixed", bins=12))
+    counts, edges = np.histogram(x, bins=12)
+    assert np.allclose(result["edges"], edges)
+    assert result["counts"] == counts.tolist()
+    assert result["missing"] == len(values) - len(x)
+
+
+def test_counts_cover_every_non_null_row():
+    values = _values()
+    present = sum(isinstance(v, float) for v in values)
+
+    def chunks():
+        for start in range(0, len(values), 700):
+            yield values[start : start + 700]
+
+    for mode in ("fixed", "quantile", "fd", "log"):
+        result = compute_bins(chunks, BinSpec(mode=mode, bins=10))
+        assert sum(result["counts"]) == result["total"] == present, mode
+        assert result["excluded"] == 0
+        assert result["edges"] == sorted(result["edges"])
+
+    cats = compute_bins(["a", "b", "a", None, "", "c", "a"], BinSpec(mode="categorical", top_n=1))
+    assert cats["labels"] == ["a", "Other"] and cats["counts"] == [3, 2]
+    assert cats["total"] == 5 and cats["missing"] == 2
+
+
+def test_dataset_bins_are_cached_per_version():
+    REGISTRY["test-bins"] = {"headers": ["v"], "rows": [{"v": i} for i in range(100)]}
+    first = bins_for_dataset("test-bins", "v")
+    assert bins_for_dataset("test-bins", "v") is first
+    append_rows("test-bins", [{"v": 1000}])
+    after = bins_for_dataset("test-bins", "v")
+    assert after is not first and after["total"] == 101
@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+from app.services import column_index
+from app.services.column_index import IndexManager
+from app.services.column_store import ColumnStore
+from app.services.explore_engine import compile_filters
+
+FILTERS = [
+    {"column": "city", "operator": "eq", "value": "Rome"},
+    {"column": "city", "operator": "in", "value": ["Oslo", "Lima", "nowhere"]},
+    {"column": "code", "operator": "between", "value": ["B", "D"]},
+    {"column": "amount", "operator": ">", "value": 250},
+    {"column": "amount", "operator": "<", "value": "12.5"},
+    {"column": "name", "operator": "contains", "value": "ANN"},
+    {"column": "name", "operator": "contains", "value": "e"},
+    {"column": "name", "operator": "startswith", "value": "jo"},
+    {"column": "name", "operator": "startswith", "value": "zzz"},
+]
+
+
+def _store(enabled: bool) -> ColumnStore:
+    rnd = random.Random(0)
+    names = ["Joanna", "John", "anne", "Hannah", "Zoe", "Jo", "Léa", None]
+    rows = [
+        {
+            "city": rnd.choice(["Rome", "Oslo", "Lima", "", None]),
+            "code": rnd.choice("ABCDEF") + str(rnd.randint(0, 9)),
+            "amount": rnd.choice([rnd.uniform(0, 500), "n/a", None, str(rnd.randint(0, 500))]),
+            "name": rnd.choice(names),
+        }
+        for _ in range(3_000)
+    ]
+    store = ColumnStore(["city", "code", "amount", "name"], rows)
+    store.indexes = IndexManager(store, build_after=2, enabled=enabled)
+    return store
+
+
+def test_indexed_filters_match_scans():
+    indexed, scanned = _store(True), _store(False)
+    for f in FILTERS:
+        expected = compile_filters(scanned, [f])
+        # First use scans, second builds the index, third reads it.
+        for _ in range(3):
+            assert np.array_equal(compile_filters(indexed, [f]), expected), f
+    kinds = {(i["column"], i["kind"]) for i in indexed.indexes.describe()["indexes"]}
+    assert kinds == {
+        ("city", "bitmap"),
+        ("code", "string"),
+        ("amount", "numeric"),
+        ("name", "trigram"),
+    }
+    assert scanned.indexes.describe()["indexes"] == []
+    assert np.array_equal(compile_filters(indexed, FILTERS), compile_filters(scanned, FILTERS))
+
+
+def test_bitmap_skipped_for_high_cardinality(monkeypatch):
+    monkeypatch.setattr(column_index, "BITMAP_MAX_CARDINALITY", 3)
+    store = _store(True)
+    f = {"column": "city", "operator": "eq", "value": "Rome"}
+    assert store.indexes.bitmap("city") is None
+    assert store.indexes.bitmap("city") is None
+    # The refusal is remembered and the filter keeps scanning.
+    assert ("city", "bitmap") in store.indexes._indexes
+    assert compile_filters(store, [f]).sum() == (store.strings("city") == "Rome").sum()
@@ -0,0 +1,68 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from app.intelligence.correlation_engine import (
+    association_matrix,
+    correlation_matrix,
+    quality_report,
+    top_correlations,
+)
+
+
+def _frame():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(300, 12))
+    x[:, 1] = x[:, 0] * 2 + rng.normal(size=300) * 0.1
+    x[rng.integers(0, 300, 80), rng.integers(0, 12, 80)] = np.nan
+    return pd.DataFrame(x, columns=[f"c{i}" for i in range(12)])
+
+
+def test_blockwise_matrix_matches_pandas():
+    df = _frame()
+    for method in ("pearson", "spearman"):
+        ours = correlation_matrix(df.dropna(), method, block_size=5).to_numpy()
+        assert np.allclose(ours, df.dropna().corr(method).to_numpy())
+    assert np.allclose(correlation_matrix(df, block_size=5).to_numpy(), df.corr().to_numpy())
+
+
+def test_spearman_with_missing_values_uses_pairwise_deletion():
+    df = _frame()
+    df["c0"] = np.exp(df["c0"])  # monotone, so only the ranking matters
+    complete = ["c2", "c3", "c4"]
+    df[complete] = np.random.default_rng(1).normal(size=(len(df), 3))
+    ours = correlation_matrix(df, "spearman", block_size=5)
+    expected = df.corr("spearman")
+    # Exact for pairs without missing values, close to pandas' per-pair ranks otherwise.
+    assert np.allclose(ours.loc[complete, complete], expected.loc[complete, complete])
+    assert np.allclose(ours.to_numpy(), expected.to_numpy(), atol=0.01)
+    top = top_correlations(df, k=3, method="spearman", target="c1")
+    assert np.isclose(top[0]["r"], ours.loc["c0", "c1"])
+
+
+def test_top_pairs():
+    top = top_correlations(_frame(), k=1, block_size=4)
+    assert top[0]["a"] == "c0" and top[0]["b"] == "c1" and top[0]["r"] > 0.99
+
+
+def test_association_matrix_mixed_types():
+    df = pd.DataFrame(
+        {
+            "segment": ["a", "a", "b", "b", "c", "c"] * 20,
+            "region": ["n", "n", "s", "s", "e", "e"] * 20,
+            "revenue": [10.0, 11.0, 50.0, 52.0, 90.0, 91.0] * 20,
+        }
+    )
+    assoc = association_matrix(df)
+    m = pd.DataFrame(assoc["matrix"], index=assoc["columns"], columns=assoc["columns"])
+    assert np.isclose(m.loc["segment", "region"], 1.0)
+    assert m.loc["segment", "revenue"] > 0.99
+
+
+def test_quality_report_tolerates_empty_numeric_columns():
+    df = pd.DataFrame({"a": [1.0, 2.0, 3.0] * 10 + [500.0], "empty": [np.nan] * 31})
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        report = quality_report(df)
+    assert list(report["outliers"]) == ["a"]
+    assert report["outliers"]["a"][0]["row"] == 30
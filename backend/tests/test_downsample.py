@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from app.router.dataset_routes import TimeSeriesRequest
+from app.services.downsample import lttb_indices, reduce_chart
+from pydantic import ValidationError
+
+
+def test_lttb_keeps_ends_and_spikes():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500)
+    y[4321] = 50.0
+    idx = lttb_indices(x, y, 100)
+    assert len(idx) == 100 and idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+    assert 4321 in idx
+
+
+def test_line_chart_is_reduced_to_at_least_three_points():
+    values = [float(v) for v in range(1_000)]
+    values[10] = float("nan")
+    chart = {"type": "line", "labels": [str(i) for i in range(1_000)], "values": values}
+    out = reduce_chart(chart, 50)
+    assert len(out["values"]) == 50 and out["meta"]["original_points"] == 1_000
+    assert out["labels"][0] == "0" and out["labels"][-1] == "999"
+    assert all(np.isfinite(out["values"]))
+    assert len(reduce_chart(chart, 1)["values"]) == 3
+
+
+def test_scatter_is_grid_binned():
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(size=5_000), rng.normal(size=5_000)
+    x[:7] = np.nan
+    out = reduce_chart({"type": "scatter", "x": x.tolist(), "y": y.tolist()}, 100)
+    assert out["type"] == "scatter_binned"
+    assert len(out["x"]) <= 100 and sum(out["counts"]) == 5_000 - 7
+    assert np.nanmin(x) <= min(out["x"]) and max(out["x"]) <= np.nanmax(x)
+
+
+def test_max_points_below_three_is_rejected():
+    with pytest.raises(ValidationError):
+        TimeSeriesRequest(date_column="d", column="v", max_points=2)
@@ -0,0 +1,318 @@
+import random
+
+import numpy as np
+import pytest
+from app.config import settings
+from app.models.schemas import ExploreQuery
+from app.services.aggregates import state_bytes
+from app.services.column_store import ColumnStore, get_store
+from app.services.cubes import CUBE_CACHE
+from app.services.explore_engine import execute
+from app.services.joins import hash_join
+from app.services.parallel import partitions
+from app.services.query_builder import run_explore_query
+from app.services.registry import REGISTRY, append_rows
+from app.services.spill import memory_budget, partition_count
+from pydantic import ValidationError
+
+ROWS = [
+    {"region": "N", "amount": "120", "status": "paid"},
+    {"region": "S", "amount": "80", "status": "paid"},
+    {"region": "N", "amount": "x", "status": "open"},
+    {"region": "E", "amount": "300", "status": "paid"},
+    {"region": "S", "amount": "40", "status": None},
+]
+
+
+def setup_module():
+    REGISTRY["test-explore"] = {"headers": ["region", "amount", "status"], "rows": ROWS}
+
+
+def test_filters_and_sort():
+    res = run_explore_query(
+        "test-explore",
+        {
+            "filters": [{"column": "amount", "operator": ">", "value": 50}],
+            "sort": {"amount": "desc"},
+        },
+    )
+    assert res["total_matched"] == 3
+    assert [r["region"] for r in res["results"]] == ["S", "E", "N"]  # string sort, as before
+    assert res["execution_ms"] >= 0
+
+
+def test_group_by_sum():
+    res = run_explore_query(
+        "test-explore",
+        {
+            "filters": [{"column": "status", "operator": "eq", "value": "paid"}],
+            "group_by": "region",
+            "aggregate": {"amount": "sum"},
+            "sort": {"amount_sum": "desc"},
+        },
+    )
+    assert res["results"] == [
+        {"region": "E", "amount_sum": 300.0},
+        {"region": "N", "amount_sum": 120.0},
+        {"region": "S", "amount_sum": 80.0},
+    ]
+
+
+def test_cursor_pagination():
+    query = {"sort": {"region": "asc"}, "limit": 2}
+    first = run_explore_query("test-explore", query)
+    second = run_explore_query("test-explore", {**query, "cursor": first["next_cursor"]})
+    third = run_explore_query("test-explore", {**query, "cursor": second["next_cursor"]})
+    regions = [r["region"] for r in first["results"] + second["results"] + third["results"]]
+    assert regions == ["E", "N", "N", "S", "S"]
+    assert third["next_cursor"] is None
+
+
+def test_multiple_aggregates_per_group():
+    res = run_explore_query(
+        "test-explore",
+        {
+            "group_by": "region",
+            "aggregate": {"amount": ["count", "max", "median"], "status": "count_distinct"},
+        },
+    )
+    assert res["results"] == [
+        {
+            "region": "N",
+            "amount_count": 2.0,
+            "amount_max": 120.0,
+            "amount_median": 120.0,
+            "status_count_distinct": 2.0,
+        },
+        {
+            "region": "S",
+            "amount_count": 2.0,
+            "amount_max": 80.0,
+            "amount_median": 60.0,
+            "status_count_distinct": 1.0,
+        },
+        {
+            "region": "E",
+            "amount_count": 1.0,
+            "amount_max": 300.0,
+            "amount_median": 300.0,
+            "status_count_distinct": 1.0,
+        },
+    ]
+
+
+def test_hot_pattern_served_from_cube():
+    REGISTRY["test-cube"] = {"headers": ["region", "amount", "status"], "rows": ROWS * 20}
+    queries = [
+        {
+            "group_by": "region",
+            "aggregate": {"amount": ["sum", "avg", "max"]},
+            "filters": [{"column": "status", "operator": "eq", "value": status}],
+        }
+        for status in ("paid", "open", "None", "paid")
+    ]
+    for q in queries[:3]:
+        run_explore_query("test-cube", q)
+    assert any(k[0] == "test-cube" for k in CUBE_CACHE.keys())
+
+    append_rows("test-cube", ROWS)
+    res = run_explore_query("test-cube", queries[3])
+    assert res["results"] == execute(get_store("test-cube"), queries[3])["results"]
+
+
+def test_approx_aggregates_cover_exact_values():
+    rng = random.Random(7)
+    REGISTRY["test-approx"] = {
+        "headers": ["region", "amount"],
+        "rows": [
+            {"region": rng.choice("NSEW"), "amount": rng.expovariate(0.01)} for _ in range(60000)
+        ],
+    }
+    query = {"group_by": "region", "aggregate": {"amount": ["sum", "avg"]}}
+    exact = {r["region"]: r for r in run_explore_query("test-approx", query)["results"]}
+    res = run_explore_query("test-approx", {**query, "approx": {"max_error": 0.1}})
+    assert res["approx"]["estimated_groups"] == 4
+    for row in res["results"]:
+        for name in ("amount_sum", "amount_avg"):
+            assert abs(row[name] / exact[row["region"]][name] - 1) < 0.15
+            assert row[f"{name}_ci_low"] <= row[name] <= row[f"{name}_ci_high"]
+
+
+def test_between_on_non_iso_dates():
+    REGISTRY["test-dates"] = {
+        "headers": ["day", "region"],
+        "rows": [
+            {"day": "12/30/2023", "region": "N"},
+            {"day": "01/02/2024", "region": "S"},
+            {"day": "02/15/2024", "region": "N"},
+            {"day": "03/01/2024", "region": "N"},
+        ],
+    }
+    res = run_explore_query(
+        "test-dates",
+        {
+            "filters": [
+                {"column": "day", "operator": "between", "value": ["12/01/2023", "02/29/2024"]},
+                {"column": "region", "operator": "eq", "value": "N"},
+            ]
+        },
+    )
+    assert [r["day"] for r in res["results"]] == ["12/30/2023", "02/15/2024"]
+
+
+def test_contains_and_prefix_with_trigram_index():
+    names = ["Anna Smith", "JOHN SMITHSON", "Smit", "Jo Blacksmith", None, "ANNE"]
+    REGISTRY["test-names"] = {"headers": ["name"], "rows": [{"name": n} for n in names]}
+    contains = {"filters": [{"column": "name", "operator": "contains", "value": "smith"}]}
+    prefix = {"filters": [{"column": "name", "operator": "starts_with", "value": "ann"}]}
+    store = get_store("test-names")
+    # Early runs scan; later ones are answered from the trigram index.
+    for _ in range(4):
+        res = execute(store, contains)
+        assert [r["name"] for r in res["results"]] == [names[0], names[1], names[3]]
+        res = execute(store, prefix)
+        assert [r["name"] for r in res["results"]] == [names[0], names[5]]
+    assert store.indexes.trigram("name") is not None
+
+
+def test_partitioned_execution_matches_single_thread(monkeypatch):
+    rows = [
+        {"region": "NSEW"[i % 4], "amount": str(i % 97) if i % 13 else "x", "n": i}
+        for i in range(2000)
+    ]
+    REGISTRY["test-partitions"] = {"headers": ["region", "amount", "n"], "rows": rows}
+    grouped = {
+        "filters": [{"column": "n", "operator": ">", "value": 10}],
+        "group_by": "region",
+        "aggregate": {"amount": ["sum", "count", "max", "median", "count_distinct"]},
+    }
+    top = {
+        "filters": [{"column": "region", "operator": "eq", "value": "S"}],
+        "sort": {"amount": "desc"},
+        "limit": 20,
+    }
+
+    def run():
+        store = ColumnStore(["region", "amount", "n"], rows)
+        store.indexes.enabled = False
+        return execute(store, grouped), execute(store, top)
+
+    single = run()
+    monkeypatch.setattr(settings, "QUERY_WORKERS", 4)
+    monkeypatch.setattr(settings, "QUERY_PARALLEL_MIN_ROWS", 100)
+    monkeypatch.setattr(settings, "QUERY_PARTITION_MIN_ROWS", 300)
+    assert len(partitions(2000)) == 4
+    parallel = run()
+    for a, b in zip(single, parallel):
+        assert a["results"] == b["results"]
+        assert a["total_matched"] == b["total_matched"]
+
+
+def test_group_by_spills_over_memory_budget():
+    rows = [{"customer": f"c{i % 700}", "amount": str(i % 50)} for i in range(5000)]
+    store = ColumnStore(["customer", "amount"], rows)
+    query = {
+        "group_by": "customer",
+        "aggregate": {"amount": ["sum", "count", "max"]},
+        "sort": {"amount_sum": "desc"},
+        "limit": 25,
+    }
+    assert partition_count(state_bytes({"sum", "count", "max"}, 700, 5000), 10_000) > 1
+    in_memory = execute(store, query)
+    spilled = execute(store, {**query, "memory_budget_mb": 0.01})
+    assert spilled["results"] == in_memory["results"]
+    assert spilled["has_more"] and in_memory["has_more"]
+
+
+def test_memory_budget_must_be_positive():
+    for mb in (0, -1):
+        with pytest.raises(ValidationError):
+            ExploreQuery(memory_budget_mb=mb)
+    assert memory_budget({"memory_budget_mb": None}) == memory_budget()
+    assert memory_budget({"memory_budget_mb": 0.5}) == 512 * 1024
+
+
+def test_join_with_customers_dataset():
+    REGISTRY["test-orders"] = {
+        "headers": ["order", "customer", "amount"],
+        "rows": [
+            {"order": 1, "customer": "7", "amount": 10},
+            {"order": 2, "customer": 8, "amount": 5},
+            {"order": 3, "customer": 7.0, "amount": 20},
+            {"order": 4, "customer": 99, "amount": 1},
+            {"order": 5, "customer": None, "amount": 2},
+        ],
+    }
+    REGISTRY["test-customers"] = {
+        "headers": ["id", "segment"],
+        "rows": [{"id": 7, "segment": "retail"}, {"id": "8", "segment": "b2b"}],
+    }
+    join = {"dataset_id": "test-customers", "on": {"customer": "id"}}
+    res = run_explore_query(
+        "test-orders",
+        {"join": join, "group_by": "segment", "aggregate": {"amount": "sum"}},
+    )
+    assert res["results"] == [
+        {"segment": "retail", "amount_sum": 30.0},
+        {"segment": "b2b", "amount_sum": 5.0},
+    ]
+    res = run_explore_query("test-orders", {"join": {**join, "how": "left"}})
+    assert [r["segment"] for r in res["results"]] == ["retail", "b2b", "retail", None, None]
+
+    # A change to the joined dataset is seen by the next query.
+    append_rows("test-customers", [{"id": 99, "segment": "retail"}])
+    res = run_explore_query(
+        "test-orders",
+        {"join": join, "group_by": "segment", "aggregate": {"amount": "sum"}},
+    )
+    assert res["results"][0] == {"segment": "retail", "amount_sum": 31.0}
+
+
+def test_partitioned_join_matches_broadcast(monkeypatch):
+    rng = random.Random(3)
+    left = np.array([rng.choice([None, *map(str, range(40))]) for _ in range(1_000)], dtype=object)
+    right = np.array([rng.choice([None, *map(str, range(60))]) for _ in range(300)], dtype=object)
+    for how in ("inner", "left"):
+        broadcast = hash_join(left, right, how)
+        monkeypatch.setattr(settings, "JOIN_BROADCAST_MAX_ROWS", 40)
+        partitioned = hash_join(left, right, how)
+        monkeypatch.undo()
+        assert np.array_equal(broadcast[0], partitioned[0])
+        assert np.array_equal(broadcast[1], partitioned[1])
+    li, ri = partitioned
+    assert all(left[i] == right[j] for i, j in zip(li, ri) if j >= 0)
+    assert set(li) == set(range(len(left)))
+
+
+def test_infinite_values_are_not_clamped():
+    rows = [{"region": "NS"[i % 2], "amount": i % 7, "status": "paid"} for i in range(400)]
+    rows[10]["amount"] = "inf"
+    REGISTRY["test-inf"] = {"headers": ["region", "amount", "status"], "rows": rows}
+    query = {
+        "group_by": "region",
+        "aggregate": {"amount": ["sum", "avg"]},
+        "filters": [{"column": "status", "operator": "eq", "value": "paid"}],
+    }
+    finite_sum = sum(i % 7 for i in range(1, 400, 2))
+    # The third run builds a cube, the fourth is answered from it.
+    for _ in range(4):
+        res = {r["region"]: r for r in run_explore_query("test-inf", query)["results"]}
+        # Non-finite results are reported as None, never as a huge finite number.
+        assert res["N"]["amount_sum"] is None and res["N"]["amount_avg"] is None
+        assert res["S"]["amount_sum"] == finite_sum
+        query = {**query, "limit": query.get("limit", 100) + 1}
+    assert any(k[0] == "test-inf" for k in CUBE_CACHE.keys())
+
+    # Infinite values in rows the filter excludes must not leak into the estimates.
+    rng = random.Random(3)
+    big = [
+        {"region": rng.choice("NSEW"), "amount": rng.random(), "status": "paid"}
+        for _ in range(60_000)
+    ]
+    for row in big[::20]:
+        row.update(amount="inf", status="void")
+    REGISTRY["test-inf-approx"] = {"headers": ["region", "amount", "status"], "rows": big}
+    approx = {**query, "limit": 100, "approx": {"max_error": 0.1}}
+    res = run_explore_query("test-inf-approx", approx)
+    assert res["approx"]["estimated_groups"] == 4
+    assert all(np.isfinite(r["amount_sum"]) for r in res["results"])
@@ -0,0 +1,31 @@
+import numpy as np
+from app.services import outliers
+from app.services.aggregates import SKETCH_ALPHA
+from app.services.column_store import ColumnStore
+from app.services.outliers import flag_outliers, outlier_bounds
+
+
+def _store(n=5_000):
+    rng = np.random.default_rng(0)
+    a = rng.normal(100, 10, size=n)
+    a[[10, 2_000, 4_321]] = [400.0, 900.0, -50.0]
+    rows = [{"a": float(v), "flat": 7, "b": "n/a" if i % 9 else i} for i, v in enumerate(a)]
+    return ColumnStore(["a", "flat", "b"], rows)
+
+
+def test_sketched_quantiles_match_exact_fences(monkeypatch):
+    store = _store()
+    exact = {m: flag_outliers(store, ["a", "flat", "b"], m, 3.5) for m in ("iqr", "mad")}
+    exact_bounds = {m: outlier_bounds(store, ["a"], m, 1.5) for m in ("iqr", "mad")}
+
+    # Force the sketch path, merged over several chunks.
+    monkeypatch.setattr(outliers, "EXACT_QUANTILE_MAX_ROWS", 100)
+    monkeypatch.setattr(outliers, "CHUNK_ROWS", 1_024)
+    for method in ("iqr", "mad"):
+        sketched = flag_outliers(store, ["a", "flat", "b"], method, 3.5)
+        assert {2_000, 4_321, 10} <= set(sketched.positions().tolist())
+        assert np.array_equal(sketched.mask(), exact[method].mask()), method
+        assert sketched.counts["flat"] == 0
+        lo, hi = outlier_bounds(store, ["a"], method, 1.5)
+        assert np.allclose(hi, exact_bounds[method][1], rtol=4 * SKETCH_ALPHA)
+        assert np.allclose(lo, exact_bounds[method][0], rtol=4 * SKETCH_ALPHA)
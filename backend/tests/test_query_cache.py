@@ -0,0 +1,83 @@
+from app.services.pagination import query_fingerprint
+from app.services.query_builder import run_explore_query
+from app.services.query_cache import QUERY_CACHE, cached_query, canonical_query
+from app.services.registry import REGISTRY, append_rows, commit_rows
+
+
+def _dataset(dataset_id):
+    rows = [{"city": ["Rome", "Oslo", "Lima"][i % 3], "amt": i} for i in range(300)]
+    REGISTRY[dataset_id] = {"headers": ["city", "amt"], "rows": rows}
+
+
+QUERY = {
+    "filters": [{"column": "amt", "operator": ">", "value": 10}],
+    "group_by": "city",
+    "aggregate": {"amt": "sum"},
+}
+
+
+def test_equivalent_queries_share_a_fingerprint():
+    a = {
+        "filters": [
+            {"column": "city", "operator": "==", "value": "Rome"},
+            {"column": "amt", "operator": "gt", "value": 5},
+            {"column": "tag", "operator": "in", "value": ["b", "a", "b"]},
+            {"column": "name", "operator": "prefix", "value": "jo"},
+        ],
+        "sort": {"amt": "DESC"},
+    }
+    b = {
+        "filters": [
+            {"column": "name", "operator": "starts_with", "value": "jo"},
+            {"column": "tag", "operator": "in", "value": ["a", "b"]},
+            {"column": "amt", "operator": ">", "value": 5},
+            {"column": "city", "value": "Rome"},
+        ],
+        "sort": {"amt": "desc"},
+        "limit": 100,
+    }
+    assert canonical_query(a) == canonical_query(b)
+    assert query_fingerprint({**a, "limit": 10}) == query_fingerprint(b)
+    assert canonical_query(a) != canonical_query({**a, "sort": {"amt": "asc"}})
+    c = {"filters": [{"column": "amt", "operator": "<", "value": 5}]}
+    assert canonical_query(c) != canonical_query({"filters": [{**c["filters"][0], "value": 6}]})
+
+
+def test_repeated_query_is_served_from_cache():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"results": [{"n": 1}]}
+
+    first = cached_query("test-qc-direct", 1, {"limit": 100}, compute)
+    second = cached_query("test-qc-direct", 1, {}, compute)
+    assert not first["cached"] and second["cached"]
+    assert second["results"] == first["results"] and len(calls) == 1
+    cached_query("test-qc-direct", 2, {}, compute)
+    assert len(calls) == 2
+
+
+def test_append_invalidates_only_that_dataset():
+    _dataset("test-qc-a")
+    _dataset("test-qc-b")
+    first = run_explore_query("test-qc-a", QUERY)
+    run_explore_query("test-qc-b", QUERY)
+    assert run_explore_query("test-qc-a", QUERY)["cached"]
+
+    append_rows("test-qc-a", [{"city": "Rome", "amt": 1_000}])
+    assert not any(k[0] == "test-qc-a" for k in QUERY_CACHE.keys())
+    after = run_explore_query("test-qc-a", QUERY)
+    assert not after["cached"] and after["results"] != first["results"]
+    assert run_explore_query("test-qc-b", QUERY)["cached"]
+
+
+def test_mutation_invalidates_cached_results():
+    _dataset("test-qc-m")
+    run_explore_query("test-qc-m", QUERY)
+    assert run_explore_query("test-qc-m", QUERY)["cached"]
+    rows = [r for r in REGISTRY["test-qc-m"]["rows"] if r["city"] != "Lima"]
+    commit_rows("test-qc-m", rows, "filter")
+    after = run_explore_query("test-qc-m", QUERY)
+    assert not after["cached"]
+    assert {r["city"] for r in after["results"]} == {"Rome", "Oslo"}
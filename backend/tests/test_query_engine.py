@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from app.config import settings
+from app.intelligence import query_engine
+from app.intelligence.query_engine import _filter_mask, run_query
+
+
+def _frame(n=3_000):
+    rng = np.random.default_rng(0)
+    names = np.array(["Joanna", "John", "anne", "Hannah", "Zoe", "Jo", "Léa", None], dtype=object)
+    return pd.DataFrame(
+        {
+            "city": rng.choice(["Rome", "Oslo", "Lima"], n),
+            "amt": rng.integers(0, 500, n),
+            "score": np.where(rng.random(n) < 0.1, "n/a", rng.random(n).round(3).astype(str)),
+            "name": names[rng.integers(0, len(names), n)],
+        }
+    )
+
+
+def _expected(df, filters):
+    """Filters applied one at a time, skipping any that raise."""
+    out = df
+    for f in filters:
+        try:
+            s, v = out[f["column"]], f["value"]
+            if f["op"] == "==":
+                out = out[s == v]
+            elif f["op"] == ">":
+                out = out[pd.to_numeric(s, errors="coerce") > float(v)]
+            elif f["op"] == "<=":
+                out = out[pd.to_numeric(s, errors="coerce") <= float(v)]
+            elif f["op"] == "in":
+                out = out[s.isin(v)]
+            elif f["op"] == "between":
+                out = out[s.astype(float).between(*map(float, v))]
+            elif f["op"] == "contains":
+                out = out[s.astype(str).str.contains(str(v), case=False, na=False)]
+            elif f["op"] == "startswith":
+                out = out[s.astype(str).str.lower().str.startswith(str(v).lower())]
+        except Exception:
+            pass
+    return df.index.isin(out.index)
+
+
+def test_compiled_mask_matches_sequential_filters():
+    df = _frame()
+    filters = [
+        {"column": "city", "op": "in", "value": ["Rome", "Lima"]},
+        {"column": "amt", "op": ">", "value": "120"},
+        {"column": "amt", "op": "between", "value": [100, 400]},
+        {"column": "score", "op": "<=", "value": 0.5},
+        {"column": "name", "op": "contains", "value": "an"},
+        {"column": "name", "op": "startswith", "value": "JO"},
+        {"column": "missing", "op": "==", "value": 1},
+    ]
+    for i in range(len(filters)):
+        assert np.array_equal(_filter_mask(df, filters[i:]), _expected(df, filters[i:])), i
+    assert _filter_mask(df, []).all()
+
+
+def test_filters_that_cannot_apply_are_skipped():
+    df = _frame()
+    bad = [
+        {"column": "name", "op": "contains", "value": "("},
+        {"column": "amt", "op": ">", "value": "many"},
+        {"column": "amt", "op": "between", "value": [1]},
+    ]
+    good = {"column": "city", "op": "==", "value": "Oslo"}
+    assert _filter_mask(df, bad).all()
+    assert np.array_equal(_filter_mask(df, [*bad, good]), (df["city"] == "Oslo").to_numpy())
+    result = run_query(df, {"metric": "amt", "groupBy": "city", "filters": bad})
+    assert result["rows_after_filter"] == len(df)
+
+
+def test_trigram_index_matches_scans(monkeypatch):
+    monkeypatch.setattr(settings, "TEXT_INDEX_MIN_ROWS", 1_000)
+    monkeypatch.setattr(settings, "TEXT_INDEX_BUILD_AFTER", 2)
+    df = _frame()
+    searches = [
+        {"column": "name", "op": "contains", "value": "ANN"},
+        {"column": "name", "op": "contains", "value": "e"},
+        {"column": "name", "op": "startswith", "value": "jo"},
+        {"column": "name", "op": "startswith", "value": "zzz"},
+        {"column": "name", "op": "contains", "value": "n.a"},
+    ]
+    for f in searches:
+        # First search scans, the second builds the index, the third reads it.
+        for _ in range(3):
+            assert np.array_equal(_filter_mask(df, [f]), _expected(df, [f])), f
+    assert "name" in query_engine._FRAME_TEXT.get(id(df))["indexes"]
+    both = [searches[0], {"column": "city", "op": "==", "value": "Rome"}]
+    assert np.array_equal(_filter_mask(df, both), _expected(df, both))
+
+
+def test_approx_query_with_too_many_groups_runs_exactly():
+    rng = np.random.default_rng(1)
+    n = 60_000
+    df = pd.DataFrame({"g": rng.integers(0, 40_000, n), "v": rng.random(n)})
+    query = {"metric": "v", "groupBy": "g", "agg": "sum", "limit": 50_000}
+    approx = run_query(df, {**query, "approx": {"max_error": 0.05}})
+    exact = run_query(df, query)
+    assert "approx" not in approx
+    assert approx["data"] == exact["data"] and approx["rows_after_filter"] == n
+
+    few = pd.DataFrame({"g": rng.integers(0, 5, 200_000), "v": rng.random(200_000)})
+    estimated = run_query(few, {**query, "approx": {"max_error": 0.05}})
+    assert estimated["approx"]["estimated_groups"] == 5
+    totals = few.groupby("g")["v"].sum()
+    for row in estimated["data"]:
+        assert row["v_ci_low"] < row["v"] < row["v_ci_high"]
+        assert abs(row["v"] / totals[row["g"]] - 1) < 0.05
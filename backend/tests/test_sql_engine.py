@@ -0,0 +1,87 @@
+import os
+import sqlite3
+
+import pytest
+from app.services import sql_engine
+from app.services.registry import REGISTRY
+from app.services.sql_engine import SQLError, run_sql
+
+
+def _dataset(dataset_id="test-sql"):
+    rows = [{"city": ["Rome", "Oslo"][i % 2], "amt": i} for i in range(100)]
+    REGISTRY[dataset_id] = {"headers": ["city", "amt"], "rows": rows}
+    return {"data": dataset_id}
+
+
+def _rows(pages):
+    return [r for p in pages if "rows" in p for r in p["rows"]]
+
+
+def test_select_pages_and_truncation():
+    pages = list(run_sql(_dataset(), "SELECT amt FROM data ORDER BY amt", max_rows=25, page_size=10))
+    assert pages[0] == {"columns": ["amt"]}
+    assert [len(p["rows"]) for p in pages if "rows" in p] == [10, 10, 5]
+    assert _rows(pages) == [[i] for i in range(25)]
+    assert pages[-1]["done"] and pages[-1]["row_count"] == 25 and pages[-1]["truncated"]
+
+    pages = list(run_sql(_dataset(), "SELECT * FROM data WHERE city = 'Rome'", max_rows=50))
+    assert len(_rows(pages)) == 50 and not pages[-1]["truncated"]
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "DELETE FROM data",
+        "INSERT INTO data VALUES ('Lima', 1)",
+        "DROP TABLE data",
+        "PRAGMA table_info(data)",
+        "ATTACH DATABASE ':memory:' AS other",
+        "CREATE TEMP TABLE t (x)",
+    ],
+)
+def test_authorizer_rejects_anything_but_reads(sql):
+    with pytest.raises(SQLError):
+        list(run_sql(_dataset(), sql))
+    assert len(REGISTRY["test-sql"]["rows"]) == 100
+
+
+def test_connection_is_query_only(monkeypatch):
+    monkeypatch.setattr(sql_engine, "_authorizer", lambda *args: sqlite3.SQLITE_OK)
+    with pytest.raises(SQLError, match="readonly"):
+        list(run_sql(_dataset(), "CREATE TEMP TABLE t (x)"))
+
+
+def test_long_query_times_out():
+    sql = (
+        "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) "
+        "SELECT count(*) FROM c"
+    )
+    with pytest.raises(SQLError, match="timed out"):
+        list(run_sql(_dataset(), sql, timeout_ms=50))
+
+
+def test_index_failure_falls_back_to_a_scan(monkeypatch):
+    def locked(conn, col):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(sql_engine, "_create_index", locked)
+    pages = list(run_sql(_dataset("test-sql-locked"), "SELECT amt FROM data WHERE amt < 3"))
+    assert _rows(pages) == [[0], [1], [2]]
+
+
+def test_snapshots_follow_registrations():
+    count = "SELECT count(*) FROM data"
+    REGISTRY["test-sql-rv"] = {"headers": ["n"], "rows": [{"n": 1}]}
+    assert _rows(run_sql({"data": "test-sql-rv"}, count)) == [[1]]
+    # Registered again: versions restart at 0, the snapshot must not be reused.
+    REGISTRY["test-sql-rv"] = {"headers": ["n"], "rows": [{"n": 1}, {"n": 2}, {"n": 3}]}
+    assert _rows(run_sql({"data": "test-sql-rv"}, count)) == [[3]]
+
+    # Ids that sanitize to the same file name stay apart.
+    REGISTRY["test/sql"] = {"headers": ["n"], "rows": [{"n": 1}] * 2}
+    REGISTRY["test_sql"] = {"headers": ["n"], "rows": [{"n": 1}] * 5}
+    assert _rows(run_sql({"a": "test/sql", "b": "test_sql"}, "SELECT count(*) FROM a")) == [[2]]
+    assert _rows(run_sql({"a": "test/sql", "b": "test_sql"}, "SELECT count(*) FROM b")) == [[5]]
+
+    path = sql_engine.ensure_table("test_sql")
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from app.router.dataset_routes import router
+from app.services.registry import REGISTRY, append_rows
+from app.services.timeseries import TimeSeriesIndex, timeseries_for_dataset
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+
+def _frame(start="2024-01-01", days=200, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=days, freq="D")
+    return pd.DataFrame({"date": dates.strftime("%Y-%m-%d"), "amt": rng.integers(0, 100, days)})
+
+
+def test_rollups_match_pandas_resample():
+    df = _frame()
+    index = TimeSeriesIndex.from_frame(df, "date")
+    series = df.set_index(pd.to_datetime(df["date"]))["amt"]
+
+    month = index.trend("amt", "month", "sum")
+    expected = series.resample("MS").sum()
+    assert month["labels"] == expected.index.strftime("%Y-%m").tolist()
+    assert month["values"] == expected.astype(float).tolist()
+
+    week = index.trend("amt", "week", "mean")
+    expected = series.resample("W-MON", label="left", closed="left").mean()
+    assert week["labels"] == expected.index.strftime("%Y-%m-%d").tolist()
+    assert np.allclose(week["values"], expected.round(4))
+
+    quarter = index.trend("amt", "quarter", "max")
+    assert quarter["labels"] == ["2024-Q1", "2024-Q2", "2024-Q3"]
+    assert quarter["values"] == series.resample("QS").max().astype(float).tolist()
+
+
+def test_append_rolls_cached_index_forward():
+    old, new = _frame(days=100), _frame(start="2024-04-10", days=60, seed=1)
+    REGISTRY["test-ts"] = {"headers": ["date", "amt"], "rows": old.to_dict("records")}
+    index = timeseries_for_dataset("test-ts", "date")
+    append_rows("test-ts", new.to_dict("records"))
+    assert timeseries_for_dataset("test-ts", "date") is index
+
+    rebuilt = TimeSeriesIndex.from_frame(pd.concat([old, new]), "date")
+    for res in ("day", "week", "month", "quarter"):
+        assert index.trend("amt", res, "mean") == rebuilt.trend("amt", res, "mean")
+    assert index.rows == 160
+
+
+def test_timeseries_route_statuses():
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    client = TestClient(app)
+    REGISTRY["test-ts-route"] = {"headers": ["date", "amt"], "rows": _frame().to_dict("records")}
+    body = {"date_column": "date", "column": "amt"}
+    assert client.post("/api/datasets/missing/timeseries", json=body).status_code == 404
+    bad = {**body, "resolution": "decade"}
+    assert client.post("/api/datasets/test-ts-route/timeseries", json=bad).status_code == 400
+    assert client.post("/api/datasets/test-ts-route/timeseries", json=body).status_code == 200
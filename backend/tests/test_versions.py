@@ -0,0 +1,56 @@
+import pytest
+from app.config import settings
+from app.router.dataset_routes import router
+from app.services.registry import REGISTRY, commit_rows, redo, undo, version_history
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+
+def _dataset(dataset_id):
+    REGISTRY[dataset_id] = {"headers": ["n"], "rows": [{"n": 0}]}
+
+
+def test_history_keeps_the_latest_changes(monkeypatch):
+    monkeypatch.setattr(settings, "DATASET_HISTORY_LIMIT", 3)
+    _dataset("test-history")
+    for i in range(1, 6):
+        commit_rows("test-history", [{"n": i}] * (i + 1), f"change {i}")
+    history = version_history("test-history")
+    assert [s["rows"] for s in history["undo"]] == [5, 4, 3]
+    for _ in range(3):
+        undo("test-history")
+    # The two oldest states were dropped.
+    assert REGISTRY["test-history"]["rows"] == [{"n": 2}] * 3
+    with pytest.raises(ValueError, match="nothing to undo"):
+        undo("test-history")
+
+
+def test_new_change_clears_redo():
+    _dataset("test-redo")
+    commit_rows("test-redo", [{"n": 1}], "first")
+    commit_rows("test-redo", [{"n": 2}], "second")
+    undo("test-redo")
+    assert [s["action"] for s in version_history("test-redo")["redo"]] == ["second"]
+    commit_rows("test-redo", [{"n": 3}], "third")
+    assert version_history("test-redo")["redo"] == []
+    with pytest.raises(ValueError, match="nothing to redo"):
+        redo("test-redo")
+    undo("test-redo")
+    assert REGISTRY["test-redo"]["rows"] == [{"n": 1}]
+
+
+def test_history_route_statuses():
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    client = TestClient(app)
+    for path in ("undo", "redo"):
+        assert client.post(f"/api/datasets/missing/{path}").status_code == 404
+    assert client.get("/api/datasets/missing/versions").status_code == 404
+
+    _dataset("test-history-route")
+    assert client.post("/api/datasets/test-history-route/undo").status_code == 400
+    commit_rows("test-history-route", [{"n": 1}], "change")
+    res = client.post("/api/datasets/test-history-route/undo")
+    assert res.status_code == 200 and res.json()["current"]["action"] == "upload"
+    assert REGISTRY["test-history-route"]["rows"] == [{"n": 0}]
+    assert client.post("/api/datasets/test-history-route/redo").json()["redo"] == []